@@ -0,0 +1,457 @@
+import numpy as np
+from typing import Any, Iterator, Optional, Tuple
+from Metrics import metrics
+'''
+Vectorized dynamic programming fill shared by the aligners.
+
+Every cell H[row, col] depends only on its upper, left and upper-left neighbours,
+so all cells lying on one anti-diagonal (row + col = d) are independent
+and can be computed at once with numpy array operations.
+Python loop runs O(n + m) times instead of O(nm).
+
+Anti-diagonals are kept in buffers indexed by row:
+- cell above (row - 1, col) and cell on the left (row, col - 1) lie on diagonal d - 1
+- upper-left cell (row - 1, col - 1) lies on diagonal d - 2
+so neighbours of a contiguous run of rows are contiguous slices of the buffers.
+Only three diagonals are alive at once, which gives O(min(n, m)) memory when the full matrix is not needed.
+
+Affine gaps (Gotoh): run of k gaps scores gap_open + k * gap_extend. Two more values are kept per cell:
+- E - best score of a path ending with a horizontal gap (E[row, col - 1] lies on diagonal d - 1)
+- F - best score of a path ending with a vertical gap (F[row - 1, col] lies on diagonal d - 1)
+so E and F need just one rolling diagonal each. With gap_open == 0 they equal plain gap moves and are skipped.
+
+Banded mode fills only diagonals (col - row) close to the ones joining (0, 0) and (n, m),
+which is O(kn) for similar sequences. Band is doubled until it provably contains the optimal path.
+'''
+
+
+class BandedMatrix:
+    '''
+    Diagonal band of a (rows x cols) matrix - only cells with lower <= col - row <= upper are stored.
+    Cell (row, col) lives in data[row, col - row - lower], cells outside of the band read as `fill_value`.
+    '''
+
+    def __init__(self, data: np.ndarray, shape: Tuple[int, int], lower: int, fill_value: int = 0) -> None:
+        self.data = data
+        self.shape = shape
+        self.lower = lower
+        self.fill_value = fill_value
+
+    @property
+    def size(self) -> int:
+        return self.shape[0] * self.shape[1]
+
+    def __getitem__(self, position: Tuple[int, int]) -> Any:
+        row, col = position
+        rows, cols = self.shape
+        row, col = row % rows, col % cols
+        band_col = col - row - self.lower
+        if 0 <= band_col < self.data.shape[1]:
+            return self.data[row, band_col]
+        return self.fill_value
+
+    def __array__(self, dtype=None, copy=None) -> np.ndarray:
+        '''Dense copy - for visualization of small matrices only'''
+        rows, cols = self.shape
+        dense = np.full(shape=self.shape, fill_value=self.fill_value, dtype=dtype or self.data.dtype)
+        for band_col in range(self.data.shape[1]):
+            row = np.arange(rows)
+            col = row + band_col + self.lower
+            inside = (col >= 0) & (col < cols)
+            dense[row[inside], col[inside]] = self.data[row[inside], band_col]
+        return dense
+
+
+class AlignmentEngine:
+    '''Fills DP matrices over integer-encoded sequences (anti-diagonal wavefront)'''
+
+    # Direction bits - a cell stores every optimal move (ties), STOP when none (local alignment)
+    STOP, DIAGONAL, UP, LEFT = 0, 1, 2, 4
+    # Gap run reaching the cell continues the run of the previous cell (otherwise it was opened there)
+    UP_EXTEND, LEFT_EXTEND = 8, 16
+
+    # Value of cells outside of the band (never chosen)
+    INFINITY = 2 ** 40
+    # Initial band when it is chosen automatically
+    DEFAULT_BAND = 8
+
+    def __init__(self, table: np.ndarray, gap_code: int, gap_open: int = 0) -> None:
+        '''
+        `table` - substitution matrix, table[a, b] == score(a, b) for letter codes a, b (see ScoringSystem.matrix)
+        `gap_code` - code of the '-' symbol, table[a, gap_code] and table[gap_code, b] are gap extension scores
+        `gap_open` - added once per run of gaps (0 - linear gaps)
+        '''
+        self.table = table
+        self.gap_code = gap_code
+        self.gap_open = gap_open
+
+    def fill(self, seq_a: np.ndarray, seq_b: np.ndarray, minimize: bool = False, local: bool = False,
+             band: Optional[int] = None) -> Tuple[Any, Any]:
+        '''
+        Returns (H, directions), where directions[row, col] is an uint8 bitmask
+        of all optimal moves (DIAGONAL | UP | LEFT), or STOP,
+        plus UP_EXTEND / LEFT_EXTEND when the vertical / horizontal gap run continues from the previous cell.
+
+        `minimize` - pick the lowest instead of the highest score (edit distance)
+        `local` - add 0 as 4th candidate (Smith-Waterman), 1st row and column are 0
+        `band` - fill only `band` diagonals around the ones joining (0, 0) and (n, m),
+                 H and directions are BandedMatrix then (global only)
+        '''
+        # 1. Prepare dimensions (required additional 1 column and 1 row)
+        rows, cols = len(seq_a) + 1, len(seq_b) + 1
+        lower, upper = self._band_limits(rows, cols, band)
+        top, left = self._boundaries(seq_a, seq_b, local)
+
+        # 2. Initialize matrices
+        with metrics.phase('allocate'):
+            if band is None:
+                H = np.zeros(shape=(rows, cols), dtype=int)
+                directions = np.full(shape=(rows, cols), fill_value=self.STOP, dtype=np.uint8)
+                H[0, :] = top
+                H[:, 0] = left
+                if not local:
+                    # Global path has to go along the 1st row/column to reach (0, 0) - one gap run
+                    directions[0, 1:] = self.LEFT | self.LEFT_EXTEND
+                    directions[1:, 0] = self.UP | self.UP_EXTEND
+                metrics.allocated(H, directions)
+            else:
+                assert not local, 'Band is supported by global alignment only'
+                width = upper - lower + 1
+                H_band = np.zeros(shape=(rows, width), dtype=int)
+                directions_band = np.full(shape=(rows, width), fill_value=self.STOP, dtype=np.uint8)
+                # Cells (0, col) and (row, 0) which belong to the band
+                first_row = np.arange(min(upper, cols - 1) + 1)
+                first_col = np.arange(min(-lower, rows - 1) + 1)
+                H_band[0, first_row - lower] = top[first_row]
+                H_band[first_col, -first_col - lower] = left[first_col]
+                directions_band[0, first_row[1:] - lower] = self.LEFT | self.LEFT_EXTEND
+                directions_band[first_col[1:], -first_col[1:] - lower] = self.UP | self.UP_EXTEND
+                metrics.allocated(H_band, directions_band)
+
+                H = BandedMatrix(H_band, shape=(rows, cols), lower=lower)
+                directions = BandedMatrix(directions_band, shape=(rows, cols), lower=lower, fill_value=self.STOP)
+
+        if rows == 1 or cols == 1:
+            # Empty sequence - nothing but the boundary
+            return H, directions
+
+        # Flat views: cells of diagonal d are H_flat[row * stride + d + shift] (constant stride)
+        if band is None:
+            H_flat = H.reshape(-1)
+            directions_flat = directions.reshape(-1)
+            stride, shift = cols - 1, 0
+        else:
+            H_flat = H_band.reshape(-1)
+            directions_flat = directions_band.reshape(-1)
+            stride, shift = width - 2, -lower
+
+        # 3. Copy every diagonal into the matrices
+        wavefront = self._wavefront(seq_a, seq_b, minimize, local, lower, upper, with_directions=True)
+        for d, lo, hi, best, best_directions in wavefront:
+            base = d + shift
+            H_flat[lo * stride + base:hi * stride + base + 1:stride] = best
+            directions_flat[lo * stride + base:hi * stride + base + 1:stride] = best_directions
+
+        return H, directions
+
+    def score(self, seq_a: np.ndarray, seq_b: np.ndarray, minimize: bool = False, band: Optional[int] = None) -> int:
+        '''
+        Score-only global fill, returns H[-1, -1] without building H or directions.
+        Arguments like in `fill`. Uses O(min(n, m)) memory.
+        '''
+        if len(seq_a) > len(seq_b):
+            # Buffers are indexed by rows -> make the shorter sequence vertical.
+            # Swapped sequences give transposed H (UP and LEFT swap places, values stay the same)
+            transposed = AlignmentEngine(self.table.T, self.gap_code, self.gap_open)
+            return transposed.score(seq_b, seq_a, minimize, band)
+
+        if len(seq_a) == 0:
+            top, _ = self._boundaries(seq_a, seq_b, local=False)
+            return int(top[-1])
+
+        rows, cols = len(seq_a) + 1, len(seq_b) + 1
+        lower, upper = self._band_limits(rows, cols, band)
+        best = None
+        for _, _, _, best, _ in self._wavefront(seq_a, seq_b, minimize, False, lower, upper):
+            pass
+        # The last diagonal is a single cell - the bottom-right corner
+        return int(best[-1])
+
+    def local_score(self, seq_a: np.ndarray, seq_b: np.ndarray) -> int:
+        '''Score-only local fill (Smith-Waterman), returns H.max() in O(min(n, m)) memory'''
+        if len(seq_a) > len(seq_b):
+            return AlignmentEngine(self.table.T, self.gap_code, self.gap_open).local_score(seq_b, seq_a)
+        if len(seq_a) == 0:
+            return 0
+
+        rows, cols = len(seq_a) + 1, len(seq_b) + 1
+        lower, upper = self._band_limits(rows, cols, None)
+        score = 0
+        for _, _, _, best, _ in self._wavefront(seq_a, seq_b, False, True, lower, upper):
+            score = max(score, int(best.max()))
+        return score
+
+    def score_within(self, seq_a: np.ndarray, seq_b: np.ndarray, threshold: int,
+                     minimize: bool = False) -> Optional[int]:
+        '''
+        Threshold query of the global score: the score if it passes `threshold` (<= when minimizing, >= otherwise),
+        None when it does not (the exact score is not computed then).
+        - only diagonals a passing path can reach are filled (a path touching diagonal col - row = k
+          has at least |k| + |k - (m - n)| gaps, scored by the bound of _band_is_enough)
+        - the fill stops when no cell of two consecutive anti-diagonals can still pass
+          (cell value plus the best possible score of the rest of the path), every path crosses one of them
+        '''
+        if len(seq_a) > len(seq_b):
+            transposed = AlignmentEngine(self.table.T, self.gap_code, self.gap_open)
+            return transposed.score_within(seq_b, seq_a, threshold, minimize)
+
+        n, m = len(seq_a), len(seq_b)
+        passes = np.less_equal if minimize else np.greater_equal
+        if n == 0:
+            score = self.score(seq_a, seq_b, minimize)
+            return score if passes(score, threshold) else None
+
+        # 1. Best score of a path with `total_gaps` gaps (linear in the number of gaps)
+        pair, gap = self._extremes(seq_a, seq_b, minimize)
+        open_is_penalty = self.gap_open >= 0 if minimize else self.gap_open <= 0
+        # When opening is a bonus, every gap may get it
+        gap = gap if open_is_penalty else gap + self.gap_open
+
+        def bound(total_gaps: int) -> int:
+            opening = self.gap_open if open_is_penalty and total_gaps else 0
+            return (n + m - total_gaps) // 2 * pair + total_gaps * gap + opening
+
+        # 2. Most gaps of a passing path -> diagonals to fill
+        shift = m - n
+        if not passes(bound(shift), threshold):
+            return None
+        # A path reaching `reach` diagonals away from the ones joining (0, 0) and (n, m) has shift + 2 * reach gaps
+        reach, most = 0, n
+        while reach < most:
+            middle = (reach + most + 1) // 2
+            if passes(bound(shift + 2 * middle), threshold):
+                reach = middle
+            else:
+                most = middle - 1
+        lower, upper = -reach, shift + reach
+
+        # 3. Fill, cells which cannot pass any more end the search
+        top, left = self._boundaries(seq_a, seq_b, local=False)
+        choose_best = np.minimum if minimize else np.maximum
+        hopeless_diagonals = 0
+        wavefront = self._wavefront(seq_a, seq_b, minimize, False, lower, upper)
+        best = None
+        for d, lo, hi, best, _ in wavefront:
+            # Letters left after cells (row, d - row): n - row and m - d + row
+            rows = np.arange(lo, hi + 1)
+            left_a, left_b = n - rows, m - d + rows
+            rest = np.abs(left_a - left_b)
+            # Best rest of the path: as many pairs as possible, or gaps only
+            rest = choose_best((left_a + left_b - rest) // 2 * pair + rest * gap, (left_a + left_b) * gap)
+            alive = passes(best + rest, threshold).any()
+            # Boundary cells (0, d) and (d, 0) inside of the band
+            for row, col, value in ((0, d, top), (d, 0, left)):
+                if row <= n and col <= m and lower <= col - row <= upper:
+                    rest_a, rest_b = n - row, m - col
+                    gaps = abs(rest_a - rest_b)
+                    rest = choose_best((rest_a + rest_b - gaps) // 2 * pair + gaps * gap, (rest_a + rest_b) * gap)
+                    alive = alive or passes(value[max(row, col)] + rest, threshold)
+            hopeless_diagonals = 0 if alive else hopeless_diagonals + 1
+            if hopeless_diagonals == 2:
+                wavefront.close()
+                return None
+        # The last diagonal is a single cell - the bottom-right corner
+        score = int(best[-1])
+        return score if passes(score, threshold) else None
+
+    def fill_banded(self, seq_a: np.ndarray, seq_b: np.ndarray, minimize: bool = False,
+                    band: int = 0) -> Tuple[BandedMatrix, BandedMatrix, int]:
+        '''
+        Banded `fill`, band is doubled until no path leaving it can have a better score.
+        `band` - initial band, 0 picks DEFAULT_BAND.
+        Returns (H, directions, final band).
+        '''
+        band = band or self.DEFAULT_BAND
+        while True:
+            H, directions = self.fill(seq_a, seq_b, minimize=minimize, band=band)
+            if self._band_is_enough(seq_a, seq_b, H[-1, -1], band, minimize):
+                return H, directions, band
+            band *= 2
+
+    def score_banded(self, seq_a: np.ndarray, seq_b: np.ndarray, minimize: bool = False,
+                     band: int = 0) -> Tuple[int, int]:
+        '''Banded `score` with band doubling like in `fill_banded`, returns (score, final band)'''
+        band = band or self.DEFAULT_BAND
+        while True:
+            score = self.score(seq_a, seq_b, minimize=minimize, band=band)
+            if self._band_is_enough(seq_a, seq_b, score, band, minimize):
+                return score, band
+            band *= 2
+
+    def _boundaries(self, seq_a: np.ndarray, seq_b: np.ndarray, local: bool) -> Tuple[np.ndarray, np.ndarray]:
+        '''H[0, :] and H[:, 0] - zeros for local alignment, otherwise a single gap run'''
+        if local:
+            return np.zeros(len(seq_b) + 1, dtype=int), np.zeros(len(seq_a) + 1, dtype=int)
+        top = self.gap_open + np.cumsum(self.table[self.gap_code, seq_b], dtype=int)
+        left = self.gap_open + np.cumsum(self.table[seq_a, self.gap_code], dtype=int)
+        return np.concatenate(([0], top)), np.concatenate(([0], left))
+
+    def _band_limits(self, rows: int, cols: int, band: Optional[int]) -> Tuple[int, int]:
+        '''Range of diagonals (col - row) to fill'''
+        if band is None:
+            return -(rows - 1), cols - 1
+        assert band >= 1, 'Band has to be positive'
+        # Diagonals joining (0, 0) with (n, m) are always included
+        shift = (cols - 1) - (rows - 1)
+        return min(0, shift) - band, max(0, shift) + band
+
+    def _band_is_enough(self, seq_a: np.ndarray, seq_b: np.ndarray, score: int, band: int,
+                        minimize: bool) -> bool:
+        '''
+        Checks if any path leaving the band could beat `score` (Ukkonen-style cutoff).
+        Path which leaves the band has at least |n - m| + 2 * (band + 1) gaps (at least one gap run),
+        so it has less letter pairs and more gap penalties.
+        '''
+        n, m = len(seq_a), len(seq_b)
+        min_gaps = abs(n - m) + 2 * (band + 1)
+        if min_gaps > n + m:
+            # Band covers the whole matrix
+            return True
+
+        pair, gap = self._extremes(seq_a, seq_b, minimize)
+
+        def bound(total_gaps: int) -> int:
+            # Opening penalty is paid at least once, a bonus (unusual sign) at most once per gap
+            open_is_penalty = self.gap_open >= 0 if minimize else self.gap_open <= 0
+            gap_runs = 1 if open_is_penalty else total_gaps
+            return (n + m - total_gaps) // 2 * pair + total_gaps * gap + gap_runs * self.gap_open
+
+        # Bound is linear in number of gaps -> extremes are at the ends of the range
+        if minimize:
+            return score <= min(bound(min_gaps), bound(n + m))
+        return score >= max(bound(min_gaps), bound(n + m))
+
+    def _extremes(self, seq_a: np.ndarray, seq_b: np.ndarray, minimize: bool) -> Tuple[int, int]:
+        '''Best scores of a letter pair and of a gap which can appear in an alignment of these sequences'''
+        pairs = self.table[np.ix_(np.flatnonzero(np.bincount(seq_a)), np.flatnonzero(np.bincount(seq_b)))]
+        gaps = np.concatenate((self.table[seq_a, self.gap_code], self.table[self.gap_code, seq_b]))
+        if minimize:
+            return int(pairs.min()), int(gaps.min())
+        return int(pairs.max()), int(gaps.max())
+
+    def _wavefront(self, seq_a: np.ndarray, seq_b: np.ndarray, minimize: bool, local: bool, lower: int, upper: int,
+                   with_directions: bool = False) -> Iterator[Tuple[int, int, int, np.ndarray, np.ndarray]]:
+        '''
+        Yields (d, lo, hi, best, best_directions) for every anti-diagonal d (interior cells only),
+        best[i] is the value of cell (lo + i, d - lo - i).
+        Only cells with lower <= col - row <= upper are computed, others count as +/- INFINITY.
+        best_directions is None unless `with_directions`.
+        '''
+        with metrics.phase('fill'):
+            yield from self._diagonals(seq_a, seq_b, minimize, local, lower, upper, with_directions)
+
+    def _diagonals(self, seq_a: np.ndarray, seq_b: np.ndarray, minimize: bool, local: bool, lower: int, upper: int,
+                   with_directions: bool) -> Iterator[Tuple[int, int, int, np.ndarray, np.ndarray]]:
+        '''Body of `_wavefront`'''
+        rows, cols = len(seq_a) + 1, len(seq_b) + 1
+        top, left = self._boundaries(seq_a, seq_b, local)
+        affine = self.gap_open != 0
+
+        # Scores of gaps are the same for the whole row/column
+        gap_a = self.table[seq_a, self.gap_code].astype(int)    # score(a, '-') - vertical move
+        gap_b = self.table[self.gap_code, seq_b].astype(int)    # score('-', b) - horizontal move
+
+        # Row-major flat table lets numpy gather letter pair scores in one step
+        table_flat = self.table.reshape(-1)
+        seq_a_offset = seq_a.astype(np.intp) * self.table.shape[1]
+
+        choose_best = np.minimum if minimize else np.maximum
+        is_better = np.less if minimize else np.greater
+        outside = self.INFINITY if minimize else -self.INFINITY
+
+        # Rolling anti-diagonals (indexed by row)
+        prev2 = np.zeros(rows, dtype=int)
+        prev1 = np.zeros(rows, dtype=int)
+        current = np.zeros(rows, dtype=int)
+        prev1[0:2] = top[1], left[1]
+        if affine:
+            # Paths ending with a vertical (F) or horizontal (E) gap, boundary cells never continue a run
+            F_prev1, F_current = np.full(rows, outside, dtype=int), np.full(rows, outside, dtype=int)
+            E_prev1, E_current = np.full(rows, outside, dtype=int), np.full(rows, outside, dtype=int)
+        scores = np.zeros(shape=(5, min(rows, cols)), dtype=int)
+        best_directions = None
+        cells = 0
+
+        # Cells are counted also when the caller stops early (threshold queries)
+        try:
+            # Walk anti-diagonals (row + col == d), top-left to bottom-right
+            for d in range(2, rows + cols - 1):
+                # Rows of cells inside of the matrix and the band (boundary cells included)
+                first, last = max(0, d - cols + 1, (d - upper + 1) // 2), min(rows - 1, d, (d - lower) // 2)
+                # Interior cells
+                lo, hi = max(1, first), min(d - 1, last)
+                size = hi - lo + 1
+                cells += size
+
+                # Letters of seq_b are visited in reversed order along a diagonal
+                b = seq_b[d - hi - 1:d - lo][::-1]
+                leave_or_replace_letter, delete_indel, insert_indel = \
+                    scores[0, :size], scores[1, :size], scores[2, :size]
+
+                np.add(prev2[lo - 1:hi], table_flat[seq_a_offset[lo - 1:hi] + b], out=leave_or_replace_letter)
+
+                delete_cost = gap_a[lo - 1:hi]
+                insert_cost = gap_b[d - hi - 1:d - lo][::-1]
+                if affine:
+                    # Gap run is either opened after the neighbour cell or extended from the neighbour's run
+                    delete_open, insert_open = scores[3, :size], scores[4, :size]
+                    np.add(prev1[lo - 1:hi], delete_cost + self.gap_open, out=delete_open)
+                    np.add(prev1[lo:hi + 1], insert_cost + self.gap_open, out=insert_open)
+                    np.add(F_prev1[lo - 1:hi], delete_cost, out=delete_indel)
+                    np.add(E_prev1[lo:hi + 1], insert_cost, out=insert_indel)
+                    if with_directions:
+                        extend_bits = (is_better(delete_indel, delete_open) * np.uint8(self.UP_EXTEND)
+                                       | is_better(insert_indel, insert_open) * np.uint8(self.LEFT_EXTEND))
+                    choose_best(delete_indel, delete_open, out=delete_indel)
+                    choose_best(insert_indel, insert_open, out=insert_indel)
+                else:
+                    np.add(prev1[lo - 1:hi], delete_cost, out=delete_indel)
+                    np.add(prev1[lo:hi + 1], insert_cost, out=insert_indel)
+
+                best = choose_best(leave_or_replace_letter, delete_indel)
+                best = choose_best(best, insert_indel)
+                if local:
+                    best = choose_best(best, 0)
+                if with_directions:
+                    best_directions = ((leave_or_replace_letter == best) * np.uint8(self.DIAGONAL)
+                                       | (delete_indel == best) * np.uint8(self.UP)
+                                       | (insert_indel == best) * np.uint8(self.LEFT))
+                    if affine:
+                        best_directions |= extend_bits
+
+                current[lo:hi + 1] = best
+                # Boundary cells of this diagonal (1st row and 1st column)
+                if first == 0:
+                    current[0] = top[d]
+                if last == d:
+                    current[d] = left[d]
+                # Neighbours just outside of the band
+                if first > 0:
+                    current[first - 1] = outside
+                if last < rows - 1:
+                    current[last + 1] = outside
+
+                if affine:
+                    F_current[max(0, first - 1):last + 2] = outside
+                    E_current[max(0, first - 1):last + 2] = outside
+                    F_current[lo:hi + 1] = delete_indel
+                    E_current[lo:hi + 1] = insert_indel
+
+                yield d, lo, hi, best, best_directions
+
+                prev2, prev1, current = prev1, current, prev2
+                if affine:
+                    F_prev1, F_current = F_current, F_prev1
+                    E_prev1, E_current = E_current, E_prev1
+        finally:
+            metrics.count('cells', cells)
@@ -0,0 +1,92 @@
+import re
+import numpy as np
+from dataclasses import dataclass, field
+from typing import Any, List, Optional, Tuple
+'''
+Result of a pairwise alignment (see SequencesAnalyzer.align), nothing is printed or rendered.
+
+The alignment is kept as run-length encoded edit operations (CIGAR, seq_a is the reference):
+- M - letter pair (match or mismatch)
+- I - letter of seq_b against a gap
+- D - letter of seq_a against a gap
+Positions are 0-based and half-open, the operations cover seq_a[start[0]:end[0]] and seq_b[start[1]:end[1]].
+Global alignments always span (0, 0) - (len(seq_a), len(seq_b)).
+Gapped strings (aligned_a, aligned_b) are rendered on demand from the attached sequences.
+'''
+
+# Operation codes of run_lengths
+operation_letters = 'MID'
+
+
+@dataclass
+class AlignmentResult:
+    mode: str
+    score: int
+    start: Tuple[int, int]
+    end: Tuple[int, int]
+    cigar: str
+    # Filled matrices, only with keep_matrices=True (see SequencesAnalyzer.render_matrix/render_traceback)
+    result_matrix: Optional[Any] = field(default=None, repr=False, compare=False)
+    traceback_matrix: Optional[Any] = field(default=None, repr=False, compare=False)
+    # Taken from the cache (matrices and sequences are never kept there)
+    cached: bool = field(default=False, compare=False)
+    # Whole aligned sequences (str or PackedSequence), needed only to render gapped strings
+    seq_a: Optional[Any] = field(default=None, repr=False, compare=False)
+    seq_b: Optional[Any] = field(default=None, repr=False, compare=False)
+
+    def operations(self, extended: bool = False) -> List[Tuple[str, int]]:
+        '''Runs of (operation, length), `extended` splits M into = (match) and X (mismatch), it needs the sequences'''
+        runs = [(operation, int(length)) for length, operation in re.findall(r'(\d+)([MID])', self.cigar)]
+        if not extended:
+            return runs
+
+        columns = np.repeat(np.array([operation for operation, _ in runs], dtype='U1'),
+                            [length for _, length in runs])
+        aligned_a, aligned_b = self._aligned_letters()
+        columns[(columns == 'M') & (aligned_a == aligned_b)] = '='
+        columns[columns == 'M'] = 'X'
+        if len(columns) == 0:
+            return []
+        starts = np.concatenate(([0], np.flatnonzero(columns[1:] != columns[:-1]) + 1))
+        lengths = np.diff(np.append(starts, len(columns)))
+        return list(zip(columns[starts].tolist(), lengths.tolist()))
+
+    def aligned(self) -> Tuple[str, str]:
+        '''Gapped strings of both sequences'''
+        aligned_a, aligned_b = self._aligned_letters()
+        return aligned_a.tobytes().decode('ascii'), aligned_b.tobytes().decode('ascii')
+
+    @property
+    def aligned_a(self) -> str:
+        return self.aligned()[0]
+
+    @property
+    def aligned_b(self) -> str:
+        return self.aligned()[1]
+
+    def _aligned_letters(self) -> Tuple[np.ndarray, np.ndarray]:
+        '''Gapped sequences as ASCII codes, letters are placed into the columns of their operations at once'''
+        if self.seq_a is None or self.seq_b is None:
+            raise ValueError('Sequences are not attached to the result, gapped strings cannot be rendered')
+        runs = self.operations()
+        columns = np.repeat(np.frombuffer(''.join(operation for operation, _ in runs).encode('ascii'), dtype=np.uint8),
+                            [length for _, length in runs])
+
+        aligned = []
+        for sequence, start, end, gap_operation in ((self.seq_a, self.start[0], self.end[0], ord('I')),
+                                                    (self.seq_b, self.start[1], self.end[1], ord('D'))):
+            letters = np.full(len(columns), ord('-'), dtype=np.uint8)
+            # Slicing first, a PackedSequence is unpacked only for the aligned region
+            letters[columns != gap_operation] = np.frombuffer(str(sequence[start:end]).encode('ascii'), dtype=np.uint8)
+            aligned.append(letters)
+        return aligned[0], aligned[1]
+
+    @staticmethod
+    def run_lengths(codes: np.ndarray) -> str:
+        '''CIGAR of per-column operation codes (0 - M, 1 - I, 2 - D), e.g. of an encoded gapped alignment'''
+        if len(codes) == 0:
+            return ''
+        starts = np.concatenate(([0], np.flatnonzero(codes[1:] != codes[:-1]) + 1))
+        lengths = np.diff(np.append(starts, len(codes)))
+        return ''.join(f'{length}{operation_letters[code]}' for length, code in zip(lengths.tolist(),
+                                                                                     codes[starts].tolist()))
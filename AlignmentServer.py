@@ -0,0 +1,242 @@
+import json
+import time
+import asyncio
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Awaitable, Deque, Dict, Iterable, Optional
+from ScoringSystem import ScoringSystem
+from SequenceAnalyzer import SequencesAnalyzer
+from ResultCache import ResultCache
+from Translator import Translator
+'''
+Long-running server of the aligners and the translator (see server.py), requests do not pay for process startup,
+CSV parsing and compiling of scoring matrices.
+
+Protocol - JSON lines over a Unix socket or localhost TCP, a response line per request line, in the same order:
+- request: {"op": ..., "id": ... (optional, echoed back), arguments...}
+  or a JSON array of requests (batch, answered by an array)
+- ops:
+  align     - seq_a, seq_b, mode (global/local, default global), gapped (add gapped strings)
+              -> score, start, end, cigar (aligned_a, aligned_b)
+  score     - seq_a, seq_b, mode (global - similarity, local - local score), min_score -> score (null below it)
+  distance  - seq_a, seq_b, max_distance -> distance (null above it)
+  translate - sequence, frames (3 or 6) or orfs (min_length) -> protein, frames or orfs
+  stats     - queue depth, counts and latency percentiles (answered by the server itself)
+- errors: {"id": ..., "error": message}
+
+CPU work runs in a process pool, workers keep compiled scoring systems and an in-memory ResultCache.
+At most `max_pending` requests are in flight, the next line of a connection is read only when a slot frees up,
+so socket buffers fill and clients block (backpressure) instead of requests queueing up in memory.
+'''
+
+# Ops computed by the workers
+worker_ops = ('align', 'score', 'distance', 'translate')
+
+# Worker process state (set once by _init_worker)
+_worker = {}
+
+
+def _init_worker(scoring_sys: ScoringSystem, edit_cost_sys: ScoringSystem, band: Optional[int],
+                 cache_bytes: int) -> None:
+    _worker.update(scoring_sys=scoring_sys, edit_cost_sys=edit_cost_sys, band=band,
+                   cache=ResultCache(max_bytes=cache_bytes))
+    # First calls of the engines (lazy imports, numpy internals) are paid here, not by the 1st request
+    for op in worker_ops[:3]:
+        handle({'op': op, 'seq_a': 'ACGT', 'seq_b': 'ACGA'})
+    handle({'op': 'translate', 'sequence': 'AUGGCCUAA'})
+
+
+def _ready() -> bool:
+    return True
+
+
+def handle(request: Dict[str, Any]) -> Dict[str, Any]:
+    '''Result of a worker op (runs in a worker process)'''
+    op = request['op']
+    if op == 'translate':
+        translator = Translator(request['sequence'])
+        if request.get('orfs'):
+            return {'orfs': translator.orfs(min_length=int(request.get('min_length', 30)))}
+        if request.get('frames'):
+            return {'frames': translator.frames(six=str(request['frames']) == '6')}
+        return {'protein': translator.to_protein}
+
+    analyzer = SequencesAnalyzer(request['seq_a'], request['seq_b'], band=_worker['band'],
+                                 scoring_sys=_worker['scoring_sys'], edit_cost_sys=_worker['edit_cost_sys'],
+                                 cache=_worker['cache'])
+    mode = request.get('mode', 'global')
+    if op == 'align':
+        result = analyzer.align(mode)
+        response = {'score': int(result.score), 'start': [int(position) for position in result.start],
+                    'end': [int(position) for position in result.end], 'cigar': result.cigar}
+        if request.get('gapped'):
+            response['aligned_a'], response['aligned_b'] = result.aligned()
+        return response
+    if op == 'distance':
+        if request.get('max_distance') is not None:
+            return {'distance': analyzer.within_distance(int(request['max_distance']))}
+        return {'distance': int(analyzer.needleman_wunsch_score(minimize=True))}
+
+    if mode == 'local':
+        if request.get('min_score') is not None:
+            raise ValueError('min_score works with the global mode only')
+        return {'score': int(analyzer.smith_waterman_score())}
+    if mode != 'global':
+        raise ValueError(f"Unknown mode '{mode}' (global or local)")
+    if request.get('min_score') is not None:
+        return {'score': analyzer.within_score(int(request['min_score']))}
+    return {'score': int(analyzer.needleman_wunsch_score(minimize=False))}
+
+
+class AlignmentServer:
+
+    # Longest request line (bytes)
+    line_limit = 1 << 26
+    # Latencies kept per op for the percentiles (the most recent ones)
+    latency_window = 10000
+
+    def __init__(self, scoring_sys: ScoringSystem, edit_cost_sys: ScoringSystem, band: Optional[int] = None,
+                 jobs: int = 1, max_pending: Optional[int] = None, cache_bytes: int = 64 << 20) -> None:
+        '''`max_pending` - requests in the pool at once (default: 4 per job)'''
+        # Accessing the property compiles the matrix before it is pickled for workers
+        scoring_sys.matrix, edit_cost_sys.matrix
+        self.jobs = jobs
+        self.max_pending = max_pending or 4 * jobs
+        self.pool = ProcessPoolExecutor(max_workers=jobs, initializer=_init_worker,
+                                        initargs=(scoring_sys, edit_cost_sys, band, cache_bytes))
+        # Requests in the pool, requests read and waiting for a free slot
+        self.pending = 0
+        self.waiting = 0
+        self.completed = 0
+        self.errors = 0
+        self.latencies: Dict[str, Deque[float]] = {op: deque(maxlen=self.latency_window) for op in worker_ops}
+        self.started = time.perf_counter()
+        self._slots: Optional[asyncio.Semaphore] = None
+
+    async def serve(self, socket_path: Optional[str] = None, host: str = '127.0.0.1', port: int = 8765) -> None:
+        '''Serves on a Unix socket (`socket_path`) or TCP until cancelled'''
+        loop = asyncio.get_running_loop()
+        self._slots = asyncio.Semaphore(self.max_pending)
+        # Workers are started and warmed up before the 1st connection
+        await asyncio.gather(*(loop.run_in_executor(self.pool, _ready) for _ in range(self.jobs)))
+        if socket_path:
+            server = await asyncio.start_unix_server(self._connection, path=socket_path, limit=self.line_limit)
+        else:
+            server = await asyncio.start_server(self._connection, host, port, limit=self.line_limit)
+        async with server:
+            await server.serve_forever()
+
+    def close(self) -> None:
+        self.pool.shutdown(wait=True)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            'uptime_seconds': round(time.perf_counter() - self.started, 3),
+            'jobs': self.jobs,
+            'max_pending': self.max_pending,
+            'pending': self.pending,
+            'waiting': self.waiting,
+            'completed': self.completed,
+            'errors': self.errors,
+            'latency_ms': {op: self.percentiles(latencies) for op, latencies in self.latencies.items() if latencies},
+        }
+
+    @staticmethod
+    def percentiles(seconds: Iterable[float], quantiles: Iterable[int] = (50, 90, 99)) -> Dict[str, float]:
+        '''Nearest-rank percentiles in milliseconds (and the number of values)'''
+        ordered = sorted(seconds)
+        result = {f'p{quantile}': round(1000 * ordered[max(0, -(-quantile * len(ordered) // 100) - 1)], 3)
+                  for quantile in quantiles}
+        result['count'] = len(ordered)
+        return result
+
+    async def _connection(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        # Responses of the lines in their order (awaitables), written by _respond as they complete
+        responses: asyncio.Queue = asyncio.Queue()
+        responder = asyncio.ensure_future(self._respond(responses, writer))
+        try:
+            while True:
+                try:
+                    line = await reader.readline()
+                except (ValueError, ConnectionError) as error:
+                    # Line over the limit or a dropped client
+                    await responses.put(self._done({'error': str(error)}))
+                    break
+                if not line:
+                    break
+                if line.strip():
+                    await responses.put(await self._submit_line(line))
+        finally:
+            await responses.put(None)
+            await responder
+            writer.close()
+
+    async def _respond(self, responses: asyncio.Queue, writer: asyncio.StreamWriter) -> None:
+        connected = True
+        while True:
+            response = await responses.get()
+            if response is None:
+                return
+            # Results are awaited even after the client left, so their slots are released
+            response = await response
+            if not connected:
+                continue
+            try:
+                writer.write(json.dumps(response).encode('utf-8') + b'\n')
+                await writer.drain()
+            except ConnectionError:
+                connected = False
+
+    async def _submit_line(self, line: bytes) -> Awaitable:
+        received = time.perf_counter()
+        try:
+            requests = json.loads(line)
+        except ValueError as error:
+            self.errors += 1
+            return self._done({'error': f'Invalid JSON: {error}'})
+        if isinstance(requests, list):
+            # Batch - every request takes its own slot, the array is answered when all are done
+            return asyncio.gather(*[await self._submit(request, received) for request in requests])
+        return await self._submit(requests, received)
+
+    async def _submit(self, request: Any, received: float) -> Awaitable:
+        if not isinstance(request, dict) or request.get('op') not in worker_ops + ('stats',):
+            self.errors += 1
+            return self._done(self._reply(request, {'error': f"Unknown op, expected one of {worker_ops + ('stats',)}"}))
+        if request['op'] == 'stats':
+            return self._done(self._reply(request, self.stats()))
+
+        self.waiting += 1
+        try:
+            await self._slots.acquire()
+        finally:
+            self.waiting -= 1
+        self.pending += 1
+        future = asyncio.get_running_loop().run_in_executor(self.pool, handle, request)
+        return asyncio.ensure_future(self._finish(request, future, received))
+
+    async def _finish(self, request: Dict[str, Any], future: Awaitable, received: float) -> Dict[str, Any]:
+        try:
+            response = self._reply(request, await future)
+            self.completed += 1
+        except Exception as error:
+            self.errors += 1
+            response = self._reply(request, {'error': f'{type(error).__name__}: {error}'})
+        finally:
+            self.pending -= 1
+            self._slots.release()
+        # Latency from reading the line, waiting for a slot included
+        self.latencies[request['op']].append(time.perf_counter() - received)
+        return response
+
+    @staticmethod
+    def _reply(request: Any, result: Dict[str, Any]) -> Dict[str, Any]:
+        if isinstance(request, dict) and 'id' in request:
+            return {'id': request['id'], **result}
+        return result
+
+    @staticmethod
+    def _done(response: Dict[str, Any]) -> asyncio.Future:
+        future = asyncio.get_running_loop().create_future()
+        future.set_result(response)
+        return future
@@ -0,0 +1,86 @@
+import sys
+import struct
+import numpy as np
+from typing import Iterator, Optional, Tuple
+from AlignmentResult import AlignmentResult
+'''
+Output of alignments of many pairs (see batch.py), gapped strings are never rendered.
+
+Formats:
+- tsv    - name_a, name_b, score, start_a, end_a, start_b, end_b, cigar (1 line per pair, with a header)
+- binary - magic b'ALN1', then a record per pair (little-endian):
+           name lengths (2 x uint16), UTF-8 names, mode (uint8: 0 global, 1 local), score (int32),
+           start_a, end_a, start_b, end_b (4 x uint32), number of operations (uint32),
+           operations (uint32 each: length << 4 | code, codes like BAM: M 0, I 1, D 2)
+Records are streamed, read them back with AlignmentWriter.read.
+'''
+
+
+class AlignmentWriter:
+
+    magic = b'ALN1'
+    codes = {'M': 0, 'I': 1, 'D': 2}
+    modes = ('global', 'local')
+    _record = struct.Struct('<Bi4II')
+
+    def __init__(self, output: Optional[str] = None, format: str = 'tsv') -> None:
+        '''`output` - file name (default: stdout, tsv only)'''
+        if format not in ('tsv', 'binary'):
+            raise ValueError(f"Unknown format '{format}' (tsv or binary)")
+        if format == 'binary' and not output:
+            raise ValueError('Binary output needs a file name')
+        self.format = format
+        self.output = output
+        if format == 'binary':
+            self.out = open(output, 'wb', buffering=1 << 16)
+            self.out.write(self.magic)
+        else:
+            self.out = open(output, 'w', buffering=1 << 16) if output else sys.stdout
+            self.out.write('name_a\tname_b\tscore\tstart_a\tend_a\tstart_b\tend_b\tcigar\n')
+
+    def write(self, name_a: str, name_b: str, result: AlignmentResult) -> None:
+        (start_a, start_b), (end_a, end_b) = result.start, result.end
+        if self.format == 'tsv':
+            self.out.write(f'{name_a}\t{name_b}\t{result.score}\t{start_a}\t{end_a}\t{start_b}\t{end_b}\t'
+                           f'{result.cigar}\n')
+            return
+
+        runs = result.operations()
+        operations = np.array([length << 4 | self.codes[operation] for operation, length in runs], dtype='<u4')
+        name_a, name_b = name_a.encode('utf-8'), name_b.encode('utf-8')
+        self.out.write(struct.pack('<HH', len(name_a), len(name_b)) + name_a + name_b)
+        self.out.write(self._record.pack(self.modes.index(result.mode), result.score, start_a, end_a, start_b, end_b,
+                                         len(runs)))
+        self.out.write(operations.tobytes())
+
+    def close(self) -> None:
+        if self.output:
+            self.out.close()
+        else:
+            self.out.flush()
+
+    def __enter__(self) -> 'AlignmentWriter':
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+    @staticmethod
+    def read(path: str) -> Iterator[Tuple[str, str, AlignmentResult]]:
+        '''(name_a, name_b, result) from a binary file (results have no sequences attached)'''
+        letters = {code: operation for operation, code in AlignmentWriter.codes.items()}
+        record = AlignmentWriter._record
+        with open(path, 'rb') as f:
+            if f.read(len(AlignmentWriter.magic)) != AlignmentWriter.magic:
+                raise ValueError(f'{path} is not a binary alignment file')
+            while True:
+                lengths = f.read(4)
+                if not lengths:
+                    return
+                length_a, length_b = struct.unpack('<HH', lengths)
+                name_a, name_b = f.read(length_a).decode('utf-8'), f.read(length_b).decode('utf-8')
+                mode, score, start_a, end_a, start_b, end_b, count = record.unpack(f.read(record.size))
+                operations = np.frombuffer(f.read(4 * count), dtype='<u4')
+                cigar = ''.join(f'{value >> 4}{letters[value & 0xF]}' for value in operations.tolist())
+                yield name_a, name_b, AlignmentResult(mode=AlignmentWriter.modes[mode], score=score,
+                                                      start=(start_a, start_b), end=(end_a, end_b), cigar=cigar)
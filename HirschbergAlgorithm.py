@@ -1,78 +1,114 @@
 import numpy as np
-from typing import Tuple
+from typing import List, Tuple, Union
 from NeedlemanWunschAlgorithm import NeedlemanWunschAlgorithm
 from ScoringSystem import ScoringSystem
+from PackedSequence import PackedSequence
+from AlignmentResult import AlignmentResult
 
 class HirschbergAlgorithm:
     '''
     Hirschberg’s algorithm uses Θ(m +n) space.
-    - Each recursive call uses Θ(m) space to compute f(·, n / 2) and g(·, n / 2).
-    - Only Θ(1) space needs to be maintained per recursive call.
-    - Number of recursive calls ≤ n. ▪
-    s
+    - Each split computes f(·, n / 2) and g(·, n / 2) keeping only the last row (Θ(m) space).
+    - Pending sub-problems are kept on an explicit stack (no recursion), Θ(1) space each.
+    - Number of splits ≤ n. ▪
+    Linear gaps only (ScoringSystem.gap_open is ignored).
+
     Pseudocode: https://en.wikipedia.org/wiki/Hirschberg's_algorithm
     '''
-    def __init__(self, scoring_sys) -> None:
+    def __init__(self, scoring_sys: ScoringSystem) -> None:
         self.aligned_seq_a: str = ''
         self.aligned_seq_b: str = ''
+        self.score: int = 0
         self.scoring_sys = scoring_sys
+        self.nw = NeedlemanWunschAlgorithm(scoring_sys)
 
-    def align(self, seq_a: str, seq_b: str) -> Tuple[str, str]:
-        self.excute(seq_a, seq_b)
-        print(self.aligned_seq_a)
-        print(self.aligned_seq_b)
-        
-    def append_alignment(self, Z: str, W: str):
-        print(f'{Z} -> {W}')
-        self.aligned_seq_a += Z
-        self.aligned_seq_b += W
+    def align(self, seq_a: Union[str, PackedSequence], seq_b: Union[str, PackedSequence]) -> Tuple[str, str, int]:
+        '''Returns (aligned seq_a, aligned seq_b, score), sequences are str or PackedSequence'''
+        codes_a = self.scoring_sys.encode(seq_a)
+        codes_b = self.scoring_sys.encode(seq_b)
+        aligned_a, aligned_b = self.execute(codes_a, codes_b)
 
-    def excute(self, seq_a: str, seq_b: str) -> Tuple[str, str]:
-        Z, W = '', ''
+        self.aligned_seq_a = self.scoring_sys.decode(aligned_a)
+        self.aligned_seq_b = self.scoring_sys.decode(aligned_b)
+        # No column has gaps on both sides -> sum of letter pair scores is the alignment score
+        self.score = int(self.scoring_sys.matrix[aligned_a, aligned_b].sum())
+        return self.aligned_seq_a, self.aligned_seq_b, self.score
 
-        if len(seq_a) == 0:
-            for b in seq_b:
-                Z, W = Z + '-', W + b
-            self.append_alignment(Z, W)
-        elif len(seq_b) == 0:
-            for a in seq_a:
-                Z, W = Z + a, W + '-'
-            self.append_alignment(Z, W)
-        elif len(seq_a) == 1 or len(seq_b) == 1:
-            # Z, W = self.NWScore(seq_a=self.seq_a.copy(), seq_b=self.seq_b.copy())
-
-            # If sequences have different length, fill missing spots with '-'
-            if len(seq_a) > 1:
-                seq_b = seq_b.ljust(len(seq_a), '-')
-            elif len(seq_b) > 1:
-                seq_a = seq_a.ljust(len(seq_b), '-')
-            self.append_alignment(seq_a, seq_b)
-        else:
-            # Calculate left score
-            a_mid: int = int(len(seq_a) // 2)
-            result = NeedlemanWunschAlgorithm(self.scoring_sys).execute(seq_a[:a_mid], seq_b)
-            score_left: np.ndarray[int] = result[-1, :]
-            
-            # Calculate right score
-            rev_seq_a: str = seq_a[a_mid:][::-1]
-            rev_seq_b: str = seq_b[::-1]
-            result = NeedlemanWunschAlgorithm(self.scoring_sys).execute(rev_seq_a, rev_seq_b)
-            score_right: np.ndarray[int] = result[-1, :]
+    def alignment(self, seq_a: Union[str, PackedSequence], seq_b: Union[str, PackedSequence]) -> AlignmentResult:
+        '''Like align, but the alignment is kept as a CIGAR (gapped strings are not decoded)'''
+        aligned_a, aligned_b = self.execute(self.scoring_sys.encode(seq_a), self.scoring_sys.encode(seq_b))
+        gap_code = self.scoring_sys.gap_code
+        # Operation of every column: 0 - M, 1 - I (gap in seq_a), 2 - D (gap in seq_b)
+        codes = (aligned_a == gap_code) + 2 * (aligned_b == gap_code)
+        score = int(self.scoring_sys.matrix[aligned_a, aligned_b].sum())
+        return AlignmentResult(mode='global', score=score, start=(0, 0), end=(len(seq_a), len(seq_b)),
+                               cigar=AlignmentResult.run_lengths(codes), seq_a=seq_a, seq_b=seq_b)
+
+    def execute(self, codes_a: np.ndarray, codes_b: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        '''Aligns encoded sequences, returns encoded alignment (gaps are ScoringSystem.gap_code)'''
+        # Pieces of alignment, collected from left to right
+        pieces_a: List[np.ndarray] = []
+        pieces_b: List[np.ndarray] = []
+
+        # Sub-problems (a_start, a_end, b_start, b_end), left one is always on top
+        stack = [(0, len(codes_a), 0, len(codes_b))]
+        while stack:
+            a_start, a_end, b_start, b_end = stack.pop()
+            seq_a, seq_b = codes_a[a_start:a_end], codes_b[b_start:b_end]
+
+            if len(seq_a) <= 1 or len(seq_b) <= 1:
+                Z, W = self._align_small(seq_a, seq_b)
+                pieces_a.append(Z)
+                pieces_b.append(W)
+                continue
+
+            # Calculate left score (forward pass over the upper half)
+            a_mid: int = len(seq_a) // 2
+            score_left = self.nw.last_row(seq_a[:a_mid], seq_b)
+
+            # Calculate right score (backward pass over the lower half)
+            score_right = self.nw.last_row(seq_a[a_mid:][::-1], seq_b[::-1])
 
             # Find seq_b division index
-            rev_score_right: np.ndarray[int] = np.flip(score_right)
-            b_mid: int = np.argmax(score_left + rev_score_right)
-
-            # Left subtree traversal
-            left_z, left_w = self.excute(
-                seq_a=seq_a[:a_mid],
-                seq_b=seq_b[:b_mid]
-            )
-
-            # Right subtree traversal
-            right_z, right_w = self.excute(
-                seq_a=seq_a[a_mid:], 
-                seq_b=seq_b[b_mid:]
-            )
-            Z, W = left_z + right_z, left_w + right_w
-        return Z, W
+            b_mid: int = int(np.argmax(score_left + score_right[::-1]))
+
+            # Right half is solved after the left one
+            stack.append((a_start + a_mid, a_end, b_start + b_mid, b_end))
+            stack.append((a_start, a_start + a_mid, b_start, b_start + b_mid))
+
+        gap = np.empty(shape=0, dtype=np.uint8)
+        return np.concatenate(pieces_a or [gap]), np.concatenate(pieces_b or [gap])
+
+    def _align_small(self, seq_a: np.ndarray, seq_b: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        '''
+        Base case - one of the sequences has at most one letter.
+        Full Needleman-Wunsch matrix has 2 rows or 2 columns then, so it is still linear in size.
+        '''
+        gap_code = self.scoring_sys.gap_code
+        if len(seq_a) == 0:
+            return np.full(len(seq_b), gap_code, dtype=np.uint8), seq_b
+        if len(seq_b) == 0:
+            return seq_a, np.full(len(seq_a), gap_code, dtype=np.uint8)
+
+        H = np.stack(list(self.nw.rows(seq_a, seq_b)))
+        matrix = self.scoring_sys.matrix
+
+        # Traceback: find the move which produced every cell (diagonal, then up, then left)
+        Z, W = [], []
+        row, col = len(seq_a), len(seq_b)
+        while row > 0 or col > 0:
+            a = seq_a[row - 1] if row > 0 else gap_code
+            b = seq_b[col - 1] if col > 0 else gap_code
+            if row > 0 and col > 0 and H[row, col] == H[row - 1, col - 1] + matrix[a, b]:
+                row, col = row - 1, col - 1
+                Z.append(a)
+                W.append(b)
+            elif row > 0 and H[row, col] == H[row - 1, col] + matrix[a, gap_code]:
+                row -= 1
+                Z.append(a)
+                W.append(gap_code)
+            else:
+                col -= 1
+                Z.append(gap_code)
+                W.append(b)
+        return np.array(Z[::-1], dtype=np.uint8), np.array(W[::-1], dtype=np.uint8)
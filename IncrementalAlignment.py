@@ -0,0 +1,232 @@
+import numpy as np
+from typing import Dict, Iterator, List, Optional, Tuple, Union
+from ScoringSystem import ScoringSystem
+from PackedSequence import PackedSequence
+from AlignmentResult import AlignmentResult
+from Metrics import metrics
+'''
+Global alignment of two sequences which keep changing (e.g. a consensus polished against reads), updates are
+recomputed from the nearest DP checkpoint instead of from scratch.
+
+DP state is kept as checkpoints under a memory budget (half for rows, half for columns):
+- rows H[i, :] for every `row_step`-th i, the first and the last row
+- columns H[:, j] for every `col_step`-th j, the first and the last column
+An edit of seq_a at position p invalidates rows after p only, rows are swept again from the nearest row checkpoint
+at or before p (the same row recurrence as NeedlemanWunschAlgorithm.rows). Edits of seq_b sweep columns from
+the nearest column checkpoint the same way. Appending delta letters costs O(delta * m): the last row (column)
+is always a checkpoint.
+
+Edits of one sequence are batched until the score (or alignment) is needed, an edit of the other sequence
+brings the state up to date first. Steps double when the checkpoints outgrow the budget.
+Checkpoint lines are buffers with spare room at the end, so values of appended lines are written in place
+(a line is reallocated once per 25% of growth, not on every append).
+Linear gaps only (like Hirschberg), `minimize` gives edit distance with an edit cost system.
+'''
+
+
+class IncrementalAlignment:
+
+    # Checkpoints per axis at most (a sweep writes into every checkpoint of the other axis)
+    max_lines = 256
+
+    def __init__(self, seq_a: Union[str, PackedSequence], seq_b: Union[str, PackedSequence],
+                 scoring_sys: Optional[ScoringSystem] = None, minimize: bool = False,
+                 max_checkpoint_bytes: int = 64 << 20) -> None:
+        if scoring_sys is None:
+            scoring_sys = ScoringSystem(match=0, mismatch=1, gap=1) if minimize else \
+                ScoringSystem(match=2, mismatch=-1, gap=-2)
+        if scoring_sys.gap_open:
+            raise ValueError('IncrementalAlignment supports linear gaps only (gap_open=0)')
+        self.scoring_sys = scoring_sys
+        self.minimize = minimize
+        self.max_checkpoint_bytes = max_checkpoint_bytes
+        # Costs are maximized as negative scores
+        self._table = (-1 if minimize else 1) * scoring_sys.matrix.astype(np.int64)
+        self.codes: List[np.ndarray] = [scoring_sys.encode(seq_a), scoring_sys.encode(seq_b)]
+
+        # Checkpoints of rows (index i -> H[i, :]) and of columns (j -> H[:, j]), buffers may be longer than lines
+        self.checkpoints: Tuple[Dict[int, np.ndarray], Dict[int, np.ndarray]] = ({}, {})
+        self.steps = [1, 1]
+        self._thin()
+        # Row 0 is a gap run along seq_b, the rest of the grid is swept from it
+        gap_code = scoring_sys.gap_code
+        row = np.concatenate(([0], np.cumsum(self._table[gap_code, self.codes[1]])))
+        self.checkpoints[0][0] = row
+        for col in self._indexes(1):
+            self.checkpoints[1][col] = row[col:col + 1]
+        # Pending edit: (edited sequence - 0 for seq_a, 1 for seq_b, smallest edited position)
+        self._dirty: Optional[Tuple[int, int]] = (0, 0)
+
+    @property
+    def seq_a(self) -> str:
+        return self.scoring_sys.decode(self.codes[0])
+
+    @property
+    def seq_b(self) -> str:
+        return self.scoring_sys.decode(self.codes[1])
+
+    @property
+    def score(self) -> int:
+        '''Similarity (edit distance with `minimize`) of the current sequences'''
+        return int(self.last_row()[-1])
+
+    def last_row(self) -> np.ndarray:
+        '''H[-1, :] of the current sequences'''
+        self._refresh()
+        row = self._line(0, len(self.codes[0]))
+        return -row if self.minimize else row.copy()
+
+    @property
+    def checkpoint_bytes(self) -> int:
+        return sum(line.nbytes for checkpoints in self.checkpoints for line in checkpoints.values())
+
+    def append_a(self, letters: Union[str, PackedSequence]) -> None:
+        self.edit_a(len(self.codes[0]), len(self.codes[0]), letters)
+
+    def append_b(self, letters: Union[str, PackedSequence]) -> None:
+        self.edit_b(len(self.codes[1]), len(self.codes[1]), letters)
+
+    def edit_a(self, start: int, end: int, letters: Union[str, PackedSequence] = '') -> None:
+        '''Replaces seq_a[start:end] with `letters` (insertion if start == end, deletion without letters)'''
+        self._edit(0, start, end, letters)
+
+    def edit_b(self, start: int, end: int, letters: Union[str, PackedSequence] = '') -> None:
+        '''Replaces seq_b[start:end] with `letters` (insertion if start == end, deletion without letters)'''
+        self._edit(1, start, end, letters)
+
+    def _edit(self, axis: int, start: int, end: int, letters: Union[str, PackedSequence]) -> None:
+        codes = self.codes[axis]
+        if not 0 <= start <= end <= len(codes):
+            raise IndexError(f'Edit {start}:{end} is outside of the sequence (length {len(codes)})')
+        if self._dirty is not None and self._dirty[0] != axis:
+            # Checkpoints of the other sequence have to be valid before they are used as a starting point
+            self._refresh()
+
+        self.codes[axis] = np.concatenate((codes[:start], self.scoring_sys.encode(letters), codes[end:]))
+        # Lines up to `start` depend only on the unchanged prefix
+        checkpoints = self.checkpoints[axis]
+        for index in [index for index in checkpoints if index > start]:
+            del checkpoints[index]
+        self._dirty = (axis, start if self._dirty is None else min(start, self._dirty[1]))
+
+    def _refresh(self) -> None:
+        '''Sweeps the lines after the pending edit (if any)'''
+        if self._dirty is None:
+            return
+        axis, position = self._dirty
+        start = max(index for index in self.checkpoints[axis] if index <= position)
+        self._thin(keep=(axis, start))
+        self._sweep(axis, start)
+        self._dirty = None
+
+    def _line(self, axis: int, index: int) -> np.ndarray:
+        '''Checkpoint line without the spare room of its buffer'''
+        return self.checkpoints[axis][index][:len(self.codes[1 - axis]) + 1]
+
+    def _sweep(self, axis: int, start: int) -> None:
+        '''
+        Recomputes lines of `axis` (0 - rows, 1 - columns) after the checkpoint `start`.
+        Checkpoints of the other axis cross the swept lines, their values after `start` are replaced.
+        '''
+        own, crossing = self.checkpoints[axis], self.checkpoints[1 - axis]
+        length, step = len(self.codes[axis]), self.steps[axis]
+        indexes = sorted(crossing)
+        collected = []
+        metrics.count('cells', (length - start) * len(self.codes[1 - axis]))
+        with metrics.phase('fill'):
+            for index, line in enumerate(self._lines(axis, self._line(axis, start), start, length), start=start + 1):
+                if index % step == 0 or index == length:
+                    own[index] = line
+                collected.append(line[indexes])
+
+        block = np.array(collected, dtype=np.int64).reshape(len(collected), len(indexes))
+        for position, index in enumerate(indexes):
+            buffer = crossing[index]
+            if len(buffer) < length + 1:
+                crossing[index] = np.empty(length + 1 + (length + 1) // 4, dtype=np.int64)
+                crossing[index][:start + 1] = buffer[:start + 1]
+            crossing[index][start + 1:length + 1] = block[:, position]
+
+    def _lines(self, axis: int, line: np.ndarray, start: int, stop: int) -> Iterator[np.ndarray]:
+        '''
+        Lines start + 1 .. stop of `axis` following `line`, like NeedlemanWunschAlgorithm.rows.
+        Columns are rows of the transposed problem (seq_b against seq_a, transposed table).
+        '''
+        table = self._table if axis == 0 else self._table.T
+        gap_code = self.scoring_sys.gap_code
+        sweep, across = self.codes[axis][start:stop], self.codes[1 - axis]
+        # Gap of a swept letter (move along the sweep), running gap totals across the line
+        sweep_gaps = table[sweep, gap_code]
+        across_total = np.concatenate(([0], np.cumsum(table[gap_code, across])))
+
+        for letter, gap in zip(sweep.tolist(), sweep_gaps.tolist()):
+            pairs = line[:-1] + table[letter, across]
+            best = np.concatenate(([line[0] + gap], np.maximum(pairs, line[1:] + gap)))
+            # Gaps chain across the line: H[k] = max(best[k], H[k - 1] + gap), see NeedlemanWunschAlgorithm.rows
+            line = np.maximum.accumulate(best - across_total) + across_total
+            yield line
+
+    def _indexes(self, axis: int) -> List[int]:
+        '''Lines of `axis` which are checkpoints'''
+        length = len(self.codes[axis])
+        return sorted(set(range(0, length + 1, self.steps[axis])) | {length})
+
+    def _thin(self, keep: Optional[Tuple[int, int]] = None) -> None:
+        '''
+        Doubles the steps (drops every other checkpoint) until the checkpoints fit into the budget.
+        Checkpoints off the steps (the last line before an append) are dropped too, except `keep` (axis, index).
+        '''
+        for axis in (0, 1):
+            length, width = len(self.codes[axis]), len(self.codes[1 - axis]) + 1
+            # 8 bytes per value and 25% spare room, the first and the last line are always kept
+            count = max(1, min(self.max_lines, self.max_checkpoint_bytes // 2 // (10 * width)) - 2)
+            while (length + self.steps[axis] - 1) // self.steps[axis] > count:
+                self.steps[axis] *= 2
+            step, checkpoints = self.steps[axis], self.checkpoints[axis]
+            for index in [index for index in checkpoints if index % step and index != length]:
+                if (axis, index) != keep:
+                    del checkpoints[index]
+
+    def alignment(self) -> AlignmentResult:
+        '''
+        Global alignment of the current sequences. Not incremental: rows between checkpoints are recomputed
+        block by block from the bottom, only one block is in memory at a time.
+        '''
+        self._refresh()
+        codes_a, codes_b = self.codes
+        rows, table, gap_code = self.checkpoints[0], self._table, self.scoring_sys.gap_code
+        # Runs of [operation, length] (in reversed order), on ties diagonal moves are preferred like in the traceback
+        runs: List[List] = []
+
+        def move(operation: str, length: int = 1) -> None:
+            if runs and runs[-1][0] == operation:
+                runs[-1][1] += length
+            else:
+                runs.append([operation, length])
+
+        row, col = len(codes_a), len(codes_b)
+        with metrics.phase('traceback'):
+            while row > 0:
+                block_start = max(index for index in rows if index < row)
+                metrics.count('cells', (row - block_start) * len(codes_b))
+                first = self._line(0, block_start)
+                block = np.array([first, *self._lines(0, first, block_start, row)])
+                while row > block_start:
+                    current, above = block[row - block_start], block[row - block_start - 1]
+                    a = codes_a[row - 1]
+                    if col > 0 and current[col] == above[col - 1] + table[a, codes_b[col - 1]]:
+                        row, col = row - 1, col - 1
+                        move('M')
+                    elif current[col] == above[col] + table[a, gap_code]:
+                        row -= 1
+                        move('D')
+                    else:
+                        col -= 1
+                        move('I')
+            if col:
+                # Row 0 - the rest of seq_b against gaps
+                move('I', col)
+
+        return AlignmentResult(mode='global', score=self.score, start=(0, 0), end=(len(codes_a), len(codes_b)),
+                               cigar=''.join(f'{length}{operation}' for operation, length in reversed(runs)),
+                               seq_a=self.seq_a, seq_b=self.seq_b)
@@ -0,0 +1,86 @@
+import os
+import numpy as np
+from typing import Dict, Iterator, List, Tuple
+from PackedSequence import PackedSequence
+from SequenceReader import SequenceReader
+'''
+Indexed, memory-mapped reference (multi-FASTA packed once with `build`).
+
+Files (`path` is e.g. genome.fa.pack):
+- path          packed bases of all records (2 bits per base, every record starts at a new byte)
+- path + .exc   exception runs of all records, int64 rows (start, length, letter)
+- path + .idx   text index like .fai, 1 line per record:
+                name, length, alphabet, packed byte offset, 1st exception row, number of exception rows
+
+Opening reads only the small index, bases are mapped (np.memmap) and paged in by the OS when touched,
+so `fetch` returns a window of a chromosome without reading or copying it.
+'''
+
+
+class IndexedReference:
+
+    def __init__(self, path: str) -> None:
+        self.path = path
+        self.index: Dict[str, Tuple[int, bytes, int, int, int]] = {}
+        with open(path + '.idx') as f:
+            for line in f:
+                name, length, alphabet, offset, first_exception, exceptions = line.rstrip('\n').split('\t')
+                self.index[name] = (int(length), alphabet.encode('ascii'), int(offset),
+                                    int(first_exception), int(exceptions))
+
+        # Empty files cannot be mapped
+        self.packed = self._map(path, np.uint8, shape=(-1,))
+        self.exceptions = self._map(path + '.exc', np.int64, shape=(-1, 3))
+
+    @staticmethod
+    def build(fasta: str, path: str = None) -> str:
+        '''Pack FASTA/FASTQ (gzipped too) record by record, returns `path` (default: fasta + .pack)'''
+        path = path or fasta + '.pack'
+        offset, exception_rows = 0, 0
+        with open(path, 'wb') as packed_file, open(path + '.exc', 'wb') as exceptions_file, \
+                open(path + '.idx', 'w') as index_file:
+            for name, sequence in SequenceReader(fasta, packed=True):
+                exceptions = np.stack((sequence.exception_starts, sequence.exception_lengths,
+                                       sequence.exception_letters.astype(np.int64)), axis=1).astype(np.int64)
+                packed_file.write(sequence.packed.tobytes())
+                exceptions_file.write(exceptions.tobytes())
+                index_file.write(f'{name}\t{len(sequence)}\t{sequence.alphabet.decode()}\t'
+                                 f'{offset}\t{exception_rows}\t{len(exceptions)}\n')
+                offset += len(sequence.packed)
+                exception_rows += len(exceptions)
+        return path
+
+    @property
+    def names(self) -> List[str]:
+        return list(self.index)
+
+    def __len__(self) -> int:
+        return len(self.index)
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self.index)
+
+    def __getitem__(self, name: str) -> PackedSequence:
+        '''Whole record, arrays are views of the mapped files'''
+        length, alphabet, offset, first_exception, exceptions = self.index[name]
+        rows = self.exceptions[first_exception:first_exception + exceptions]
+        return PackedSequence.from_arrays(self.packed[offset:offset + -(-length // 4)], length, alphabet,
+                                          rows[:, 0], rows[:, 1], rows[:, 2])
+
+    def fetch(self, name: str, start: int = 0, stop: int = None) -> PackedSequence:
+        '''Bases start..stop - 1 (0-based) of a record, zero-copy'''
+        return self[name].window(start, stop)
+
+    def region(self, region: str) -> PackedSequence:
+        '''samtools-like region: "name", "name:start" or "name:start-end" (1-based, inclusive)'''
+        name, _, interval = region.rpartition(':')
+        if not name or name not in self.index and region in self.index:
+            return self.fetch(region)
+        start, _, end = interval.replace(',', '').partition('-')
+        return self.fetch(name, int(start) - 1, int(end) if end else None)
+
+    @staticmethod
+    def _map(filename: str, dtype: type, shape: Tuple[int, ...]) -> np.ndarray:
+        if os.path.getsize(filename) == 0:
+            return np.zeros(shape=(0,) + shape[1:], dtype=dtype)
+        return np.memmap(filename, dtype=dtype, mode='r').reshape(shape)
@@ -0,0 +1,195 @@
+import numpy as np
+from dataclasses import replace
+from numpy.lib.stride_tricks import sliding_window_view
+from typing import Any, Dict, List, Optional, Tuple, Union
+from IndexedReference import IndexedReference
+from PackedSequence import PackedSequence
+from ScoringSystem import ScoringSystem
+from SequenceAnalyzer import SequencesAnalyzer
+from AlignmentResult import AlignmentResult
+'''
+Minimizer index of a packed reference (see IndexedReference) for seed-and-extend search.
+
+Seeds are (k, w) minimizers: the k-mer with the smallest hash in every window of w consecutive k-mers
+(w=1 keeps every k-mer). K-mers are 2 bits per base in uint64 (k <= 32), k-mers with other symbols (N, ...)
+are skipped. Only the forward strand is indexed, like the aligners work.
+
+Index arrays (saved as path + .kmi.npz next to the packed reference):
+- kmers      sorted k-mer values of all minimizers
+- positions  their reference positions (concatenated records, see record_starts)
+- record_starts, record_lengths  - records in the order of the reference index
+
+Search of a query:
+1. minimizers of the query are looked up (binary search), seeds repeated more than `max_occurrences` times are dropped
+2. hits are chained along diagonals (reference position - query position), diagonals closer than `max_gap` join
+3. the best chains give small reference windows, the existing aligners run only on them
+'''
+
+# Invertible mixing of k-mer values, so poly-A like k-mers are not always the minimizers
+_hash_multiplier = np.uint64(0x9E3779B97F4A7C15)
+# 2-bit code of every ASCII letter, 4 - not a nucleotide
+_codes = np.full(256, 4, dtype=np.uint8)
+for _code, _letters in enumerate((b'Aa', b'Cc', b'Gg', b'TtUu')):
+    _codes[list(_letters)] = _code
+
+
+class KmerIndex:
+
+    # Bases of a record processed at once while building
+    chunk_size = 1 << 22
+
+    def __init__(self, kmers: np.ndarray, positions: np.ndarray, record_starts: np.ndarray,
+                 record_lengths: np.ndarray, k: int, w: int) -> None:
+        self.kmers = kmers
+        self.positions = positions
+        self.record_starts = record_starts
+        self.record_lengths = record_lengths
+        self.k = k
+        self.w = w
+
+    @classmethod
+    def build(cls, reference: IndexedReference, k: int = 15, w: int = 10) -> 'KmerIndex':
+        '''Minimizers of every record, records are read chunk by chunk (memory does not grow with their length)'''
+        if not 1 <= k <= 32:
+            raise ValueError(f'k has to be 1..32 (2 bits per base in uint64), got {k}')
+        kmers, positions, record_starts, record_lengths = [], [], [], []
+        start = 0
+        for name in reference:
+            sequence = reference[name]
+            record_starts.append(start)
+            record_lengths.append(len(sequence))
+            record_kmers, record_positions = [], []
+            # Chunks overlap by the bases of the last window, so every window is seen whole once
+            overlap = k + w - 2
+            for chunk_start in range(0, max(len(sequence) - overlap, 1), cls.chunk_size):
+                letters = sequence.ascii(chunk_start, chunk_start + cls.chunk_size + overlap)
+                values, chunk_positions = cls.minimizers(letters, k, w)
+                record_kmers.append(values)
+                record_positions.append(chunk_positions + chunk_start)
+            # Neighbouring chunks may select the same minimizer
+            record_positions, unique = np.unique(np.concatenate(record_positions), return_index=True)
+            kmers.append(np.concatenate(record_kmers)[unique])
+            positions.append(record_positions + start)
+            start += len(sequence)
+
+        kmers = np.concatenate(kmers or [np.zeros(0, dtype=np.uint64)])
+        positions = np.concatenate(positions or [np.zeros(0, dtype=np.int64)])
+        order = np.argsort(kmers, kind='stable')
+        return cls(kmers[order], positions[order].astype(np.int64), np.array(record_starts, dtype=np.int64),
+                   np.array(record_lengths, dtype=np.int64), k, w)
+
+    @staticmethod
+    def minimizers(letters: np.ndarray, k: int, w: int) -> Tuple[np.ndarray, np.ndarray]:
+        '''(k-mer values, positions) of the minimizers of ASCII letters, sorted by position'''
+        codes = _codes[letters]
+        count = len(codes) - k + 1
+        if count <= 0:
+            return np.zeros(0, dtype=np.uint64), np.zeros(0, dtype=np.int64)
+
+        # 1. K-mer values (2 bits per base, 1st base in the highest bits) and k-mers with other symbols
+        values = np.zeros(count, dtype=np.uint64)
+        for offset in range(k):
+            values <<= np.uint64(2)
+            values |= (codes[offset:offset + count] & 3).astype(np.uint64)
+        invalid = np.concatenate(([0], np.cumsum(codes == 4)))
+        valid = invalid[k:] == invalid[:count]
+
+        # 2. Smallest hash of every window (invalid k-mers never win)
+        hashes = values * _hash_multiplier
+        hashes ^= hashes >> np.uint64(29)
+        hashes[~valid] = np.iinfo(np.uint64).max
+        if count < w:
+            selected = np.array([np.argmin(hashes)])
+        else:
+            selected = np.unique(sliding_window_view(hashes, w).argmin(axis=1) + np.arange(count - w + 1))
+        selected = selected[valid[selected]]
+        return values[selected], selected.astype(np.int64)
+
+    def save(self, path: str) -> str:
+        '''Saves arrays to `path` (e.g. genome.fa.pack.kmi.npz), returns the file name'''
+        np.savez(path, kmers=self.kmers, positions=self.positions, record_starts=self.record_starts,
+                 record_lengths=self.record_lengths, parameters=np.array([self.k, self.w]))
+        return path if path.endswith('.npz') else path + '.npz'
+
+    @classmethod
+    def load(cls, path: str) -> 'KmerIndex':
+        with np.load(path) as arrays:
+            k, w = arrays['parameters'].tolist()
+            return cls(arrays['kmers'], arrays['positions'], arrays['record_starts'], arrays['record_lengths'], k, w)
+
+    def seeds(self, query: Union[str, PackedSequence], max_occurrences: int = 500) -> Tuple[np.ndarray, np.ndarray]:
+        '''(query positions, reference positions) of all seed hits, repetitive seeds are dropped'''
+        letters = query.ascii() if isinstance(query, PackedSequence) else \
+            np.frombuffer(query.encode('ascii'), dtype=np.uint8)
+        values, query_positions = self.minimizers(letters, self.k, self.w)
+        first = np.searchsorted(self.kmers, values, side='left')
+        counts = np.searchsorted(self.kmers, values, side='right') - first
+        kept = (counts > 0) & (counts <= max_occurrences)
+        first, counts = first[kept], counts[kept]
+
+        # Rows first[i]..first[i] + counts[i] - 1 of every kept seed, flattened
+        rows = np.repeat(first - np.cumsum(counts) + counts, counts) + np.arange(counts.sum())
+        return np.repeat(query_positions[kept], counts), self.positions[rows]
+
+    def candidates(self, query: Union[str, PackedSequence], max_occurrences: int = 500, max_gap: int = 32,
+                   min_seeds: int = 2, max_candidates: int = 5) -> List[Dict[str, int]]:
+        '''
+        Chains of seed hits along diagonals, best first:
+        {'record': index of the record, 'seeds', 'diagonal_start', 'diagonal_end'} (diagonals in record coordinates)
+        '''
+        query_positions, reference_positions = self.seeds(query, max_occurrences)
+        if len(query_positions) == 0:
+            return []
+        records = np.searchsorted(self.record_starts, reference_positions, side='right') - 1
+        diagonals = reference_positions - query_positions
+
+        # 1. Sort by (record, diagonal), a chain breaks at a new record or a gap of diagonals
+        order = np.lexsort((diagonals, records))
+        records, diagonals, query_positions = records[order], diagonals[order], query_positions[order]
+        breaks = np.flatnonzero((np.diff(records) != 0) | (np.diff(diagonals) > max_gap)) + 1
+        starts = np.concatenate(([0], breaks))
+
+        # 2. Chains with the most seeds (a query position counts once per chain)
+        seeds = np.add.reduceat(np.ones(len(records), dtype=np.int64), starts)
+        chains = []
+        for chain in np.argsort(-seeds, kind='stable').tolist():
+            if seeds[chain] < min_seeds or len(chains) == max_candidates:
+                break
+            stop = starts[chain + 1] if chain + 1 < len(starts) else len(records)
+            distinct = len(np.unique(query_positions[starts[chain]:stop]))
+            if distinct < min_seeds:
+                continue
+            record = int(records[starts[chain]])
+            chains.append({'record': record, 'seeds': distinct,
+                           'diagonal_start': int(diagonals[starts[chain]] - self.record_starts[record]),
+                           'diagonal_end': int(diagonals[stop - 1] - self.record_starts[record])})
+        return chains
+
+    def search(self, query: Union[str, PackedSequence], reference: IndexedReference, mode: str = 'local',
+               scoring_sys: Optional[ScoringSystem] = None, flank: int = 32, max_hits: int = 5,
+               **candidate_options: Any) -> List[Tuple[str, AlignmentResult]]:
+        '''
+        Seed-and-extend: `mode` aligner (local or global) runs on the window of every candidate chain.
+        Windows hold the query on the chain's diagonals (plus `flank` bases for local alignment).
+        Returns [(record name, result)] by score. The record is seq_a (the reference of the CIGAR) and the query
+        is seq_b, seq_a coordinates of results are record coordinates.
+        '''
+        scoring_sys = scoring_sys or ScoringSystem(match=2, mismatch=-1, gap=-2)
+        names = reference.names
+        hits = []
+        for chain in self.candidates(query, max_candidates=max_hits, **candidate_options):
+            record = chain['record']
+            margin = flank if mode == 'local' else 0
+            start = max(0, chain['diagonal_start'] - margin)
+            stop = min(int(self.record_lengths[record]), chain['diagonal_end'] + len(query) + margin)
+            name = names[record]
+            window = reference.fetch(name, start, stop)
+
+            result = SequencesAnalyzer(window, query, scoring_sys=scoring_sys).align(mode)
+            # Window coordinates -> record coordinates
+            hits.append((name, replace(result, start=(result.start[0] + start, result.start[1]),
+                                       end=(result.end[0] + start, result.end[1]), seq_a=reference[name])))
+        return sorted(hits, key=lambda hit: -hit[1].score)
+
+    def __len__(self) -> int:
+        return len(self.kmers)
@@ -0,0 +1,136 @@
+import sys
+import json
+import time
+from contextlib import contextmanager, nullcontext
+from typing import Any, ContextManager, Dict, Iterator, Optional
+'''
+Instrumentation of the hot paths: phase timers and counters.
+
+Aligners report to the shared `metrics` instance:
+    with metrics.phase('fill'):
+        ...
+    metrics.count('cells', rows * cols)
+Phases: encode, compile, allocate, fill, traceback, render, input (nested phases count in both).
+Counters: cells (DP cells computed, all lanes), bytes_allocated (matrices).
+
+Recording is off by default, a disabled phase is a shared no-op context manager,
+so the instrumented code pays one attribute lookup per call (never per cell).
+'''
+
+
+class _Phase:
+    '''Adds the wall time of the `with` block to the phase'''
+
+    def __init__(self, metrics: 'Metrics', name: str) -> None:
+        self.metrics = metrics
+        self.name = name
+
+    def __enter__(self) -> None:
+        self.started = time.perf_counter()
+
+    def __exit__(self, *exc_info) -> None:
+        phase = self.metrics.phases.setdefault(self.name, {'seconds': 0.0, 'calls': 0})
+        phase['seconds'] += time.perf_counter() - self.started
+        phase['calls'] += 1
+
+
+class Metrics:
+
+    _disabled = nullcontext()
+
+    def __init__(self) -> None:
+        self.enabled = False
+        self.reset()
+
+    def reset(self) -> None:
+        self.phases: Dict[str, Dict[str, Any]] = {}
+        self.counters: Dict[str, int] = {}
+        self.started = time.perf_counter()
+
+    def enable(self) -> None:
+        self.enabled = True
+        self.reset()
+
+    def disable(self) -> None:
+        self.enabled = False
+
+    def phase(self, name: str) -> ContextManager:
+        if not self.enabled:
+            return self._disabled
+        return _Phase(self, name)
+
+    def count(self, name: str, value: int = 1) -> None:
+        if self.enabled:
+            self.counters[name] = self.counters.get(name, 0) + int(value)
+
+    def allocated(self, *arrays: Any) -> None:
+        '''Counts bytes of newly allocated numpy arrays'''
+        if self.enabled:
+            self.count('bytes_allocated', sum(array.nbytes for array in arrays))
+
+    def to_dict(self) -> Dict[str, Any]:
+        total = time.perf_counter() - self.started
+        cells = self.counters.get('cells', 0)
+        fill = self.phases.get('fill', {}).get('seconds', 0.0)
+        return {
+            'total_seconds': total,
+            'phases': self.phases,
+            'counters': self.counters,
+            'cells_per_second': cells / fill if fill else None,
+        }
+
+    def dump(self, output: str) -> None:
+        '''JSON to a file, '-' is stderr (stdout holds results)'''
+        text = json.dumps(self.to_dict(), indent=2)
+        if output == '-':
+            print(text, file=sys.stderr)
+        else:
+            with open(output, 'w') as f:
+                f.write(text + '\n')
+
+    @staticmethod
+    @contextmanager
+    def profile(profiler: Optional[str], output: Optional[str] = None) -> Iterator[None]:
+        '''
+        Profiles the `with` block: 'cprofile' or 'pyinstrument' (optional package), None does nothing.
+        Report goes to stderr, or `output` file (cProfile stats for pstats/snakeviz, pyinstrument HTML).
+        '''
+        if profiler is None:
+            yield
+            return
+
+        if profiler == 'pyinstrument':
+            try:
+                from pyinstrument import Profiler
+            except ImportError:
+                raise RuntimeError('pyinstrument is not installed (pip install pyinstrument), use cprofile')
+            instrument = Profiler()
+            instrument.start()
+            try:
+                yield
+            finally:
+                instrument.stop()
+                if output:
+                    with open(output, 'w') as f:
+                        f.write(instrument.output_html())
+                else:
+                    print(instrument.output_text(), file=sys.stderr)
+            return
+
+        # Profilers are imported only when a run is profiled
+        import cProfile
+        import pstats
+        profile = cProfile.Profile()
+        profile.enable()
+        try:
+            yield
+        finally:
+            profile.disable()
+            if output:
+                profile.dump_stats(output)
+            else:
+                pstats.Stats(profile, stream=sys.stderr).sort_stats('cumulative').print_stats(25)
+
+
+# Shared by all aligners (enabled by --metrics)
+metrics = Metrics()
@@ -0,0 +1,94 @@
+import numpy as np
+from typing import Optional
+from Metrics import metrics
+'''
+Bit-parallel edit distance (Myers 1999, global variant by Hyyrö 2001).
+
+Column of the DP matrix is kept as two bit-vectors of vertical deltas (+1 / -1),
+so one letter of the text updates the whole column with a handful of
+bitwise operations on Python big ints (~64 cells per machine word).
+- Time complexity: O(nm / w)
+- Space complexity: O(n) bits
+Works only for unit costs (Levenshtein distance): match=0, mismatch=1, gap=1.
+'''
+
+
+class MyersAlgorithm:
+
+    def __init__(self, table: np.ndarray, gap_code: int) -> None:
+        '''Same arguments as AlignmentEngine'''
+        self.table = table
+        self.gap_code = gap_code
+
+    def supports(self, seq_a: np.ndarray, seq_b: np.ndarray) -> bool:
+        '''True when the costs of all letters used by the sequences are unit costs'''
+        # Letters present are counted, not sorted (np.unique also imports numpy.ma on its first call)
+        present = np.bincount(seq_a, minlength=len(self.table)) + np.bincount(seq_b, minlength=len(self.table))
+        present[self.gap_code] = 1
+        letters = np.flatnonzero(present)
+        costs = self.table[np.ix_(letters, letters)]
+        # 0 on the diagonal (match), 1 elsewhere (mismatch and gaps)
+        unit_costs = 1 - np.eye(len(letters), dtype=costs.dtype)
+        return bool((costs == unit_costs).all())
+
+    def distance(self, seq_a: np.ndarray, seq_b: np.ndarray, max_distance: Optional[int] = None) -> Optional[int]:
+        '''
+        Levenshtein distance between encoded sequences.
+        `max_distance` - return None as soon as the distance is known to be larger (threshold query)
+        '''
+        if max_distance is not None and abs(len(seq_a) - len(seq_b)) > max_distance:
+            # Every alignment has that many gaps
+            return None
+        metrics.count('cells', len(seq_a) * len(seq_b))
+        with metrics.phase('fill'):
+            return self._distance(seq_a, seq_b, max_distance)
+
+    def _distance(self, seq_a: np.ndarray, seq_b: np.ndarray, max_distance: Optional[int] = None) -> Optional[int]:
+        # Pattern (bits of a column) should be the shorter one
+        if len(seq_a) > len(seq_b):
+            seq_a, seq_b = seq_b, seq_a
+        m = len(seq_a)
+        if m == 0:
+            return len(seq_b)
+
+        mask = (1 << m) - 1
+        high_bit = 1 << (m - 1)
+
+        # 1. Match vectors: bit i is set when seq_a[i] == letter
+        peq = {}
+        for letter in np.flatnonzero(np.bincount(seq_a)):
+            bits = np.packbits(seq_a == letter, bitorder='little')
+            peq[int(letter)] = int.from_bytes(bits.tobytes(), 'little')
+
+        # 2. Column 0 is 0, 1, 2, ..., m -> all vertical deltas are +1
+        positive_v, negative_v = mask, 0
+        score = m
+        # Distance in the last row changes by at most 1 per column, so it cannot drop below score - columns left
+        cutoff = None if max_distance is None else max_distance + len(seq_b)
+
+        for letter in seq_b.tolist():
+            eq = peq.get(letter, 0)
+            xv = eq | negative_v
+            xh = (((eq & positive_v) + positive_v) ^ positive_v) | eq
+
+            positive_h = negative_v | (~(xh | positive_v) & mask)
+            negative_h = positive_v & xh
+
+            # Horizontal delta of the last row updates the distance
+            if positive_h & high_bit:
+                score += 1
+            elif negative_h & high_bit:
+                score -= 1
+            if cutoff is not None:
+                cutoff -= 1
+                if score > cutoff:
+                    return None
+
+            # Row 0 is 0, 1, 2, ... -> +1 is shifted in (global distance)
+            positive_h = ((positive_h << 1) | 1) & mask
+            negative_h = (negative_h << 1) & mask
+
+            positive_v = negative_h | (~(xv | positive_h) & mask)
+            negative_v = positive_h & xv
+
+        return score
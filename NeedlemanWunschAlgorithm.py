@@ -1,4 +1,6 @@
 import numpy as np
+from typing import Iterator
+from Metrics import metrics
 
 
 class NeedlemanWunschAlgorithm:
@@ -6,40 +8,57 @@ class NeedlemanWunschAlgorithm:
         self.aligned_seq_a: str = ''
         self.aligned_seq_b: str = ''
         self.scoring_sys = scoring_sys
-    
+
     def align(self, seq_a: str, seq_b: str):
         self.execute(seq_a, seq_b)
         # print(self.aligned_seq_a)
         # print(self.aligned_seq_b)
 
-    def execute(self, seq_a: str, seq_b: str):
+    def execute(self, seq_a: str, seq_b: str) -> np.ndarray:
         # 1. Prepare dimensions (required additional 1 column and 1 row)
         rows, cols = len(seq_a) + 1, len(seq_b) + 1
 
         # 2. Initialize matrices
         # Use grid/matrix as graph-like acyclic digraph (array cells are vertices)
         H = np.zeros(shape=(rows, cols), dtype=int)
-        score_func = self.scoring_sys.score
+
+        codes_a = self.scoring_sys.encode(seq_a)
+        codes_b = self.scoring_sys.encode(seq_b)
+        for row, values in enumerate(self.rows(codes_a, codes_b)):
+            H[row, :] = values
+        return H
+
+    def last_row(self, codes_a: np.ndarray, codes_b: np.ndarray) -> np.ndarray:
+        '''H[-1, :] computed in O(m) memory (only one row is kept)'''
+        metrics.count('cells', len(codes_a) * len(codes_b))
+        with metrics.phase('fill'):
+            for values in self.rows(codes_a, codes_b):
+                pass
+        return values
+
+    def rows(self, codes_a: np.ndarray, codes_b: np.ndarray) -> Iterator[np.ndarray]:
+        '''Yields rows of H one by one, arguments are encoded sequences (ScoringSystem.encode)'''
+        matrix = self.scoring_sys.matrix
+        gap_code = self.scoring_sys.gap_code
+
+        # Gap scores: letter of seq_a against '-' (vertical move), '-' against letter of seq_b (horizontal move)
+        delete_cost = matrix[codes_a, gap_code].astype(int)
+        insert_cost = matrix[gap_code, codes_b].astype(int)
+        # Score of reaching column col moving only horizontally from column 0
+        insert_total = np.concatenate(([0], np.cumsum(insert_cost)))
 
         # 3. 1st row and column need to have negative values
-        # Top row and leftmost column, are like: 0, -1*d, -2*d, -3*d, etc.
-        # d is gap penalty
-        d = self.scoring_sys.gap
-        H[0, :] = np.arange(start=0, stop=d * cols, step=d)
-        H[:, 0] = np.arange(start=0, stop=d * rows, step=d)
-
-        for row in range(1, rows):
-            for col in range(1, cols):
-                # Current pair of letters from sequence A and B
-                a = seq_a[row - 1]
-                b = seq_b[col - 1]
-
-                leave_or_replace_letter = H[row - 1, col - 1] + score_func(a, b)
-                delete_indel = H[row - 1, col] +  score_func('-', b)
-                insert_indel = H[row, col - 1] + score_func(a, '-')
-
-                scores = [leave_or_replace_letter, delete_indel, insert_indel]
-                best_action = np.argmax(scores)
-
-                H[row, col] = scores[best_action]
-        return H
\ No newline at end of file
+        # Top row and leftmost column are sums of gap penalties, like: 0, -1*d, -2*d, -3*d, etc.
+        row = insert_total
+        yield row
+
+        for a, g in zip(codes_a.tolist(), delete_cost.tolist()):
+            # Whole row of letter pairs scored with one lookup
+            leave_or_replace_letter = row[:-1] + matrix[a, codes_b]
+            delete_indel = row[1:] + g
+            best = np.concatenate(([row[0] + g], np.maximum(leave_or_replace_letter, delete_indel)))
+
+            # Insertions chain along the row: H[col] = max(best[col], H[col - 1] + insert_cost[col])
+            # Solved without a loop: H[col] = insert_total[col] + max(best[k] - insert_total[k]) over k <= col
+            row = np.maximum.accumulate(best - insert_total) + insert_total
+            yield row
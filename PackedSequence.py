@@ -0,0 +1,139 @@
+import numpy as np
+from typing import Any, Tuple, Union
+'''
+Nucleotide sequence packed 4 bases per byte (2 bits per base).
+Symbols other than the 4 nucleotides (N, IUPAC codes, ...) are kept
+in an exception list of runs (start, length, letter), so long runs of N cost almost nothing.
+Letters are uppercased first: soft-masking (lowercase repeats of reference genomes) is lost,
+otherwise every masked run would be an exception run.
+Arrays may be views of a memory-mapped file (see IndexedReference), `window` never copies the bases.
+'''
+
+
+class PackedSequence:
+
+    # 2-bit codes are indexes of these letters (RNA uses U instead of T)
+    dna_alphabet: bytes = b'ACGT'
+    rna_alphabet: bytes = b'ACGU'
+
+    def __init__(self, sequence: Union[str, bytes]) -> None:
+        if isinstance(sequence, str):
+            try:
+                sequence = sequence.encode('ascii')
+            except UnicodeEncodeError:
+                raise ValueError(f'Sequence contains non-ASCII symbols: {sequence!r}')
+        sequence = sequence.upper()
+        raw = np.frombuffer(sequence, dtype=np.uint8)
+        self.length = len(raw)
+
+        # 1. Alphabet: RNA when there is U and no T
+        has_uracil = ord('U') in sequence and ord('T') not in sequence
+        self.alphabet = self.rna_alphabet if has_uracil else self.dna_alphabet
+
+        # 2. Byte -> 2-bit code, 255 marks exceptions
+        codes = np.full(256, 255, dtype=np.uint8)
+        codes[list(self.alphabet)] = np.arange(4, dtype=np.uint8)
+        packed_codes = codes[raw]
+
+        # 3. Exceptions as runs of the same symbol (stored as A in the packed array)
+        is_exception = packed_codes == 255
+        packed_codes[is_exception] = 0
+        positions = np.flatnonzero(is_exception)
+        letters = raw[positions]
+        run_starts = np.ones(len(positions), dtype=bool)
+        run_starts[1:] = (np.diff(positions) != 1) | (letters[1:] != letters[:-1])
+        starts = np.flatnonzero(run_starts)
+        self.exception_starts = positions[starts]
+        self.exception_lengths = np.diff(np.append(starts, len(positions)))
+        self.exception_letters = letters[starts]
+
+        # 4. 4 codes per byte, 1st base in the lowest bits
+        padded = np.zeros(-(-self.length // 4) * 4, dtype=np.uint8)
+        padded[:self.length] = packed_codes
+        quads = padded.reshape(-1, 4)
+        self.packed = quads[:, 0] | (quads[:, 1] << 2) | (quads[:, 2] << 4) | (quads[:, 3] << 6)
+        # Bases skipped in the 1st byte of `packed` (windows)
+        self.offset = 0
+
+    @classmethod
+    def from_arrays(cls, packed: np.ndarray, length: int, alphabet: bytes, exception_starts: np.ndarray,
+                    exception_lengths: np.ndarray, exception_letters: np.ndarray, offset: int = 0) -> 'PackedSequence':
+        '''Wraps already packed arrays (no copy), exception runs are relative to the 1st base'''
+        sequence = cls.__new__(cls)
+        sequence.packed = packed
+        sequence.length = length
+        sequence.alphabet = alphabet
+        sequence.exception_starts = exception_starts
+        sequence.exception_lengths = exception_lengths
+        sequence.exception_letters = exception_letters
+        sequence.offset = offset
+        return sequence
+
+    def window(self, start: int, stop: int) -> 'PackedSequence':
+        '''Bases start..stop - 1 as PackedSequence sharing the packed bytes (only exception runs are copied)'''
+        start, stop, _ = slice(start, stop).indices(self.length)
+        stop = max(start, stop)
+        first, last = self._exception_range(start, stop)
+        ends = np.minimum(self.exception_starts[first:last] + self.exception_lengths[first:last], stop)
+        starts = np.maximum(self.exception_starts[first:last], start)
+
+        base = self.offset + start
+        return PackedSequence.from_arrays(self.packed[base // 4:-(-(self.offset + stop) // 4)], stop - start,
+                                          self.alphabet, starts - start, ends - starts,
+                                          np.array(self.exception_letters[first:last]), offset=base % 4)
+
+    @property
+    def nbytes(self) -> int:
+        '''Memory used by the arrays'''
+        return (self.packed.nbytes + self.exception_starts.nbytes
+                + self.exception_lengths.nbytes + self.exception_letters.nbytes)
+
+    def ascii(self, start: int = 0, stop: int = None) -> np.ndarray:
+        '''Letters start..stop - 1 as uint8 array of ASCII codes (only the needed bytes are unpacked)'''
+        start, stop, _ = slice(start, stop).indices(self.length)
+        stop = max(start, stop)
+
+        # 1. Unpack whole bytes covering the range
+        first_byte, last_byte = (self.offset + start) // 4, -(-(self.offset + stop) // 4)
+        shifts = np.array([0, 2, 4, 6], dtype=np.uint8)
+        codes = (self.packed[first_byte:last_byte, None] >> shifts) & 3
+        letters = np.frombuffer(self.alphabet, dtype=np.uint8)[codes.reshape(-1)]
+        skipped = self.offset - first_byte * 4
+        letters = letters[skipped + start:skipped + stop]
+
+        # 2. Put back exceptions overlapping the range
+        first, last = self._exception_range(start, stop)
+        for run_start, run_length, letter in zip(self.exception_starts[first:last].tolist(),
+                                                 self.exception_lengths[first:last].tolist(),
+                                                 self.exception_letters[first:last].tolist()):
+            letters[max(run_start, start) - start:min(run_start + run_length, stop) - start] = letter
+        return letters
+
+    def _exception_range(self, start: int, stop: int) -> Tuple[int, int]:
+        '''Indexes of exception runs overlapping start..stop - 1 (runs are sorted and disjoint)'''
+        first = int(np.searchsorted(self.exception_starts, start, side='right'))
+        # Run starting before `start` may still cover it
+        if first > 0 and self.exception_starts[first - 1] + self.exception_lengths[first - 1] > start:
+            first -= 1
+        last = int(np.searchsorted(self.exception_starts, stop, side='left'))
+        return first, max(first, last)
+
+    def __len__(self) -> int:
+        return self.length
+
+    def __getitem__(self, index: Any) -> str:
+        '''Letter or slice (step 1) as str'''
+        if isinstance(index, slice):
+            assert index.step in (None, 1), 'Only contiguous slices are supported'
+            return self.ascii(index.start, index.stop).tobytes().decode('ascii')
+        if index < 0:
+            index += self.length
+        if not 0 <= index < self.length:
+            raise IndexError('PackedSequence index out of range')
+        return self.ascii(index, index + 1).tobytes().decode('ascii')
+
+    def __str__(self) -> str:
+        return self.ascii().tobytes().decode('ascii')
+
+    def __repr__(self) -> str:
+        return f'PackedSequence(length={self.length}, exception_runs={len(self.exception_starts)})'
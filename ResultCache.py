@@ -0,0 +1,161 @@
+import sys
+import pickle
+import hashlib
+import threading
+import numpy as np
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple, Union
+from PackedSequence import PackedSequence
+from ScoringSystem import ScoringSystem
+'''
+Cache of pairwise results (scores, alignments).
+
+Keys are digests of (mode, scoring system, seq_a, seq_b):
+- sequences are hashed by their letters (str and PackedSequence of the same letters give the same digest)
+- scoring system is hashed by its compiled matrix and gap opening score, so CSV contents are included
+- symmetric results (scores with a symmetric matrix) sort the sequence digests, so (b, a) hits the entry of (a, b)
+
+Values are pickled and kept in an in-memory LRU limited by its total size: keys, pickled values
+and the per-entry overhead of the OrderedDict are counted (small scores are ~40 bytes of ~230 per entry).
+With `path` they are also stored in a SQLite file and survive between runs.
+A cache may be shared between threads (e.g. looked up while a process pool is fed).
+'''
+
+
+class ResultCache:
+
+    # Bytes of an OrderedDict entry besides its key and value (hash table slot, linked list node, resize slack)
+    entry_overhead = 100
+
+    def __init__(self, max_bytes: int = 64 << 20, path: Optional[str] = None) -> None:
+        self.max_bytes = max_bytes
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self._memory: 'OrderedDict[str, bytes]' = OrderedDict()
+        # (id(matrix), gap_open) -> (matrix, digest, is symmetric), the matrix is kept so its id is not reused
+        self._scoring_digests: Dict[Tuple[int, int], Tuple[np.ndarray, bytes, bool]] = {}
+
+        self._lock = threading.RLock()
+        self.db = None
+        if path:
+            import sqlite3
+            self.db = sqlite3.connect(path, check_same_thread=False)
+            self.db.execute('CREATE TABLE IF NOT EXISTS results (key TEXT PRIMARY KEY, value BLOB)')
+        self._uncommitted = 0
+
+    @staticmethod
+    def digest(sequence: Union[str, PackedSequence]) -> bytes:
+        '''Digest of the letters of a sequence'''
+        if isinstance(sequence, PackedSequence):
+            letters = sequence.ascii().tobytes()
+        else:
+            letters = sequence.encode('ascii', errors='surrogateescape')
+        return hashlib.blake2b(letters, digest_size=16).digest()
+
+    def key(self, mode: str, scoring_sys: ScoringSystem, seq_a: Union[str, PackedSequence, bytes],
+            seq_b: Union[str, PackedSequence, bytes], symmetric: bool = False) -> str:
+        '''
+        Sequences may be given as their `digest` (precomputed for many pairs).
+        `symmetric` - result does not depend on the order of the sequences (only if the scoring matrix is symmetric)
+        '''
+        digest_a = seq_a if isinstance(seq_a, bytes) else self.digest(seq_a)
+        digest_b = seq_b if isinstance(seq_b, bytes) else self.digest(seq_b)
+        scoring_digest, is_symmetric = self._scoring_digest(scoring_sys)
+        if symmetric and is_symmetric:
+            digest_a, digest_b = sorted((digest_a, digest_b))
+
+        key = hashlib.blake2b(mode.encode(), digest_size=20)
+        for part in (scoring_digest, digest_a, digest_b):
+            key.update(part)
+        return key.hexdigest()
+
+    def get(self, key: str, default: Any = None) -> Any:
+        with self._lock:
+            value = self._memory.get(key)
+            if value is not None:
+                self._memory.move_to_end(key)
+            elif self.db is not None:
+                row = self.db.execute('SELECT value FROM results WHERE key = ?', (key,)).fetchone()
+                if row is not None:
+                    value = row[0]
+                    self._remember(key, value)
+
+            if value is None:
+                self.misses += 1
+                return default
+            self.hits += 1
+        return pickle.loads(value)
+
+    def put(self, key: str, value: Any) -> None:
+        pickled = pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL)
+        with self._lock:
+            if self._memory.get(key) == pickled:
+                # Just read from the cache, nothing to write
+                self._memory.move_to_end(key)
+                return
+            self._remember(key, pickled)
+            if self.db is not None:
+                self.db.execute('INSERT OR REPLACE INTO results (key, value) VALUES (?, ?)', (key, pickled))
+                # Commit in groups, a transaction per result would dominate the run time
+                self._uncommitted += 1
+                if self._uncommitted >= 1000:
+                    self.commit()
+
+    def commit(self) -> None:
+        with self._lock:
+            if self.db is not None:
+                self.db.commit()
+                self._uncommitted = 0
+
+    def close(self) -> None:
+        with self._lock:
+            if self.db is not None:
+                self.commit()
+                self.db.close()
+                self.db = None
+
+    def __contains__(self, key: str) -> bool:
+        with self._lock:
+            if key in self._memory:
+                return True
+            return self.db is not None and \
+                self.db.execute('SELECT 1 FROM results WHERE key = ?', (key,)).fetchone() is not None
+
+    def __len__(self) -> int:
+        '''Entries kept in memory'''
+        return len(self._memory)
+
+    def __enter__(self) -> 'ResultCache':
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+    def _remember(self, key: str, pickled: bytes) -> None:
+        '''Put into the in-memory LRU, evict least recently used entries above `max_bytes`'''
+        if key in self._memory:
+            self.size -= self._entry_size(key, self._memory.pop(key))
+        size = self._entry_size(key, pickled)
+        if size > self.max_bytes:
+            # Would evict everything else
+            return
+        self._memory[key] = pickled
+        self.size += size
+        while self.size > self.max_bytes:
+            self.size -= self._entry_size(*self._memory.popitem(last=False))
+
+    def _entry_size(self, key: str, pickled: bytes) -> int:
+        '''Memory held by an in-memory entry'''
+        return sys.getsizeof(key) + sys.getsizeof(pickled) + self.entry_overhead
+
+    def _scoring_digest(self, scoring_sys: ScoringSystem) -> Tuple[bytes, bool]:
+        matrix = scoring_sys.matrix
+        # Digest is computed once per compiled matrix
+        memo_key = (id(matrix), scoring_sys.gap_open)
+        if memo_key not in self._scoring_digests:
+            digest = hashlib.blake2b(matrix.tobytes(), digest_size=16)
+            digest.update(f'{matrix.shape}:{scoring_sys.gap_code}:{scoring_sys.gap_open}'.encode())
+            self._scoring_digests[memo_key] = (matrix, digest.digest(), bool(np.array_equal(matrix, matrix.T)))
+        _, digest, is_symmetric = self._scoring_digests[memo_key]
+        return digest, is_symmetric
@@ -1,51 +1,151 @@
-import pandas as pd
+import string
+import numpy as np
+from typing import Dict, Optional, Union
+from PackedSequence import PackedSequence
+from Metrics import metrics
 
 '''
 Things to try out:
 print(ScoringSystem(load_from_csv=True))
 print(ScoringSystem())
 print(ScoringSystem(match=10, gap=-5))
+print(ScoringSystem(match=2, gap=-1, gap_open=-10))
 '''
 
 class ScoringSystem:
     '''Responsible for returning proper scoring/edit cost values for any letter combination'''
 
-    def __init__(self, match: int=1, mismatch: int=-1, gap: int=-1) -> None:
+    # Every symbol that can be encoded (gap and nucleotides first, code = index)
+    alphabet: str = '-ACGTUN' + ''.join(
+        letter for letter in string.printable if letter not in '-ACGTUN' + string.whitespace)
+    gap_code: int = 0
+
+    # Byte value -> letter code, 255 marks symbols outside of the alphabet
+    _codes = np.full(256, 255, dtype=np.uint8)
+    _codes[[ord(letter) for letter in alphabet]] = np.arange(len(alphabet), dtype=np.uint8)
+
+    def __init__(self, match: int=1, mismatch: int=-1, gap: int=-1, gap_open: int=0) -> None:
         self.match = match
         self.mismatch = mismatch
         self.gap = gap
-        self.custom_scoring = None
+        # Affine gaps: run of k gaps scores gap_open + k * gap_extend (0 - linear gaps)
+        self.gap_open = gap_open
+        # CSV scores: custom_scoring[a][b] == score(a, b), a - column letter, b - row letter
+        self.custom_scoring: Optional[Dict[str, Dict[str, int]]] = None
+        self._matrix = None
+
+    @property
+    def gap_extend(self) -> int:
+        '''Score of every gap of a run, the same as `gap` (CSV '-' row/column can override it per letter)'''
+        return self.gap
 
     def load_csv(self, filename: str) -> None:
-        self.custom_scoring = pd.read_csv(filename, header=0, index_col=0, sep=' ')
+        self.custom_scoring = self.read_table(filename)
+        self._matrix = None
+
+    @staticmethod
+    def read_table(filename: str) -> Dict[str, Dict[str, int]]:
+        '''
+        Space separated table: header line with a corner cell and column letters, then a line per row letter
+        with its scores. Returns {column: {row: score}}.
+        '''
+        with open(filename) as f:
+            lines = [line.split() for line in f if line.strip()]
+        if not lines:
+            raise ValueError(f'{filename} is empty')
+
+        columns = lines[0][1:]
+        table = {column: {} for column in columns}
+        for number, (row, *scores) in enumerate(lines[1:], start=2):
+            if len(scores) != len(columns):
+                raise ValueError(f'{filename}:{number}: {len(scores)} scores, {len(columns)} columns expected')
+            for column, score in zip(columns, scores):
+                table[column][row] = int(score)
+        return table
+
+    @property
+    def matrix(self) -> np.ndarray:
+        '''
+        Dense substitution matrix over `alphabet` codes: matrix[code(a), code(b)] == score(a, b)
+        Compiled once, so algorithms can score whole rows with a single fancy-indexing operation.
+        '''
+        if self._matrix is None:
+            with metrics.phase('compile'):
+                self._matrix = self._compile()
+        return self._matrix
+
+    def _compile(self) -> np.ndarray:
+        size = len(self.alphabet)
+
+        # 1. Defaults: match on the diagonal (also '-' vs '-'), gap in '-' row and column, mismatch elsewhere
+        matrix = np.full(shape=(size, size), fill_value=self.mismatch, dtype=np.int64)
+        matrix[self.gap_code, :] = self.gap
+        matrix[:, self.gap_code] = self.gap
+        np.fill_diagonal(matrix, self.match)
+
+        # 2. Overwrite with CSV values, custom_scoring[a][b] == score(a, b)
+        if self.custom_scoring is not None:
+            for a, column in self.custom_scoring.items():
+                for b, score in column.items():
+                    matrix[self._codes[ord(a)], self._codes[ord(b)]] = score
+
+        small_int = np.iinfo(np.int16)
+        if matrix.min() < small_int.min or matrix.max() > small_int.max:
+            raise ValueError(f'Scores must fit into {small_int.dtype}: {self}')
+        return matrix.astype(np.int16)
 
-    def _default_scoring(self, a: str, b: str) -> int:
-        '''Checks if there's a match/mismatch/gap for letters a and b'''
-        if a == b:
-            return self.match
-        elif a == '-' or b == '-':
-            return self.gap
-        return self.mismatch
+    def encode(self, sequence: Union[str, PackedSequence]) -> np.ndarray:
+        '''Translate sequence into uint8 array of letter codes (indexes of `matrix`)'''
+        with metrics.phase('encode'):
+            return self._encode(sequence)
+
+    def _encode(self, sequence: Union[str, PackedSequence]) -> np.ndarray:
+        if isinstance(sequence, PackedSequence):
+            raw = sequence.ascii()
+        else:
+            try:
+                raw = np.frombuffer(sequence.encode('ascii'), dtype=np.uint8)
+            except UnicodeEncodeError:
+                raise ValueError(f'Sequence contains non-ASCII symbols: {sequence!r}')
+
+        encoded = self._codes[raw]
+        if (encoded == 255).any():
+            raise ValueError(f'Sequence contains symbols which cannot be scored: {sequence!r}')
+
+        self._warn_missing(encoded)
+        return encoded
+
+    def decode(self, encoded: np.ndarray) -> str:
+        '''Inverse of encode'''
+        return ''.join(self.alphabet[code] for code in encoded)
+
+    def _warn_missing(self, encoded: np.ndarray) -> None:
+        '''In case some letter was not present in CSV file, default scoring value is used'''
+        if self.custom_scoring is None:
+            return
+        rows = set(letter for column in self.custom_scoring.values() for letter in column)
+        known = set(self.custom_scoring) & rows
+        missing = set(self.decode(np.unique(encoded))) - known
+        if missing:
+            print(f'WARNING: Keys {sorted(missing)} not found. You using defaults: {self.match}/{self.mismatch}/{self.gap}')
 
     def score(self, a: str, b: str) -> int:
-        '''This method should be used by algorithms'''
+        '''Single pair lookup, algorithms should rather use `encode` and `matrix`'''
         assert isinstance(a, str) and isinstance(b, str)
         assert len(a) == 1 and len(b) == 1
+        code_a, code_b = self.encode(a + b)
+        return int(self.matrix[code_a, code_b])
 
-        # Use CSV file
-        if self.custom_scoring is not None:
-            try:
-                return self.custom_scoring[a][b]
-            except KeyError:
-                print(f'WARNING: Key not found. You using defaults: {self.__str__}')
-                # In case some letter was not present in CSV file, use default scoring value
-                return self._default_scoring(a, b)
-        # Simply use match/mismatch/gap values
-        else:
-            return self._default_scoring(a, b)
-        
     def __str__(self):
         if self.custom_scoring is not None:
-            # Use pandas DataFrame __str__ representation
-            return str(self.custom_scoring)
+            # Table like the CSV file, columns aligned
+            columns = list(self.custom_scoring)
+            rows = list(next(iter(self.custom_scoring.values()), {}))
+            cells = [columns] + [[str(self.custom_scoring[column][row]) for column in columns] for row in rows]
+            width = max(len(cell) for line in cells for cell in line)
+            label_width = max(map(len, rows), default=0)
+            return '\n'.join(label.ljust(label_width) + ' ' + ' '.join(cell.rjust(width) for cell in line)
+                             for label, line in zip([''] + rows, cells))
+        if self.gap_open:
+            return f'Match: {self.match}, Mismatch: {self.mismatch}, Gap open: {self.gap_open}, Gap extend: {self.gap}'
         return f'Match: {self.match}, Mismatch: {self.mismatch}, Gap: {self.gap}'
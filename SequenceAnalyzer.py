@@ -1,7 +1,16 @@
 import numpy as np
-from typing import Tuple, Dict, Any
+from typing import Tuple, Dict, Any, List, Optional, Union
 from ScoringSystem import ScoringSystem
+from PackedSequence import PackedSequence
+from AlignmentEngine import AlignmentEngine
+from MyersAlgorithm import MyersAlgorithm
+from StripedSmithWaterman import StripedSmithWaterman
+from ResultCache import ResultCache
+from SummaryEngine import SummaryEngine
+from AlignmentResult import AlignmentResult
+from Metrics import metrics
 from copy import copy
+from dataclasses import replace
 '''
 Authors:
 - Michal Martyniak (github: @micmarty)
@@ -27,13 +36,35 @@ class SequencesAnalyzer:
         2: '←',
         3: '•'
     }
-
-    def __init__(self, seq_a: str, seq_b: str, load_csv: bool = False) -> None:
+    # Bigger matrices are rendered truncated (top-left corner of render_window x render_window cells)
+    render_limit = 10000
+    render_window = 20
+
+    def __init__(self, seq_a: Union[str, PackedSequence], seq_b: Union[str, PackedSequence], load_csv: bool = False, show_matrices: bool = False,
+                 band: Optional[int] = None, scoring_sys: Optional[ScoringSystem] = None,
+                 edit_cost_sys: Optional[ScoringSystem] = None, gap_open: int = 0,
+                 cache: Optional[ResultCache] = None) -> None:
+        '''
+        Sequences are str or PackedSequence (see SequenceReader).
+        Pass `scoring_sys`/`edit_cost_sys` to share already compiled scoring systems between many pairs.
+        `gap_open` - affine gap opening score of the default scoring system (similarity and alignments)
+        `cache` - scores and alignments are looked up there first and stored after computing
+        '''
         self.seq_a = seq_a
         self.seq_b = seq_b
-
-        self.scoring_sys = ScoringSystem(match=2, mismatch=-1, gap=-2)
-        self.edit_cost_sys = ScoringSystem(match=0, mismatch=1, gap=1)
+        # Similarity and edit distance build full matrices only for visualization
+        self.show_matrices = show_matrices
+        # Initial band for global alignment, similarity and edit distance (None - whole matrix, 0 - automatic)
+        self.band = band
+        self.cache = cache
+        # Filled matrices ('similarity', 'edit-distance', 'local' -> result), similarity and global alignment share one
+        self._filled: Dict[str, Dict[str, Any]] = {}
+        # Results of this pair (mode -> value), also when there is no cache
+        self._results: Dict[str, Any] = {}
+        self._digests: Optional[Tuple[bytes, bytes]] = None
+
+        self.scoring_sys = scoring_sys or ScoringSystem(match=2, mismatch=-1, gap=-2, gap_open=gap_open)
+        self.edit_cost_sys = edit_cost_sys or ScoringSystem(match=0, mismatch=1, gap=1)
 
         if load_csv:
             self.scoring_sys.load_csv('scores.csv')
@@ -43,139 +74,267 @@ class SequencesAnalyzer:
             print('[Scoring system]\n', self.scoring_sys)
             print('[Edit cost system]\n', self.edit_cost_sys)
 
-    def global_alignment(self) -> Tuple[str, str]:
-        result: Dict[str, Any] = self.needleman_wunsch_algorithm(
-            minimize=False, alignment_cal=True)
-        # result: Dict[str, Any] = self.NWScore(seq_a=self.seq_a, seq_b=self.seq_b)
-        alignment_a, alignment_b = self._traceback(
-            result_matrix=result['result_matrix'],
-            traceback_matrix=result['traceback_matrix'],
-            start_pos=result['score_pos'],
-            global_alignment=True)
+    def summary(self) -> None:
+        '''
+        Edit distance, similarity, local and global alignment (printed like by their own methods).
+        Scores and matrices which are not known yet come from a single pass over the DP grid (SummaryEngine),
+        tracebacks are done afterwards only for the alignments.
+        With a band the global scores are not fused (a lane fills the whole grid): similarity and global alignment
+        share one banded fill, edit distance is computed by edit_distance (banded or bit-parallel).
+        '''
+        summary_engine = SummaryEngine(self.scoring_sys.gap_code)
+        matrices = []
+        small = (len(self.seq_a) + 1) * (len(self.seq_b) + 1) <= self.render_limit
+
+        # 1. Lanes of the fill
+        if self.band is None and (self.show_matrices or self._from_cache('edit-distance', self.edit_cost_sys) is None):
+            summary_engine.add_lane('edit-distance', self.edit_cost_sys.matrix, self.edit_cost_sys.gap_open,
+                                    minimize=True)
+            if self.show_matrices:
+                matrices.append('edit-distance')
+        global_unknown = self._from_cache(f'global-alignment:{self.band}', self.scoring_sys) is None or \
+            self._from_cache('similarity', self.scoring_sys, symmetric=True) is None
+        if self.band is None and global_unknown:
+            summary_engine.add_lane('similarity', self.scoring_sys.matrix, self.scoring_sys.gap_open)
+            matrices.append('similarity')
+        if small and self._from_cache('local-alignment', self.scoring_sys) is None:
+            # Long sequences are aligned on the region found by the striped aligner
+            summary_engine.add_lane('local', self.scoring_sys.matrix, self.scoring_sys.gap_open, local=True)
+            matrices.append('local')
+
+        # 2. Single fill, sequences are encoded once
+        if summary_engine.lanes:
+            seq_a, seq_b = self.scoring_sys.encode(self.seq_a), self.scoring_sys.encode(self.seq_b)
+            self.edit_cost_sys._warn_missing(np.concatenate((seq_a, seq_b)))
+            for name, result in summary_engine.run(seq_a, seq_b, matrices=matrices).items():
+                if name == 'local':
+                    self._to_cache('local-score', self.scoring_sys, result['score'], symmetric=True)
+                else:
+                    scoring_sys = self.edit_cost_sys if name == 'edit-distance' else self.scoring_sys
+                    self._to_cache(name, scoring_sys, result['score'], symmetric=True)
+                if name in matrices:
+                    self._filled[name] = result
+        if self.band is not None and global_unknown:
+            # Banded fill (exact after widening) gives the similarity and the matrices of the global alignment
+            result = self.needleman_wunsch_algorithm(minimize=False)
+            self._to_cache('similarity', self.scoring_sys, int(result['score']), symmetric=True)
+
+        # 3. Print (matrices and scores are taken from above)
+        self.edit_distance()
+        self.similarity()
+        self.local_alignment()
+        self.global_alignment()
+
+    def align(self, mode: str = 'global', keep_matrices: bool = False) -> AlignmentResult:
+        '''
+        Global or local alignment as a result object, nothing is printed or rendered.
+        `keep_matrices` - keep the filled matrices in the result (for render_matrix/render_traceback),
+        otherwise they are dropped after the traceback and long local alignments fill only the region they cover
+        '''
+        if mode == 'global':
+            cache_mode = f'global-alignment:{self.band}'
+        elif mode == 'local':
+            cache_mode = 'local-alignment'
+        else:
+            raise ValueError(f"Unknown alignment mode '{mode}' (global or local)")
 
-        print(
-            f"[Global Alignment] Score={result['score']}\n"
-            f"Result:\n {result['result_matrix']}\n"
-            f"Traceback:\n {result['traceback_matrix']}\n"
-            f"Alignment:\n {alignment_a}\n {alignment_b}\n"
-        )
+        cached = self._from_cache(cache_mode, self.scoring_sys)
+        if cached is not None and not keep_matrices:
+            return replace(cached, cached=True, seq_a=self.seq_a, seq_b=self.seq_b)
 
-        return alignment_a, alignment_b
+        if mode == 'global':
+            result = self._align(self.needleman_wunsch_algorithm(minimize=False), global_alignment=True)
+        elif keep_matrices or 'local' in self._filled or \
+                (len(self.seq_a) + 1) * (len(self.seq_b) + 1) <= self.render_limit:
+            result = self._align(self.smith_waterman_algorithm(), global_alignment=False)
+        else:
+            result = self._align_local_bounded()
 
-    def local_alignment(self) -> Tuple[str, str]:
-        result: Dict[str, Any] = self.smith_waterman_algorithm()
-        alignment_a, alignment_b = self._traceback(
-            result_matrix=result['result_matrix'],
-            traceback_matrix=result['traceback_matrix'],
-            start_pos=result['score_pos'],
-            global_alignment=False)
+        # Only the CIGAR and coordinates are cached
+        self._to_cache(cache_mode, self.scoring_sys,
+                       replace(result, result_matrix=None, traceback_matrix=None, seq_a=None, seq_b=None))
+        score_mode = 'similarity' if mode == 'global' else 'local-score'
+        self._to_cache(score_mode, self.scoring_sys, result.score, symmetric=True)
+        if not keep_matrices:
+            result = replace(result, result_matrix=None, traceback_matrix=None)
+        return result
 
-        print(
-            f"[Local Alignment] Score={result['score']}\n"
-            f"Result:\n {result['result_matrix']}\n"
-            f"Traceback:\n {result['traceback_matrix']}\n"
-            f"Alignment:\n {alignment_a}\n {alignment_b}\n"
-        )
+    def global_alignment(self) -> Tuple[str, str]:
+        '''Prints the global alignment (and its matrices with show_matrices)'''
+        result = self.align('global', keep_matrices=self.show_matrices)
+        return self._print_alignment('Global Alignment', result)
+
+    def local_alignment(self) -> Tuple[str, str]:
+        '''Prints the local alignment (and its matrices with show_matrices)'''
+        result = self.align('local', keep_matrices=self.show_matrices)
+        return self._print_alignment('Local Alignment', result)
+
+    def _align(self, filled: Dict[str, Any], global_alignment: bool) -> AlignmentResult:
+        '''Traceback over filled matrices (see needleman_wunsch_algorithm/smith_waterman_algorithm)'''
+        cigar, start = self._traceback(
+            result_matrix=filled['result_matrix'],
+            traceback_matrix=filled['traceback_matrix'],
+            start_pos=filled['score_pos'],
+            global_alignment=global_alignment)
+        end = tuple(int(position) for position in filled['score_pos'])
+        return AlignmentResult(mode='global' if global_alignment else 'local', score=int(filled['score']),
+                               start=start, end=end, cigar=cigar, result_matrix=filled['result_matrix'],
+                               traceback_matrix=filled['traceback_matrix'], seq_a=self.seq_a, seq_b=self.seq_b)
+
+    def _align_local_bounded(self) -> AlignmentResult:
+        '''Score and end from the striped pass, matrices are built only for the region holding the alignment'''
+        region = self.striped_aligner().locate(self.scoring_sys.encode(self.seq_b))
+        query_start, query_end = region['query_start'], region['query_end']
+        target_start, target_end = region['target_start'], region['target_end']
+
+        bounded = SequencesAnalyzer(self.seq_a[query_start:query_end], self.seq_b[target_start:target_end],
+                                    scoring_sys=self.scoring_sys, edit_cost_sys=self.edit_cost_sys)
+        result = bounded._align(bounded.smith_waterman_algorithm(), global_alignment=False)
+        # Positions of the region -> positions of the whole sequences
+        return replace(result, score=int(region['score']),
+                       start=(result.start[0] + query_start, result.start[1] + target_start),
+                       end=(result.end[0] + query_start, result.end[1] + target_start),
+                       result_matrix=None, traceback_matrix=None, seq_a=self.seq_a, seq_b=self.seq_b)
+
+    def _print_alignment(self, title: str, result: AlignmentResult) -> Tuple[str, str]:
+        text = f"[{title}] Score={result.score}{' (cached)' if result.cached else ''}\n"
+        if result.result_matrix is not None:
+            text += (
+                f"Result:\n {self.render_matrix(result.result_matrix)}\n"
+                f"Traceback:\n {self.render_traceback(result.traceback_matrix)}\n"
+            )
+        elif result.mode == 'local':
+            text += f"Region: seq_a[{result.start[0]}:{result.end[0]}], seq_b[{result.start[1]}:{result.end[1]}]\n"
+        alignment_a, alignment_b = result.aligned()
+        print(f"{text}Alignment:\n {alignment_a}\n {alignment_b}\n")
         return alignment_a, alignment_b
 
-    def similarity(self) -> int:
+    def similarity(self, min_score: Optional[int] = None) -> Optional[int]:
+        '''`min_score` - threshold query (see within_score), matrices are not shown then'''
+        if min_score is not None:
+            score = self.within_score(min_score)
+            print(f"[Similarity] Score={score}\n" if score is not None else f"[Similarity] Score<{min_score}\n")
+            return score
+        if not self.show_matrices:
+            score = self.needleman_wunsch_score(minimize=False)
+            print(f"[Similarity] Score={score}\n")
+            return score
+
         result = self.needleman_wunsch_algorithm(minimize=False)
 
         print(
             f"[Similarity] Score={result['score']}\n"
-            f"{result['result_matrix']}\n"
-            f"{result['traceback_matrix']}\n"
+            f"{self.render_matrix(result['result_matrix'])}\n"
+            f"{self.render_traceback(result['traceback_matrix'])}\n"
         )
+        self._to_cache('similarity', self.scoring_sys, int(result['score']), symmetric=True)
         return result['score']
 
-    def edit_distance(self) -> int:
+    def edit_distance(self, max_distance: Optional[int] = None) -> Optional[int]:
+        '''`max_distance` - threshold query (see within_distance), matrices are not shown then'''
+        if max_distance is not None:
+            score = self.within_distance(max_distance)
+            print(f"[Edit distance] Cost={score}\n" if score is not None else f"[Edit distance] Cost>{max_distance}\n")
+            return score
+        if not self.show_matrices:
+            score = self.needleman_wunsch_score(minimize=True)
+            print(f"[Edit distance] Cost={score}\n")
+            return score
+
         result = self.needleman_wunsch_algorithm(minimize=True)
 
         print(
             f"[Edit distance] Cost={result['score']}\n"
-            f"{result['result_matrix']}\n"
-            f"{result['traceback_matrix']}\n"
+            f"{self.render_matrix(result['result_matrix'])}\n"
+            f"{self.render_traceback(result['traceback_matrix'])}\n"
         )
+        self._to_cache('edit-distance', self.edit_cost_sys, int(result['score']), symmetric=True)
         return result['score']
 
-    def needleman_wunsch_algorithm(self, minimize: bool = False, alignment_cal: bool = False) -> Dict[str, Any]:
+    def needleman_wunsch_score(self, minimize: bool = False) -> int:
+        '''
+        Same score as needleman_wunsch_algorithm(minimize)['score'], but only the last anti-diagonals are kept alive,
+        so memory is O(min(n, m)) and no traceback is built.
+        '''
+        scoring_sys = self.edit_cost_sys if minimize else self.scoring_sys
+        mode = 'edit-distance' if minimize else 'similarity'
+        score = self._from_cache(mode, scoring_sys, symmetric=True)
+        if score is None:
+            score = int(self._needleman_wunsch_score(scoring_sys, minimize))
+            self._to_cache(mode, scoring_sys, score, symmetric=True)
+        return score
+
+    def _needleman_wunsch_score(self, scoring_sys: ScoringSystem, minimize: bool) -> int:
+        engine, seq_a, seq_b = self._engine(scoring_sys)
+        if minimize and scoring_sys.gap_open == 0:
+            # Unit costs (default edit cost system) -> bit-parallel Levenshtein distance
+            myers = MyersAlgorithm(scoring_sys.matrix, gap_code=scoring_sys.gap_code)
+            if myers.supports(seq_a, seq_b):
+                return myers.distance(seq_a, seq_b)
+        if self.band is not None:
+            score, _ = engine.score_banded(seq_a, seq_b, minimize=minimize, band=self.band)
+            return score
+        return engine.score(seq_a, seq_b, minimize=minimize)
+
+    def within_distance(self, max_distance: int) -> Optional[int]:
+        '''Edit distance if it is at most `max_distance`, None when it is larger (the exact value is not computed)'''
+        return self._score_within(max_distance, minimize=True)
+
+    def within_score(self, min_score: int) -> Optional[int]:
+        '''Similarity if it is at least `min_score`, None when it is lower (the exact value is not computed)'''
+        return self._score_within(min_score, minimize=False)
+
+    def _score_within(self, threshold: int, minimize: bool) -> Optional[int]:
+        scoring_sys = self.edit_cost_sys if minimize else self.scoring_sys
+        mode = 'edit-distance' if minimize else 'similarity'
+        score = self._from_cache(mode, scoring_sys, symmetric=True)
+        if score is not None:
+            return score if (score <= threshold if minimize else score >= threshold) else None
+
+        engine, seq_a, seq_b = self._engine(scoring_sys)
+        myers = MyersAlgorithm(scoring_sys.matrix, gap_code=scoring_sys.gap_code)
+        if minimize and scoring_sys.gap_open == 0 and myers.supports(seq_a, seq_b):
+            # Unit costs -> bit-parallel distance, stopped once the last row cannot come back under the threshold
+            score = myers.distance(seq_a, seq_b, max_distance=threshold)
+        else:
+            # Only the diagonals which can still pass are filled (band of the analyzer is not needed)
+            score = engine.score_within(seq_a, seq_b, threshold, minimize=minimize)
+        if score is not None:
+            # Exact value (only failures are not known exactly)
+            self._to_cache(mode, scoring_sys, int(score), symmetric=True)
+        return score
+
+    def needleman_wunsch_algorithm(self, minimize: bool = False) -> Dict[str, Any]:
         '''
         `minimize` - set to True when calculating edit distance
-        `alignment_cal` - set to True when calculating global alignment
+        1st row and column are gap runs, so similarity and global alignment share the same matrix
+        (it is filled once per analyzer)
         '''
-        # 1. Prepare dimensions (required additional 1 column and 1 row)
-        rows, cols = len(self.seq_a) + 1, len(self.seq_b) + 1
-
-        # 2. Initialize matrices
-        # Use grid/matrix as graph-like acyclic digraph (array cells are vertices)
-        H = np.zeros(shape=(rows, cols), dtype=int)
-        traceback = np.zeros(shape=(rows, cols), dtype=np.dtype('U5'))
-
-        # 3. msadkjnsadkjn;sdf
-        gapH = np.zeros(shape=(rows, cols), dtype=int)
-
+        filled = 'edit-distance' if minimize else 'similarity'
+        if filled in self._filled:
+            return self._filled[filled]
         if minimize:
             # Edit cost calculation
-            score_func = self.edit_cost_sys.score
+            scoring_sys = self.edit_cost_sys
         else:
-            # Similarity calculation
-            score_func = self.scoring_sys.score
+            # Similarity/global alignment calculation
+            scoring_sys = self.scoring_sys
 
-        if alignment_cal:
-            # Global alignment calculation -> 1st row and column need to have negative values
-            sign = self.scoring_sys.gap
+        engine, seq_a, seq_b = self._engine(scoring_sys)
+        if self.band is not None:
+            # Only diagonals close to the optimal path are filled (BandedMatrix)
+            H, directions, _ = engine.fill_banded(seq_a, seq_b, minimize=minimize, band=self.band)
         else:
-            # Similarity or edit cost calculation -> 1st first row and column values need to be positive
-            sign = 1
+            H, directions = engine.fill(seq_a, seq_b, minimize=minimize)
+        rows, cols = H.shape
 
-        # Put sequences' letters into 1st row and 1st column (for better visualization)
-        traceback[0, 1:] = np.array(list(self.seq_b), dtype=str)
-        traceback[1:, 0] = np.array(list(self.seq_a), dtype=str)
-    
-        # 3. Top row and leftmost column, like: 0, 1, 2, 3, etc.
-        H[0, :] = np.arange(start=0, stop=sign*cols, step=sign)
-        H[:, 0] = np.arange(start=0, stop=sign*rows, step=sign)
-
-        for row in range(1, rows):
-            for col in range(1, cols):
-                # Current pair of letters from sequence A and B
-                a = self.seq_a[row - 1]
-                b = self.seq_b[col - 1]
-
-                leave_or_replace_letter = H[row -
-                    1, col - 1] + score_func(a, b)
-
-                if gapH[row - 1, col] == 0:
-                    score = score_func('-', b)
-                else:
-                    score = 0
-                delete_indel = H[row - 1, col] + score
-
-                if gapH[row, col - 1] == 0:
-                    score = score_func(a, '-')
-                else:
-                    score = 0
-                insert_indel = H[row, col - 1] + score
-
-                scores = [leave_or_replace_letter, delete_indel, insert_indel]
-
-                if minimize:
-                    best_action = np.argmin(scores)
-                else:
-                    best_action = np.argmax(scores)
-                    if best_action in [1, 2]:
-                        gapH[row, col] = True
-
-                H[row, col] = scores[best_action]
-                traceback[row, col] = self.traceback_symbols[best_action]
-
-        print(gapH)
-        return {
+        self._filled[filled] = {
             'result_matrix': H,
-            'traceback_matrix': traceback,
+            'traceback_matrix': directions,
             'score': H[-1, -1],                 # Always right-bottom corner
             'score_pos': (rows - 1, cols - 1)   # as above...
         }
+        return self._filled[filled]
 
     # def NWScore(self, seq_a, seq_b):
     #     # 1. Prepare dimensions (required additional 1 column and 1 row)
@@ -232,50 +391,120 @@ class SequencesAnalyzer:
         are very similar, but because there are small differences,
         they are meant to be separated.
         '''
-        # 1. Prepare dimensions (required additional 1 column and 1 row)
-        rows, cols = len(self.seq_a) + 1, len(self.seq_b) + 1
-
-        # 2. Initialize matrices
-        # Use grid/matrix as graph-like acyclic digraph (array cells are vertices)
-        H = np.zeros(shape=(rows, cols), dtype=int)
-        traceback = np.zeros(shape=(rows, cols), dtype=np.dtype('U5'))
-
-        # Difference 1: 1st row and 1st column are already zeroed
-
-        # Put sequences' letters into first row and first column (better visualization)
-        traceback[0, 1:] = np.array(list(self.seq_b), dtype=str)
-        traceback[1:, 0] = np.array(list(self.seq_a), dtype=str)
-
-        # 3. Top row and leftmost colum are already 0
-        for row in range(1, rows):
-            for col in range(1, cols):
-                # Alias: current pair of letters
-                a = self.seq_a[row - 1]
-                b = self.seq_b[col - 1]
-
-                score_func = self.scoring_sys.score
-                leave_or_replace_letter = H[row -
-                    1, col - 1] + score_func(a, b)
-                delete_indel = H[row - 1, col] + score_func('-', b)
-                insert_indel = H[row, col - 1] + score_func(a, '-')
-
-                # Difference 2: That additional 0 is required (ignore negative values)
-                scores = [leave_or_replace_letter,
-                    delete_indel, insert_indel, 0]
-                best_action = np.argmax(scores)
-
-                H[row, col] = scores[best_action]
-                traceback[row, col] = self.traceback_symbols[best_action]
+        if 'local' in self._filled:
+            return self._filled['local']
+        # Difference 1: 1st row and 1st column are zeroed
+        # Difference 2: additional 0 is a candidate (ignore negative values)
+        engine, seq_a, seq_b = self._engine(self.scoring_sys)
+        H, directions = engine.fill(seq_a, seq_b, local=True)
 
         return {
             'result_matrix': H,
-            'traceback_matrix': traceback,
+            'traceback_matrix': directions,
             'score': H.max(),
             # Force numpy to return last result
             # Source: (Step 2: Backtracing) https://tiefenauer.github.io/blog/smith-waterman
             'score_pos': np.unravel_index(np.argmax(H, axis=None), H.shape)
         }
 
+    def smith_waterman_score(self) -> int:
+        '''Same score as smith_waterman_algorithm()['score'] in O(n) memory (striped, int16 lanes)'''
+        score = self._from_cache('local-score', self.scoring_sys, symmetric=True)
+        if score is None:
+            score = int(self.striped_aligner().align(self.scoring_sys.encode(self.seq_b))['score'])
+            self._to_cache('local-score', self.scoring_sys, score, symmetric=True)
+        return score
+
+    def striped_aligner(self) -> StripedSmithWaterman:
+        '''Striped Smith-Waterman with the query profile of seq_a, reusable for many targets'''
+        scoring_sys = self.scoring_sys
+        return StripedSmithWaterman(scoring_sys.matrix, gap_code=scoring_sys.gap_code,
+                                    query=scoring_sys.encode(self.seq_a), gap_open=scoring_sys.gap_open)
+
+    def _from_cache(self, mode: str, scoring_sys: ScoringSystem, symmetric: bool = False) -> Any:
+        '''Result of this pair computed before (None if missing)'''
+        if mode in self._results:
+            return self._results[mode]
+        if self.cache is None:
+            return None
+        value = self.cache.get(self._cache_key(mode, scoring_sys, symmetric))
+        if value is not None:
+            self._results[mode] = value
+        return value
+
+    def _to_cache(self, mode: str, scoring_sys: ScoringSystem, value: Any, symmetric: bool = False) -> None:
+        self._results[mode] = value
+        if self.cache is not None:
+            self.cache.put(self._cache_key(mode, scoring_sys, symmetric), value)
+
+    def _cache_key(self, mode: str, scoring_sys: ScoringSystem, symmetric: bool) -> str:
+        # Sequences are hashed once per analyzer
+        if self._digests is None:
+            self._digests = ResultCache.digest(self.seq_a), ResultCache.digest(self.seq_b)
+        return self.cache.key(mode, scoring_sys, *self._digests, symmetric=symmetric)
+
+    def _engine(self, scoring_sys: ScoringSystem) -> Tuple[AlignmentEngine, np.ndarray, np.ndarray]:
+        '''Encode both sequences as integers, scores come from precompiled substitution matrix'''
+        engine = AlignmentEngine(scoring_sys.matrix, gap_code=scoring_sys.gap_code, gap_open=scoring_sys.gap_open)
+        return engine, scoring_sys.encode(self.seq_a), scoring_sys.encode(self.seq_b)
+
+    def render_matrix(self, matrix: Any, window: Optional[int] = None) -> str:
+        '''
+        Result matrix as text (full or banded).
+        `window` - render at most window x window top-left cells, by default whole matrices up to render_limit cells
+        '''
+        rows, cols = self._window(matrix, window)
+        with metrics.phase('render'):
+            if (rows, cols) == matrix.shape:
+                return str(np.asarray(matrix))
+            return f'<{matrix.shape[0]}x{matrix.shape[1]} result matrix, top-left {rows}x{cols} shown>\n' \
+                   f' {self._corner(matrix, rows, cols)}'
+
+    def render_traceback(self, directions: Any, window: Optional[int] = None) -> str:
+        '''
+        Turn direction bits into arrows, put sequences' letters into 1st row and column (visualization).
+        Only the preferred move of every cell is shown (diagonal, then up, then left), `window` like in render_matrix.
+        '''
+        rows, cols = self._window(directions, window)
+        with metrics.phase('render'):
+            # Preferred move for every possible bitmask
+            symbols = np.empty(shape=32, dtype=np.dtype('U5'))
+            for bits in range(32):
+                if bits & AlignmentEngine.DIAGONAL:
+                    symbols[bits] = self.traceback_symbols[0]
+                elif bits & AlignmentEngine.UP:
+                    symbols[bits] = self.traceback_symbols[1]
+                elif bits & AlignmentEngine.LEFT:
+                    symbols[bits] = self.traceback_symbols[2]
+                else:
+                    symbols[bits] = self.traceback_symbols[3]
+
+            traceback = symbols[self._corner(directions, rows, cols)]
+            traceback[0, 0] = ''
+            # Letters are sliced before unpacking (PackedSequence)
+            traceback[0, 1:] = np.array(list(str(self.seq_b[:cols - 1])), dtype=str)
+            traceback[1:, 0] = np.array(list(str(self.seq_a[:rows - 1])), dtype=str)
+            if (rows, cols) == directions.shape:
+                return str(traceback)
+            return f'<{directions.shape[0]}x{directions.shape[1]} traceback matrix, top-left {rows}x{cols} shown>\n' \
+                   f' {traceback}'
+
+    def _window(self, matrix: Any, window: Optional[int]) -> Tuple[int, int]:
+        '''Rows and columns to render'''
+        rows, cols = matrix.shape
+        if window is None:
+            if matrix.size <= self.render_limit:
+                return rows, cols
+            window = self.render_window
+        return min(rows, window), min(cols, window)
+
+    @staticmethod
+    def _corner(matrix: Any, rows: int, cols: int) -> np.ndarray:
+        '''Dense top-left corner (a banded matrix is never expanded as a whole)'''
+        if isinstance(matrix, np.ndarray):
+            return matrix[:rows, :cols]
+        return np.array([[matrix[row, col] for col in range(cols)] for row in range(rows)])
+
     # def hirschberg_algorithm(self, X, Y):
     #     '''
     #     Hirschberg’s algorithm uses Θ(m +n) space.
@@ -317,45 +546,61 @@ class SequencesAnalyzer:
     #         Q, E = self.hirschberg_algorithm(X=X[x_mid:x_len], Y=Y[y_mid:y_len])
     #     return Z+Q, W+E
 
-    def _traceback(self, result_matrix, traceback_matrix, start_pos: Tuple[int, int], global_alignment: bool) -> Tuple[str, str]:
-        seq_a_aligned = ''
-        seq_b_aligned = ''
+    def _traceback(self, result_matrix, traceback_matrix, start_pos: Tuple[int, int],
+                   global_alignment: bool) -> Tuple[str, Tuple[int, int]]:
+        '''
+        `traceback_matrix` holds direction bits (see AlignmentEngine), on ties diagonal move is preferred.
+        Once a gap move is taken, the path stays in that gap run while the cells have *_EXTEND bit (affine gaps).
+        Returns (CIGAR, cell where the path starts), see AlignmentResult.
+        '''
+        with metrics.phase('traceback'):
+            return self._follow_path(result_matrix, traceback_matrix, start_pos, global_alignment)
+
+    def _follow_path(self, result_matrix, traceback_matrix, start_pos: Tuple[int, int],
+                     global_alignment: bool) -> Tuple[str, Tuple[int, int]]:
+        # Runs of [operation, length] (in reversed order), letters are not touched at all
+        runs: List[List[Any]] = []
 
         # 1. Select starting point
         row, col = start_pos
 
         if global_alignment:
             # Terminate when top left corner (0,0) is reached (end of path)
-            end_condition_reached = lambda row, col: row == 0 and col == 0
+            end_condition_reached = lambda row, col, gap_run: row == 0 and col == 0
         else:
-            # Terminate when 0 is reached
-            end_condition_reached = lambda row, col: result_matrix[row, col] == 0
-
-        while not end_condition_reached(row, col):
-            symbol = traceback_matrix[row, col]
-            if row == 0:
-                symbol = '←'
-            if col == 0:
-                symbol = '↑'
-            # Use arrows to navigate and collect letters (in reversed order)
-            # Shift/reverse indexes by one beforehand (we want to get the letter that arrow points to)
-            if symbol == '↖':
+            # Terminate when 0 is reached (outside of a gap run)
+            end_condition_reached = lambda row, col, gap_run: gap_run is None and result_matrix[row, col] == 0
+
+        # Current gap run: None, UP or LEFT
+        gap_run = None
+        while not end_condition_reached(row, col, gap_run):
+            directions = traceback_matrix[row, col]
+            if gap_run is None and not directions & AlignmentEngine.DIAGONAL:
+                gap_run = AlignmentEngine.UP if directions & AlignmentEngine.UP else AlignmentEngine.LEFT
+
+            # Follow the bits: diagonal - letter pair, up - letter of seq_a only, left - letter of seq_b only
+            if gap_run is None:
                 row -= 1
                 col -= 1
-                letter_a, letter_b = self.seq_a[row], self.seq_b[col]
-            elif symbol == '↑':
+                operation = 'M'
+            elif gap_run == AlignmentEngine.UP:
                 row -= 1
-                letter_a, letter_b = self.seq_a[row], '-'
-            elif symbol == '←':
+                operation = 'D'
+                if not directions & AlignmentEngine.UP_EXTEND:
+                    gap_run = None
+            else:
                 col -= 1
-                letter_a, letter_b = '-', self.seq_b[col]
+                operation = 'I'
+                if not directions & AlignmentEngine.LEFT_EXTEND:
+                    gap_run = None
 
-            # Acumulate letter (in reversed order)
-            seq_a_aligned += letter_a
-            seq_b_aligned += letter_b
+            if runs and runs[-1][0] == operation:
+                runs[-1][1] += 1
+            else:
+                runs.append([operation, 1])
 
-        # Reverse strings (traceback goes from bottom-right to top-left)
-        return seq_a_aligned[::-1], seq_b_aligned[::-1]
+        # Reverse runs (traceback goes from bottom-right to top-left)
+        return ''.join(f'{length}{operation}' for operation, length in reversed(runs)), (int(row), int(col))
 
     # def _traceback_local(self, result_matrix, traceback_matrix, start_pos: Tuple[int, int]) -> Tuple[str, str]:
     #     '''Use both matrices to replay the optimal route'''
@@ -0,0 +1,89 @@
+import gzip
+from typing import IO, Iterator, List, Tuple, Union
+from PackedSequence import PackedSequence
+'''
+Streaming reader of sequence files, one record at a time:
+- FASTA (multi-line records)
+- FASTQ (multi-line sequence and quality, quality is skipped)
+- plain text with 1 sequence per line (line number is the name)
+Gzip-compressed files are recognized by their content, not by the extension.
+'''
+
+
+class SequenceReader:
+
+    def __init__(self, filename: str, packed: bool = False) -> None:
+        '''`packed` - yield PackedSequence (2 bits per nucleotide) instead of str'''
+        self.filename = filename
+        self.packed = packed
+
+    def __iter__(self) -> Iterator[Tuple[str, Union[str, PackedSequence]]]:
+        '''Yields (name, sequence) records'''
+        with self._open() as f:
+            lines = (line.strip() for line in f)
+            lines = (line for line in lines if line)
+            first = next(lines, None)
+            if first is None:
+                return
+            if first.startswith('>'):
+                records = self._fasta(first, lines)
+            elif first.startswith('@'):
+                records = self._fastq(first, lines)
+            else:
+                records = self._plain(first, lines)
+
+            for name, sequence in records:
+                yield name, PackedSequence(sequence) if self.packed else sequence
+
+    def _open(self) -> IO[str]:
+        with open(self.filename, 'rb') as f:
+            compressed = f.read(2) == b'\x1f\x8b'
+        if compressed:
+            return gzip.open(self.filename, 'rt')
+        return open(self.filename)
+
+    def _plain(self, first: str, lines: Iterator[str]) -> Iterator[Tuple[str, str]]:
+        yield '1', first
+        for number, line in enumerate(lines, start=2):
+            yield str(number), line
+
+    def _fasta(self, header: str, lines: Iterator[str]) -> Iterator[Tuple[str, str]]:
+        count = 1
+        chunks: List[str] = []
+        for line in lines:
+            if line.startswith('>'):
+                yield self._name(header, count), ''.join(chunks)
+                header, chunks = line, []
+                count += 1
+            else:
+                chunks.append(line)
+        yield self._name(header, count), ''.join(chunks)
+
+    def _fastq(self, header: str, lines: Iterator[str]) -> Iterator[Tuple[str, str]]:
+        count = 1
+        while header is not None:
+            # Sequence lines until the '+' separator
+            chunks: List[str] = []
+            for line in lines:
+                if line.startswith('+'):
+                    break
+                chunks.append(line)
+            sequence = ''.join(chunks)
+
+            # Quality has the same length as the sequence (it may start with '@' as well)
+            quality_length = 0
+            while quality_length < len(sequence):
+                line = next(lines, None)
+                if line is None:
+                    raise ValueError(f"{self.filename}: FASTQ record '{self._name(header, count)}' "
+                                     f"is truncated (quality is shorter than the sequence)")
+                quality_length += len(line)
+            yield self._name(header, count), sequence
+
+            header = next(lines, None)
+            count += 1
+
+    def _name(self, header: str, count: int) -> str:
+        '''1st word of the header, record number when empty'''
+        words = header[1:].split()
+        return words[0] if words else str(count)
@@ -0,0 +1,169 @@
+import numpy as np
+from typing import Dict, Optional
+from Metrics import metrics
+'''
+Striped Smith-Waterman (Farrar 2007) on numpy int16 lanes.
+
+Query positions are laid out in "striped" order: position p = lane * segments + segment,
+so one vector (segment) holds query positions which are `segments` apart.
+- Query profile profile[letter][segment] (scores of every query position against the letter)
+  is built once and reused for every target.
+- Target is walked column by column, a column is `segments` vector operations.
+- Vertical gaps are propagated inside of a lane by the segment loop,
+  gaps crossing into the next lanes are fixed afterwards ("lazy F").
+  Farrar's lazy F loop runs until the gaps stop improving H, here it is a prefix scan over lanes
+  (a fixed number of numpy operations, no data-dependent loop).
+- Only the score and the end position are computed, the alignment itself is recomputed
+  by AlignmentEngine on a bounded region (see `locate`).
+- Time complexity: O(nm) (O(m * segments) numpy operations)
+- Space complexity: O(n)
+'''
+
+
+class StripedSmithWaterman:
+
+    # Segments per column, vectors are n / segments wide.
+    # Cost of a numpy call hardly depends on its length, so one long vector per column is the fastest here
+    # (more segments give narrow lanes like in the SIMD version)
+    DEFAULT_SEGMENTS = 1
+
+    def __init__(self, table: np.ndarray, gap_code: int, query: np.ndarray, gap_open: int = 0,
+                 segments: Optional[int] = None) -> None:
+        '''
+        Same `table`, `gap_code` and `gap_open` as AlignmentEngine, `query` - encoded sequence (rows of H).
+        Profile of `query` is built here, call `align` for every target.
+        '''
+        self.table = table
+        self.gap_code = gap_code
+        self.query = query
+        self.gap_open = gap_open
+
+        n = len(query)
+        self.segments = max(1, min(segments or self.DEFAULT_SEGMENTS, n))
+        lanes = -(-n // self.segments)
+
+        # 1. Lane width: int16 unless scores could overflow it
+        best_pair = int(table[query, :].max()) if n else 0
+        worst_step = int(np.abs(table).max()) + abs(gap_open)
+        max_score = n * max(best_pair, 0)
+        # Value which never wins (also marks padding after the last query position)
+        self.negative = -(max_score + worst_step + 1)
+        # Vertical gap running through the whole query (sums used by the lazy F scan)
+        longest_gap = (n + self.segments) * worst_step
+        small_int = np.iinfo(np.int16)
+        if 2 * (-self.negative + worst_step + longest_gap) < small_int.max:
+            self.dtype = np.int16
+        else:
+            self.dtype = np.int64
+
+        # 2. Striped order: positions[segment, lane] = lane * segments + segment
+        padded = lanes * self.segments
+        self.positions = np.arange(padded).reshape(lanes, self.segments).T
+
+        # 3. Query profile: profile[letter, segment, lane] = score(query[position], letter)
+        profile = np.full(shape=(table.shape[1], padded), fill_value=self.negative, dtype=self.dtype)
+        profile[:, :n] = table[query, :].T
+        self.profile = profile[:, self.positions]
+
+        # Vertical gap (query letter against '-') for every position
+        # (padding gets the worst gap, so vertical gaps starting in the padding stay hopeless)
+        query_gap = np.full(padded, -worst_step, dtype=self.dtype)
+        query_gap[:n] = table[query, gap_code]
+        self.query_gap = query_gap[self.positions]
+        # Gap extended from the top of a lane down to every segment, and through the whole lanes
+        self.lane_gap = np.cumsum(self.query_gap, axis=0, dtype=self.dtype)
+        self.lanes_gap = np.cumsum(self.lane_gap[-1], dtype=self.dtype)
+
+    def align(self, target: np.ndarray) -> Dict[str, int]:
+        '''
+        Score-only local alignment of the query against encoded `target`.
+        Returns {'score', 'query_end', 'target_end'}, where (query_end, target_end) is the cell of H
+        with the best score (the first one in row-major order, like np.argmax).
+        '''
+        metrics.count('cells', len(self.query) * len(target))
+        with metrics.phase('fill'):
+            return self._align(target)
+
+    def _align(self, target: np.ndarray) -> Dict[str, int]:
+        result = {'score': 0, 'query_end': 0, 'target_end': 0}
+        if len(self.query) == 0 or len(target) == 0:
+            return result
+
+        segments, lanes = self.positions.shape
+        gap_open = self.gap_open
+        query_gap = self.query_gap
+
+        # Whole columns of H and E, buffers are reused for every column
+        H = np.zeros(shape=(segments, lanes), dtype=self.dtype)
+        H_prev = np.zeros(shape=(segments, lanes), dtype=self.dtype)
+        E = np.full(shape=(segments, lanes), fill_value=self.negative, dtype=self.dtype)
+        opened = np.empty(shape=(segments, lanes), dtype=self.dtype)
+        entering = np.empty(shape=(segments, lanes), dtype=self.dtype)
+        diag = np.zeros(lanes, dtype=self.dtype)
+        carry = np.empty(lanes, dtype=self.dtype)
+        vertical = np.empty(lanes, dtype=self.dtype)
+        # Vertical gaps entering every lane (shifted view gives them to the next lane, 1st lane gets none)
+        leaving_buffer = np.full(lanes + 1, self.negative, dtype=self.dtype)
+        leaving, shifted_leaving = leaving_buffer[1:], leaving_buffer[:-1]
+        lane_gap, lanes_gap = self.lane_gap, self.lanes_gap
+        best, best_row, best_col = 0, 0, 0
+        target_gap = self.table[self.gap_code, target].tolist()
+
+        for col, (letter, gap) in enumerate(zip(target.tolist(), target_gap), start=1):
+            profile = self.profile[letter]
+            H_prev, H = H, H_prev
+            # 1. Horizontal gaps of the whole column: opened after the previous column or extended
+            np.add(H_prev, gap_open, out=opened)
+            np.maximum(opened, E, out=E)
+            np.add(E, gap, out=E)
+
+            # 2. Diagonal neighbour of segment 0 is the last segment shifted by one lane (top boundary is 0)
+            diag[1:] = H_prev[-1, :-1]
+            for segment in range(segments):
+                cell = H[segment]
+                np.add(diag if segment == 0 else H_prev[segment - 1], profile[segment], out=cell)
+                np.maximum(cell, E[segment], out=cell)
+                if segment > 0:
+                    np.add(carry, query_gap[segment], out=vertical)
+                    np.maximum(cell, vertical, out=cell)
+                    np.maximum(cell + gap_open, vertical, out=carry)
+                else:
+                    np.add(cell, gap_open, out=carry)
+                np.maximum(cell, 0, out=cell)
+
+            # 3. Lazy F: gap entering lane k is the best gap leaving any lane j < k, extended through lanes j+1..k-1
+            #    entering[k] = lanes_gap[k - 1] + max(carry[j] - lanes_gap[j] for j < k)
+            np.subtract(carry, lanes_gap, out=leaving)
+            np.maximum.accumulate(leaving, out=leaving)
+            np.add(leaving, lanes_gap, out=leaving)
+            np.add(lane_gap, shifted_leaving, out=entering)
+            np.maximum(H, entering, out=H)
+
+            # 4. Best cell so far (lowest row on ties, then lowest column)
+            column_best = int(H.max())
+            if column_best > 0 and column_best >= best:
+                row = int(self.positions[H == column_best].min()) + 1
+                if column_best > best or row < best_row:
+                    best, best_row, best_col = column_best, row, col
+
+        result.update(score=best, query_end=best_row, target_end=best_col)
+        return result
+
+    def locate(self, target: np.ndarray) -> Dict[str, int]:
+        '''
+        `align` plus start of the alignment: {'score', 'query_start', 'query_end', 'target_start', 'target_end'}.
+        query[query_start:query_end] and target[target_start:target_end] contain an optimal local alignment,
+        so traceback needs only this bounded region to be recomputed.
+        Start is the end of the best alignment of reversed prefixes (2nd pass over a bounded region only).
+        '''
+        result = self.align(target)
+        result.update(query_start=result['query_end'], target_start=result['target_end'])
+        if result['score'] == 0:
+            return result
+
+        query_end, target_end = result['query_end'], result['target_end']
+        backward = StripedSmithWaterman(self.table, self.gap_code, self.query[:query_end][::-1],
+                                        self.gap_open, self.segments)
+        reverse = backward.align(target[:target_end][::-1])
+        result.update(query_start=query_end - reverse['query_end'], target_start=target_end - reverse['target_end'])
+        return result
@@ -0,0 +1,203 @@
+import numpy as np
+from typing import Any, Dict, List, Sequence
+from AlignmentEngine import AlignmentEngine
+from Metrics import metrics
+'''
+Several DP fills over the same pair of sequences in a single anti-diagonal walk (see AlignmentEngine).
+
+Every lane is one fill (own substitution matrix, gap opening score, global/local, maximize/minimize),
+lanes are stacked into (lanes x cells) arrays, so one numpy operation advances all of them:
+- pair scores of all lanes are gathered at once from the concatenated substitution matrices
+- minimized lanes (edit cost) are negated, so every lane maximizes
+- local lanes are floored at 0, global lanes at -INFINITY
+Cost of a numpy call hardly depends on its length, so k lanes cost about as much as one fill.
+
+Full matrices (for traceback and printing) are built only for the lanes which ask for them.
+'''
+
+
+class SummaryEngine:
+
+    def __init__(self, gap_code: int) -> None:
+        self.gap_code = gap_code
+        self.lanes: List[Dict[str, Any]] = []
+
+    def add_lane(self, name: str, table: np.ndarray, gap_open: int = 0, minimize: bool = False,
+                 local: bool = False) -> None:
+        '''Arguments like in AlignmentEngine (`table` has to be indexed by the same letter codes as other lanes)'''
+        self.lanes.append({'name': name, 'table': table, 'gap_open': gap_open, 'minimize': minimize, 'local': local})
+
+    def run(self, seq_a: np.ndarray, seq_b: np.ndarray, matrices: Sequence[str] = ()) -> Dict[str, Dict[str, Any]]:
+        '''
+        Returns {lane name: result}, results like SequencesAnalyzer.needleman_wunsch_algorithm/smith_waterman_algorithm:
+        - 'score' - H[-1, -1] (global) or H.max() (local)
+        - 'result_matrix', 'traceback_matrix', 'score_pos' - only for lanes listed in `matrices`
+        Without matrices memory is O(min(n, m)).
+        '''
+        # Lanes with matrices go first, directions are computed for a slice of the stacked lanes
+        lanes = sorted(self.lanes, key=lambda lane: lane['name'] not in matrices)
+        if not matrices and len(seq_a) > len(seq_b):
+            # Buffers are indexed by rows -> make the shorter sequence vertical (scores stay the same)
+            transposed = SummaryEngine(self.gap_code)
+            transposed.lanes = [dict(lane, table=lane['table'].T) for lane in lanes]
+            return transposed.run(seq_b, seq_a)
+
+        rows, cols = len(seq_a) + 1, len(seq_b) + 1
+        engines = [AlignmentEngine(lane['table'], self.gap_code, lane['gap_open']) for lane in lanes]
+        boundaries = [engine._boundaries(seq_a, seq_b, lane['local']) for engine, lane in zip(engines, lanes)]
+
+        # 1. Matrices of the requested lanes (like AlignmentEngine.fill)
+        filled = {}
+        for lane, (top, left) in zip(lanes, boundaries):
+            if lane['name'] not in matrices:
+                continue
+            with metrics.phase('allocate'):
+                H = np.zeros(shape=(rows, cols), dtype=int)
+                directions = np.full(shape=(rows, cols), fill_value=AlignmentEngine.STOP, dtype=np.uint8)
+                H[0, :] = top
+                H[:, 0] = left
+                if not lane['local']:
+                    directions[0, 1:] = AlignmentEngine.LEFT | AlignmentEngine.LEFT_EXTEND
+                    directions[1:, 0] = AlignmentEngine.UP | AlignmentEngine.UP_EXTEND
+                metrics.allocated(H, directions)
+            filled[lane['name']] = (H, directions)
+
+        # 2. Best values of the lanes
+        if rows == 1 or cols == 1:
+            maxima = [0] * len(lanes)
+            corners = [int(top[-1]) if rows == 1 else int(left[-1]) for top, left in boundaries]
+        else:
+            signs = np.array([-1 if lane['minimize'] else 1 for lane in lanes])
+            metrics.count('cells', (rows - 1) * (cols - 1) * len(lanes))
+            with metrics.phase('fill'):
+                maxima, corners = self._wavefront(seq_a, seq_b, lanes, signs, boundaries,
+                                                  [filled[lane['name']] for lane in lanes if lane['name'] in filled])
+            maxima, corners = (maxima * signs).tolist(), (corners * signs).tolist()
+
+        results = {}
+        for lane, maximum, corner in zip(lanes, maxima, corners):
+            result = {'score': maximum if lane['local'] else corner}
+            if lane['name'] in filled:
+                H, directions = filled[lane['name']]
+                result.update(result_matrix=H, traceback_matrix=directions)
+                if lane['local']:
+                    # The same cell as np.argmax in smith_waterman_algorithm (1st in row-major order)
+                    result['score_pos'] = np.unravel_index(np.argmax(H, axis=None), H.shape)
+                else:
+                    result['score_pos'] = (rows - 1, cols - 1)
+            results[lane['name']] = result
+        return results
+
+    def _wavefront(self, seq_a: np.ndarray, seq_b: np.ndarray, lanes: List[Dict[str, Any]], signs: np.ndarray,
+                   boundaries: List[Any], filled: List[Any]) -> Any:
+        '''
+        AlignmentEngine._wavefront over stacked lanes (whole matrix, all lanes maximize).
+        Writes every diagonal into `filled` matrices (of the 1st lanes),
+        returns (max of every lane, bottom-right cell of every lane).
+        '''
+        count, rows, cols = len(lanes), len(seq_a) + 1, len(seq_b) + 1
+        outside = -AlignmentEngine.INFINITY
+        column = (count, 1)
+
+        # 1. Lane parameters (negated for minimized lanes)
+        size = max(lane['table'].size for lane in lanes)
+        tables_flat = np.zeros(count * size, dtype=int)
+        for k, lane in enumerate(lanes):
+            tables_flat[k * size:k * size + lane['table'].size] = signs[k] * lane['table'].reshape(-1)
+        lane_offset = (np.arange(count) * size).reshape(column)
+        seq_a_offset = seq_a.astype(np.intp) * lanes[0]['table'].shape[1]
+
+        gap_a = np.stack([lane['table'][seq_a, self.gap_code] for lane in lanes]).astype(int) * signs.reshape(column)
+        gap_b = np.stack([lane['table'][self.gap_code, seq_b] for lane in lanes]).astype(int) * signs.reshape(column)
+        gap_open = np.array([lane['gap_open'] for lane in lanes]).reshape(column) * signs.reshape(column)
+        floor = np.array([0 if lane['local'] else outside for lane in lanes]).reshape(column)
+        top = np.stack([boundary[0] for boundary in boundaries]) * signs.reshape(column)
+        left = np.stack([boundary[1] for boundary in boundaries]) * signs.reshape(column)
+        affine = bool(gap_open.any())
+        local = any(lane['local'] for lane in lanes)
+        # Lanes 0..with_directions - 1 have matrices
+        with_directions = len(filled)
+
+        # 2. Rolling anti-diagonals (lanes x rows)
+        prev2 = np.zeros(shape=(count, rows), dtype=int)
+        prev1 = np.zeros(shape=(count, rows), dtype=int)
+        current = np.zeros(shape=(count, rows), dtype=int)
+        prev1[:, 0], prev1[:, 1] = top[:, 1], left[:, 1]
+        if affine:
+            F_prev1, F_current = np.full((count, rows), outside), np.full((count, rows), outside)
+            E_prev1, E_current = np.full((count, rows), outside), np.full((count, rows), outside)
+        # Local lanes never go below 0 (other lanes use only the corner)
+        maxima = np.zeros(count, dtype=int)
+        scores = np.zeros(shape=(5, count, min(rows, cols)), dtype=int)
+
+        for d in range(2, rows + cols - 1):
+            first, last = max(0, d - cols + 1), min(rows - 1, d)
+            lo, hi = max(1, first), min(d - 1, last)
+            size = hi - lo + 1
+            leave_or_replace_letter, delete_indel, insert_indel = scores[0, :, :size], scores[1, :, :size], scores[2, :, :size]
+
+            # Letter pair scores of all lanes in one gather
+            b = seq_b[d - hi - 1:d - lo][::-1]
+            np.add(prev2[:, lo - 1:hi], tables_flat[lane_offset + (seq_a_offset[lo - 1:hi] + b)],
+                   out=leave_or_replace_letter)
+
+            delete_cost = gap_a[:, lo - 1:hi]
+            insert_cost = gap_b[:, d - hi - 1:d - lo][:, ::-1]
+            if affine:
+                delete_open, insert_open = scores[3, :, :size], scores[4, :, :size]
+                np.add(prev1[:, lo - 1:hi], delete_cost + gap_open, out=delete_open)
+                np.add(prev1[:, lo:hi + 1], insert_cost + gap_open, out=insert_open)
+                np.add(F_prev1[:, lo - 1:hi], delete_cost, out=delete_indel)
+                np.add(E_prev1[:, lo:hi + 1], insert_cost, out=insert_indel)
+                if with_directions:
+                    extend_bits = ((delete_indel[:with_directions] > delete_open[:with_directions])
+                                   * np.uint8(AlignmentEngine.UP_EXTEND)
+                                   | (insert_indel[:with_directions] > insert_open[:with_directions])
+                                   * np.uint8(AlignmentEngine.LEFT_EXTEND))
+                np.maximum(delete_indel, delete_open, out=delete_indel)
+                np.maximum(insert_indel, insert_open, out=insert_indel)
+            else:
+                np.add(prev1[:, lo - 1:hi], delete_cost, out=delete_indel)
+                np.add(prev1[:, lo:hi + 1], insert_cost, out=insert_indel)
+
+            # Best values go straight into the rolling diagonal
+            best = current[:, lo:hi + 1]
+            np.maximum(leave_or_replace_letter, delete_indel, out=best)
+            np.maximum(best, insert_indel, out=best)
+            if local:
+                np.maximum(best, floor, out=best)
+                np.maximum(maxima, best.max(axis=1), out=maxima)
+
+            if with_directions:
+                best_directions = ((leave_or_replace_letter[:with_directions] == best[:with_directions])
+                                   * np.uint8(AlignmentEngine.DIAGONAL)
+                                   | (delete_indel[:with_directions] == best[:with_directions])
+                                   * np.uint8(AlignmentEngine.UP)
+                                   | (insert_indel[:with_directions] == best[:with_directions])
+                                   * np.uint8(AlignmentEngine.LEFT))
+                if affine:
+                    best_directions |= extend_bits
+                # Flat index of cell (row, d - row) is row * (cols - 1) + d
+                cells = slice(lo * (cols - 1) + d, hi * (cols - 1) + d + 1, cols - 1)
+                for k, (H, directions) in enumerate(filled):
+                    H.reshape(-1)[cells] = best[k] if signs[k] > 0 else -best[k]
+                    directions.reshape(-1)[cells] = best_directions[k]
+
+            if first == 0:
+                current[:, 0] = top[:, d]
+            if last == d:
+                current[:, d] = left[:, d]
+            if affine:
+                # Boundary cells never continue a gap run
+                F_current[:, first:last + 1] = outside
+                E_current[:, first:last + 1] = outside
+                F_current[:, lo:hi + 1] = delete_indel
+                E_current[:, lo:hi + 1] = insert_indel
+
+            prev2, prev1, current = prev1, current, prev2
+            if affine:
+                F_prev1, F_current = F_current, F_prev1
+                E_prev1, E_current = E_current, E_prev1
+
+        # The last diagonal is a single cell - the bottom-right corner
+        return maxima, prev1[:, rows - 1].copy()
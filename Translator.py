@@ -1,5 +1,12 @@
+import itertools
+import numpy as np
+from typing import Any, Dict, List, Union
+from PackedSequence import PackedSequence
 '''
 Useful for validation: http://www.attotron.com/cybertory/analysis/trans.htm
+
+Bases are encoded as 2-bit codes and every codon as an index 0..63,
+so translation of a whole frame is a single lookup in a 64-entry table.
 '''
 
 class Translator:
@@ -22,36 +29,118 @@ class Translator:
         "UGG": "W", "CGG": "R", "AGG": "R", "GGG": "G"
     }
 
-    def __init__(self, rna_sequence: str) -> None:
-        allowed_symbols = set(['A', 'C', 'G', 'T', 'U'])
-        symbols = set(rna_sequence.upper())
-        assert symbols <= allowed_symbols, 'Sequence contains invalid nucleotide symbols!'
+    # Bases as 2-bit codes (T is read as U, lowercase as uppercase), 255 - invalid symbol
+    base_codes = np.full(256, 255, dtype=np.uint8)
+    base_codes[list(b'AaCcGgUuTt')] = [0, 0, 1, 1, 2, 2, 3, 3, 3, 3]
 
-        # If find(arg) returns -1 -> arg not present in string
-        start_codon_pos: int = rna_sequence.find('AUG')
-        stop_codon_pos: int = max(rna_sequence.find('UAA'), rna_sequence.find('UAG'), rna_sequence.find('UGA'))
+    # Codon index (16 * 1st + 4 * 2nd + 3rd base code) -> amino acid, '*' for STOP
+    amino_acids = list(map(rna_codons.get, map(''.join, itertools.product('ACGU', repeat=3))))
+    codon_table = np.frombuffer(''.join('*' if amino_acid == 'STOP' else amino_acid
+                                        for amino_acid in amino_acids).encode('ascii'), dtype=np.uint8)
+    start_codon = 16 * 0 + 4 * 3 + 2                   # AUG
+    stop_codons = [16 * 3 + 4 * 0 + 0, 16 * 3 + 4 * 0 + 2, 16 * 3 + 4 * 2 + 0]   # UAA, UAG, UGA
 
-        assert start_codon_pos > -1, 'Sequence does not contain a start codon!'
-        assert stop_codon_pos > -1, 'Sequence does not contain any of stop codons!'
-        # Notice that AUGAUG (duplicated start codons) can be read as aUGA (stop codon)
-        # If that situation is impossible, then we should replace 1 with 3
-        assert start_codon_pos + 1 <= stop_codon_pos, 'Start codon must be placed before stop codon!'
+    def __init__(self, rna_sequence: Union[str, PackedSequence]) -> None:
+        if isinstance(rna_sequence, PackedSequence):
+            raw = rna_sequence.ascii()
+        else:
+            raw = np.frombuffer(rna_sequence.encode('ascii', errors='replace'), dtype=np.uint8)
+        self.codes = self.base_codes[raw]
+        assert not (self.codes == 255).any(), 'Sequence contains invalid nucleotide symbols!'
 
-        self.rna_seq = rna_sequence
+        # Codon starting at every position (all 3 frames at once): frame f is codons[f::3]
+        self.codons = self._codon_indexes(self.codes)
+        self._reverse_codons = None
 
     @property
     def to_protein(self) -> str:
         '''Terminates when stop codon is found'''
-        protein: str = ''
-
         # 1. Ignore everything before start codon
-        start_codon_pos = self.rna_seq.find('AUG')
+        is_start = self.codons == self.start_codon
+        assert is_start.any(), 'Sequence does not contain a start codon!'
+        start_codon_pos = int(is_start.argmax())
+
+        # Last of the 1st occurrences of every stop codon (in any frame)
+        stop_codon_pos = max(self._find(stop) for stop in self.stop_codons)
+        assert stop_codon_pos > -1, 'Sequence does not contain any of stop codons!'
+        # Notice that AUGAUG (duplicated start codons) can be read as aUGA (stop codon)
+        # If that situation is impossible, then we should replace 1 with 3
+        assert start_codon_pos + 1 <= stop_codon_pos, 'Start codon must be placed before stop codon!'
 
         # 2. Translate codons to amino acids until no stop codon was found
-        for nucl_pos in range(start_codon_pos, len(self.rna_seq), 3):
-            codon = self.rna_seq[nucl_pos:nucl_pos + 3]
-            if self.rna_codons[codon] == 'STOP':
-                break
-            protein += self.rna_codons[codon]
+        protein = self.codon_table[self.codons[start_codon_pos::3]]
+        stops = np.flatnonzero(protein == ord('*'))
+        if len(stops):
+            protein = protein[:stops[0]]
+        return protein.tobytes().decode('ascii')
+
+    def translate(self, frame: int = 1) -> str:
+        '''
+        Whole frame translated, STOP codons are '*'.
+        `frame` - 1, 2, 3 (forward, starting at base frame - 1) or -1, -2, -3 (reverse complement)
+        '''
+        codons = self._frame_codons(frame)
+        return self.codon_table[codons].tobytes().decode('ascii')
+
+    def frames(self, six: bool = False) -> Dict[int, str]:
+        '''Translations of frames 1, 2, 3 (and -1, -2, -3 with `six`)'''
+        frames = [1, 2, 3, -1, -2, -3] if six else [1, 2, 3]
+        return {frame: self.translate(frame) for frame in frames}
+
+    def orfs(self, min_length: int = 30, six: bool = True) -> List[Dict[str, Any]]:
+        '''
+        Open reading frames - 1st AUG after a STOP (or frame start) up to the next STOP, in every frame.
+        `min_length` - minimal number of amino acids (STOP excluded)
+        Returns dicts: frame, start, end (0-based positions on the forward strand, end exclusive, STOP included),
+        protein
+        '''
+        found = []
+        for frame in ([1, 2, 3, -1, -2, -3] if six else [1, 2, 3]):
+            codons = self._frame_codons(frame)
+            protein = self.codon_table[codons]
+
+            # 1. For every STOP the 1st AUG between the previous STOP and it
+            stops = np.flatnonzero(protein == ord('*'))
+            starts = np.flatnonzero(codons == self.start_codon)
+            if not len(starts) or not len(stops):
+                continue
+            previous_stops = np.concatenate(([-1], stops[:-1]))
+            # Index is clipped for STOPs after the last AUG, the clipped AUG is then before the previous STOP
+            first_start = starts[np.minimum(np.searchsorted(starts, previous_stops), len(starts) - 1)]
+            keep = (first_start > previous_stops) & (first_start < stops) & (stops - first_start >= min_length)
+
+            # 2. Codon numbers -> positions on the forward strand
+            offset = abs(frame) - 1
+            for start, stop in zip(first_start[keep].tolist(), stops[keep].tolist()):
+                begin, end = offset + 3 * start, offset + 3 * stop + 3
+                if frame < 0:
+                    begin, end = len(self.codes) - end, len(self.codes) - begin
+                found.append({
+                    'frame': frame,
+                    'start': begin,
+                    'end': end,
+                    'protein': protein[start:stop].tobytes().decode('ascii')
+                })
+        return found
+
+    def _frame_codons(self, frame: int) -> np.ndarray:
+        assert frame in (1, 2, 3, -1, -2, -3), 'Frame must be one of 1, 2, 3, -1, -2, -3'
+        if frame > 0:
+            return self.codons[frame - 1::3]
+        if self._reverse_codons is None:
+            # Reverse complement: A <-> U, C <-> G is 3 - code
+            self._reverse_codons = self._codon_indexes(3 - self.codes[::-1])
+        return self._reverse_codons[-frame - 1::3]
+
+    def _find(self, codon: int) -> int:
+        '''Like str.find - 1st position of the codon, -1 if missing'''
+        found = self.codons == codon
+        return int(found.argmax()) if found.any() else -1
 
-        return protein
+    @staticmethod
+    def _codon_indexes(codes: np.ndarray) -> np.ndarray:
+        '''Codon index of every 3 consecutive bases (overlapping windows of the same buffer)'''
+        if len(codes) < 3:
+            return np.zeros(0, dtype=np.uint8)
+        windows = np.lib.stride_tricks.sliding_window_view(codes, 3)
+        return windows[:, 0] * np.uint8(16) + windows[:, 1] * np.uint8(4) + windows[:, 2]
@@ -1,7 +1,13 @@
+import itertools
+import contextlib
 import click
 from SequenceAnalyzer import SequencesAnalyzer
-from HirschbergAlgorithm import HirschbergAlgorithm
-from ScoringSystem import ScoringSystem
+from ResultCache import ResultCache
+from Metrics import Metrics, metrics
+'''
+Modules needed only by some options (files, references, Hirschberg, profilers) are imported where they are used,
+so a plain run of 2 sequences starts fast (see benchmark.py --engine startup-analyze).
+'''
 
 @click.command()
 @click.argument('sequence_a')
@@ -12,27 +18,84 @@ from ScoringSystem import ScoringSystem
 @click.option('-a', '--alignment', type=click.Choice(['global', 'local']))
 #@click.option('--load', type=click.Path(exists=True), help='Text file containing 5x5 matrix of integers separated by spaces and new line')
 @click.option('--load-csv', is_flag=True, help='Load scores.csv and edit_cost.csv')
-def main(load_csv, summary, similarity, edit_distance, sequence_a, sequence_b, alignment):
-    analyzer = SequencesAnalyzer(sequence_a, sequence_b, load_csv=load_csv)
+@click.option('-m', '--show-matrices', is_flag=True, help='Print result and traceback matrices (large ones truncated)')
+@click.option('-b', '--band', type=click.IntRange(min=0), is_flag=False, flag_value=0, default=None,
+              help='Banded global alignment/similarity/edit distance for similar sequences, '
+                   'initial band width is doubled when needed (automatic if no value)')
+@click.option('-g', '--gap-open', type=int, default=0,
+              help='Affine gap opening score for similarity and alignments, added once per gap run (e.g. -5)')
+@click.option('-f', '--from-files', is_flag=True,
+              help='SEQUENCE_A and SEQUENCE_B are FASTA/FASTQ files (optionally gzipped), 1st record of each is used')
+@click.option('-r', '--reference', type=click.Path(exists=True, dir_okay=False, readable=True),
+              help='Packed reference (see index_reference.py), SEQUENCE_A is a region of it, e.g. chr1:1000-2000')
+@click.option('--max-distance', type=click.IntRange(min=0),
+              help='Edit distance only if it is at most this (Cost>N otherwise, stops early)')
+@click.option('--min-score', type=int, help='Similarity only if it is at least this (Score<N otherwise, stops early)')
+@click.option('-c', '--cache', type=click.Path(dir_okay=False, writable=True),
+              help='SQLite file with results of previous runs (created if missing)')
+@click.option('--metrics', 'metrics_output', type=click.Path(dir_okay=False, writable=True), is_flag=False,
+              flag_value='-', default=None,
+              help='Save phase timings and counters (cells, bytes allocated) as JSON (stderr if no value)')
+@click.option('--profile', type=click.Choice(['cprofile', 'pyinstrument']), help='Profile the run')
+@click.option('--profile-output', type=click.Path(dir_okay=False, writable=True),
+              help='Profiler report file (cProfile stats or pyinstrument HTML, default: stderr)')
+def main(load_csv, summary, similarity, edit_distance, sequence_a, sequence_b, alignment, show_matrices, band, gap_open,
+         from_files, reference, max_distance, min_score, cache, metrics_output, profile, profile_output):
+    if profile == 'pyinstrument':
+        import importlib.util
+        if importlib.util.find_spec('pyinstrument') is None:
+            raise click.BadParameter('pyinstrument is not installed (pip install pyinstrument)', param_hint='--profile')
+    if metrics_output:
+        metrics.enable()
+    with Metrics.profile(profile, profile_output):
+        analyze(load_csv, summary, similarity, edit_distance, sequence_a, sequence_b, alignment, show_matrices, band,
+                gap_open, from_files, reference, max_distance, min_score, cache)
+    if metrics_output:
+        metrics.dump(metrics_output)
 
-    if summary:
-        analyzer.edit_distance()
-        analyzer.similarity()
-        analyzer.local_alignment()
-        analyzer.global_alignment()
-    if similarity:
-        analyzer.similarity()
-    if edit_distance:
-        analyzer.edit_distance()
 
-    if alignment == 'local':
-        analyzer.local_alignment()
-    elif alignment == 'global':
-        analyzer.global_alignment()
-        print('--------------------------')
-        #analyzer.hirschberg_algorithm(X=analyzer.seq_a, Y=analyzer.seq_b)
-        scoring_sys = ScoringSystem(match=2, mismatch=-1, gap=-2)
-        HirschbergAlgorithm(scoring_sys).align(sequence_a, sequence_b)
+def analyze(load_csv, summary, similarity, edit_distance, sequence_a, sequence_b, alignment, show_matrices, band,
+            gap_open, from_files, reference, max_distance, min_score, cache):
+    with metrics.phase('input'):
+        if from_files:
+            from SequenceReader import SequenceReader
+            # Sequences are kept packed (2 bits per nucleotide)
+            if not reference:
+                (_, sequence_a), = itertools.islice(SequenceReader(sequence_a, packed=True), 1)
+            (_, sequence_b), = itertools.islice(SequenceReader(sequence_b, packed=True), 1)
+        if reference:
+            from IndexedReference import IndexedReference
+            # Window of the memory-mapped reference (only its pages are read)
+            sequence_a = IndexedReference(reference).region(sequence_a)
+
+    # Results are shared between the steps (e.g. --summary with --alignment) by the analyzer itself,
+    # the cache is only needed to keep them between runs
+    with ResultCache(path=cache) if cache else contextlib.nullcontext() as result_cache:
+        analyzer = SequencesAnalyzer(sequence_a, sequence_b, load_csv=load_csv, show_matrices=show_matrices, band=band,
+                                     gap_open=gap_open, cache=result_cache)
+        if summary:
+            # Single pass over the DP grid for all scores
+            analyzer.summary()
+        if similarity or min_score is not None:
+            analyzer.similarity(min_score)
+        if edit_distance or max_distance is not None:
+            analyzer.edit_distance(max_distance)
+
+        if alignment == 'local':
+            analyzer.local_alignment()
+        elif alignment == 'global':
+            analyzer.global_alignment()
+            if gap_open:
+                # Hirschberg works with linear gaps only
+                return
+            print('--------------------------')
+            from HirschbergAlgorithm import HirschbergAlgorithm
+            #analyzer.hirschberg_algorithm(X=analyzer.seq_a, Y=analyzer.seq_b)
+            alignment_a, alignment_b, score = HirschbergAlgorithm(analyzer.scoring_sys).align(sequence_a, sequence_b)
+            print(
+                f"[Hirschberg Alignment] Score={score}\n"
+                f"Alignment:\n {alignment_a}\n {alignment_b}\n"
+            )
 
 
 if __name__ == '__main__':
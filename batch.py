@@ -0,0 +1,250 @@
+import os
+import sys
+import itertools
+import click
+import numpy as np
+from collections import deque
+from multiprocessing import Pool
+from dataclasses import replace
+from typing import Any, Callable, Deque, Iterable, Iterator, List, Optional, Tuple
+from SequenceAnalyzer import SequencesAnalyzer
+from ScoringSystem import ScoringSystem
+from StripedSmithWaterman import StripedSmithWaterman
+from SequenceReader import SequenceReader
+from PackedSequence import PackedSequence
+from ResultCache import ResultCache
+from AlignmentResult import AlignmentResult
+from AlignmentWriter import AlignmentWriter
+'''
+All-vs-all (or listed pairs) scoring of many sequences.
+Scoring systems are loaded once and shared by worker processes, pairs are spread over a process pool in chunks.
+Local scores reuse the query profile (striped Smith-Waterman) for consecutive pairs with the same query.
+With --max-distance/--min-score only the pairs passing the threshold are written (near-duplicate filtering),
+the fill of the other pairs stops as soon as they cannot pass.
+Alignment metrics give CIGAR and coordinates of every pair (see AlignmentWriter for the TSV and binary output).
+With --cache or --pairs scores are looked up in a ResultCache by the main process (repeated, symmetric and --cache
+pairs are not sent to be scored again, workers only pass them through to keep the output order).
+All-vs-all pairs are unique, so without --cache no keys are hashed and no results are kept.
+'''
+
+# ResultCache modes of the metrics (the same as in SequencesAnalyzer)
+cache_modes = {'edit-distance': 'edit-distance', 'similarity': 'similarity', 'local': 'local-score',
+               'global-alignment': 'global-alignment:{band}', 'local-alignment': 'local-alignment'}
+# Metrics -> SequencesAnalyzer.align modes
+alignment_modes = {'global-alignment': 'global', 'local-alignment': 'local'}
+
+# Worker process state (set once by _init_worker)
+_worker = {}
+
+
+def read_sequences(filename: str) -> List[Tuple[str, PackedSequence]]:
+    '''FASTA/FASTQ (gzipped too) or plain text with 1 sequence per line -> [(name, packed sequence), ...]'''
+    return list(SequenceReader(filename, packed=True))
+
+
+def _init_worker(seqs_a: List[PackedSequence], seqs_b: List[PackedSequence], metric: str, band: Optional[int],
+                 scoring_sys: ScoringSystem, edit_cost_sys: ScoringSystem, threshold: Optional[int] = None) -> None:
+    _worker.update(seqs_a=seqs_a, seqs_b=seqs_b, metric=metric, band=band,
+                   scoring_sys=scoring_sys, edit_cost_sys=edit_cost_sys, threshold=threshold)
+
+
+def _score_pair(task: Tuple[int, int, Any]) -> Tuple[int, int, Any]:
+    '''(i, j, score or AlignmentResult), score is None when it does not pass the threshold'''
+    i, j, cached = task
+    threshold = _worker['threshold']
+    if cached is not None:
+        if threshold is not None and not _passes(cached, threshold):
+            return i, j, None
+        return i, j, cached
+    if _worker['metric'] == 'local':
+        return i, j, _local_score(i, j)
+
+    analyzer = SequencesAnalyzer(_worker['seqs_a'][i], _worker['seqs_b'][j], band=_worker['band'],
+                                 scoring_sys=_worker['scoring_sys'], edit_cost_sys=_worker['edit_cost_sys'])
+    metric = _worker['metric']
+    if metric in alignment_modes:
+        # Only the CIGAR and coordinates are sent back (sequences stay in the worker)
+        return i, j, replace(analyzer.align(alignment_modes[metric]), seq_a=None, seq_b=None)
+    if threshold is not None:
+        # Threshold query, the exact score of failing pairs is never computed
+        if metric == 'edit-distance':
+            return i, j, analyzer.within_distance(threshold)
+        return i, j, analyzer.within_score(threshold)
+    if metric == 'edit-distance':
+        score = analyzer.needleman_wunsch_score(minimize=True)
+    else:
+        score = analyzer.needleman_wunsch_score(minimize=False)
+    return i, j, score
+
+
+def _passes(score: int, threshold: int) -> bool:
+    if _worker['metric'] == 'edit-distance':
+        return score <= threshold
+    return score >= threshold
+
+
+def _local_score(i: int, j: int) -> int:
+    '''Striped Smith-Waterman, query profile of seqs_a[i] is kept for the following pairs (i, *)'''
+    scoring_sys = _worker['scoring_sys']
+    if _worker.get('query') != i:
+        query = scoring_sys.encode(_worker['seqs_a'][i])
+        aligner = StripedSmithWaterman(scoring_sys.matrix, scoring_sys.gap_code, query, scoring_sys.gap_open)
+        _worker.update(query=i, aligner=aligner)
+    return _worker['aligner'].align(scoring_sys.encode(_worker['seqs_b'][j]))['score']
+
+
+def _store(results: Iterator[Tuple[int, int, Any]], cache: Optional[ResultCache],
+           cache_key: Callable[[int, int], str]) -> Iterator[Tuple[int, int, Any]]:
+    '''Put scores (alignments) into the cache on the way to the output, pairs failing the threshold are dropped'''
+    for i, j, score in results:
+        if score is None:
+            continue
+        if cache is not None:
+            cache.put(cache_key(i, j), score if isinstance(score, AlignmentResult) else int(score))
+        yield i, j, score
+
+
+def _bounded_imap(pool: Any, function: Callable, tasks: Iterator, chunk_size: int,
+                  batch_size: int) -> Iterator:
+    '''
+    pool.imap in order, but tasks are read `batch_size` at a time (imap alone drains the whole task iterator
+    into the pool's queue). The next batch is submitted before the results of the current one are consumed,
+    so workers do not wait at batch boundaries and at most 2 batches are in memory.
+    '''
+    batches = iter(lambda: list(itertools.islice(tasks, batch_size)), [])
+    pending: Deque[Iterable] = deque()
+    for batch in batches:
+        pending.append(pool.imap(function, batch, chunksize=chunk_size))
+        if len(pending) == 2:
+            yield from pending.popleft()
+    while pending:
+        yield from pending.popleft()
+
+
+def _pairs(names_a: List[str], names_b: List[str], same_file: bool, pairs_file: Optional[str]) -> Iterator[Tuple[int, int]]:
+    '''Index pairs to score (generated lazily - all-vs-all can be huge)'''
+    if pairs_file:
+        index_a = {name: i for i, name in enumerate(names_a)}
+        index_b = {name: j for j, name in enumerate(names_b)}
+        with open(pairs_file) as f:
+            for line in f:
+                if line.strip():
+                    name_a, name_b = line.split()[:2]
+                    yield index_a[name_a], index_b[name_b]
+    elif same_file:
+        # Scores are symmetric, skip (b, a) and (a, a)
+        yield from itertools.combinations(range(len(names_a)), 2)
+    else:
+        yield from itertools.product(range(len(names_a)), range(len(names_b)))
+
+
+@click.command()
+@click.argument('file_a', type=click.Path(exists=True, dir_okay=False, readable=True))
+@click.argument('file_b', required=False, type=click.Path(exists=True, dir_okay=False, readable=True))
+@click.option('-M', '--metric', type=click.Choice(list(cache_modes)), default='edit-distance',
+              help='Score or alignment (CIGAR and coordinates) of every pair')
+@click.option('-p', '--pairs', type=click.Path(exists=True, dir_okay=False, readable=True),
+              help='Text file with pairs of sequence names (1 pair per line) instead of all-vs-all')
+@click.option('-j', '--jobs', type=click.IntRange(min=1), default=os.cpu_count(), help='Number of worker processes')
+@click.option('--chunk-size', type=click.IntRange(min=1), default=64, help='Pairs sent to a worker at once')
+@click.option('-o', '--output', type=click.Path(dir_okay=False, writable=True), help='TSV file (default: stdout)')
+@click.option('--binary', is_flag=True, help='Save alignments to --output in the binary format (see AlignmentWriter)')
+@click.option('--npy', type=click.Path(dir_okay=False, writable=True), help='Save scores as numpy matrix (.npy) instead of TSV')
+@click.option('-b', '--band', type=click.IntRange(min=0), is_flag=False, flag_value=0, default=None,
+              help='Banded similarity/edit distance (automatic if no value)')
+@click.option('-g', '--gap-open', type=int, default=0,
+              help='Affine gap opening score for similarity and local metrics, added once per gap run (e.g. -5)')
+@click.option('--load-csv', is_flag=True, help='Load scores.csv and edit_cost.csv')
+@click.option('--max-distance', type=click.IntRange(min=0),
+              help='Write only pairs with edit distance at most this (edit-distance metric)')
+@click.option('--min-score', type=int, help='Write only pairs with similarity at least this (similarity metric)')
+@click.option('-c', '--cache', type=click.Path(dir_okay=False, writable=True),
+              help='SQLite file with scores of previous runs (created if missing)')
+def main(file_a, file_b, metric, pairs, jobs, chunk_size, output, binary, npy, band, gap_open, load_csv, max_distance,
+         min_score, cache):
+    if max_distance is not None and metric != 'edit-distance':
+        raise click.BadParameter('needs --metric edit-distance', param_hint='--max-distance')
+    if min_score is not None and metric != 'similarity':
+        raise click.BadParameter('needs --metric similarity', param_hint='--min-score')
+    if metric in alignment_modes and npy:
+        raise click.BadParameter('alignments cannot be saved as a numpy matrix', param_hint='--npy')
+    if binary and (metric not in alignment_modes or not output):
+        raise click.BadParameter('binary output holds alignments and needs --output', param_hint='--binary')
+
+    records_a = read_sequences(file_a)
+    records_b = read_sequences(file_b) if file_b else records_a
+    names_a, seqs_a = [name for name, _ in records_a], [seq for _, seq in records_a]
+    names_b, seqs_b = [name for name, _ in records_b], [seq for _, seq in records_b]
+
+    # Scoring systems are loaded and compiled once, workers get ready copies
+    scoring_sys = ScoringSystem(match=2, mismatch=-1, gap=-2, gap_open=gap_open)
+    edit_cost_sys = ScoringSystem(match=0, mismatch=1, gap=1)
+    if load_csv:
+        scoring_sys.load_csv('scores.csv')
+        edit_cost_sys.load_csv('edit_cost.csv')
+    # Accessing the property compiles the matrix before it is pickled for workers
+    scoring_sys.matrix, edit_cost_sys.matrix
+
+    # Listed pairs may repeat, all-vs-all pairs are unique (nothing to look up without --cache)
+    result_cache = ResultCache(path=cache) if cache or pairs else None
+    cached_scoring_sys = edit_cost_sys if metric == 'edit-distance' else scoring_sys
+    if result_cache is not None:
+        # Sequences are hashed once, keys of pairs are built from the digests
+        digests_a = [ResultCache.digest(seq) for seq in seqs_a]
+        digests_b = [ResultCache.digest(seq) for seq in seqs_b] if file_b else digests_a
+
+    def cache_key(i: int, j: int) -> str:
+        # Alignments are cached in the given order
+        return result_cache.key(cache_modes[metric].format(band=band), cached_scoring_sys, digests_a[i], digests_b[j],
+                                symmetric=metric not in alignment_modes)
+
+    pair_indexes = _pairs(names_a, names_b, same_file=file_b is None, pairs_file=pairs)
+    if result_cache is not None:
+        tasks = ((i, j, result_cache.get(cache_key(i, j))) for i, j in pair_indexes)
+    else:
+        tasks = ((i, j, None) for i, j in pair_indexes)
+    threshold = max_distance if max_distance is not None else min_score
+    init_args = (seqs_a, seqs_b, metric, band, scoring_sys, edit_cost_sys, threshold)
+
+    if jobs == 1:
+        _init_worker(*init_args)
+        results = map(_score_pair, tasks)
+        pool = None
+    else:
+        pool = Pool(processes=jobs, initializer=_init_worker, initargs=init_args)
+        # Pairs are generated lazily, only a few chunks per worker are read ahead
+        results = _bounded_imap(pool, _score_pair, tasks, chunk_size, batch_size=4 * jobs * chunk_size)
+    results = _store(results, result_cache, cache_key)
+
+    try:
+        if npy:
+            # Pairs which were not scored stay NaN
+            matrix = np.full(shape=(len(seqs_a), len(seqs_b)), fill_value=np.nan)
+            for i, j, score in results:
+                matrix[i, j] = score
+                if file_b is None:
+                    matrix[j, i] = score
+            np.save(npy, matrix)
+        elif metric in alignment_modes:
+            with AlignmentWriter(output, format='binary' if binary else 'tsv') as writer:
+                for i, j, result in results:
+                    writer.write(names_a[i], names_b[j], result)
+        else:
+            out = open(output, 'w', buffering=1 << 16) if output else sys.stdout
+            try:
+                out.write(f'name_a\tname_b\t{metric}\n')
+                for i, j, score in results:
+                    out.write(f'{names_a[i]}\t{names_b[j]}\t{score}\n')
+            finally:
+                if output:
+                    out.close()
+    finally:
+        if result_cache is not None:
+            result_cache.close()
+        if pool is not None:
+            pool.close()
+            pool.join()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,248 @@
+import os
+import sys
+import json
+import time
+import platform
+import subprocess
+import tracemalloc
+import click
+import numpy as np
+from typing import Any, Callable, Dict, List, Tuple
+from SequenceAnalyzer import SequencesAnalyzer
+from NeedlemanWunschAlgorithm import NeedlemanWunschAlgorithm
+from HirschbergAlgorithm import HirschbergAlgorithm
+from IncrementalAlignment import IncrementalAlignment
+from SummaryEngine import SummaryEngine
+from ScoringSystem import ScoringSystem
+from Translator import Translator
+'''
+Benchmarks of the aligners and the translator over input sizes (seeded, offline, CPU only).
+
+Pairs of every size are generated twice:
+- random  - two independent random sequences
+- mutated - a random sequence and its copy with substitutions and short indels (like reads of the same locus)
+Every engine is timed (best of --repeat runs) and run once more under tracemalloc for the peak memory,
+cells/s is (n + 1) * (m + 1) cells of the DP matrix per second (bases per second for the translator).
+Startup engines time cold starts of the CLIs in a new interpreter (imports included, size 0, runs per second),
+so a heavy import on the common path shows up as a regression.
+
+Results are saved as JSON, `--baseline` compares them with a saved run and fails (exit code 1)
+when an engine got slower by more than `--threshold`.
+'''
+
+nucleotides = np.frombuffer(b'ACGT', dtype=np.uint8)
+# Slowdowns smaller than this (seconds) are timer noise, not regressions
+noise_floor = 0.005
+# Startup engine -> command line of a script (run by the current interpreter)
+startup_commands = {
+    'startup-analyze': ['analyze.py', 'AGCTTTAGCA', 'AGAGCA', '--edit-distance', '--similarity'],
+    'startup-translate': ['translate.py', 'AUGACGGAGCUUCGGAGCUAG'],
+}
+
+
+def random_sequence(length: int, rng: np.random.Generator, alphabet: np.ndarray = nucleotides) -> str:
+    return alphabet[rng.integers(0, len(alphabet), size=length)].tobytes().decode('ascii')
+
+
+def mutated_copy(sequence: str, rate: float, rng: np.random.Generator) -> str:
+    '''Copy with `rate` of positions changed: 80% substitutions, 10% insertions, 10% deletions (1-3 bases)'''
+    letters = np.frombuffer(sequence.encode('ascii'), dtype=np.uint8).copy()
+    positions = np.flatnonzero(rng.random(len(letters)) < rate)
+    kinds = rng.random(len(positions))
+
+    # 1. Substitutions (always a different letter)
+    substituted = positions[kinds < 0.8]
+    shift = rng.integers(1, 4, size=len(substituted))
+    letters[substituted] = nucleotides[(np.searchsorted(nucleotides, letters[substituted]) + shift) % 4]
+
+    # 2. Indels, applied from the end so positions stay valid
+    pieces = letters.tobytes().decode('ascii')
+    for position, kind in sorted(zip(positions[kinds >= 0.8].tolist(), kinds[kinds >= 0.8].tolist()), reverse=True):
+        length = int(rng.integers(1, 4))
+        if kind < 0.9:
+            pieces = pieces[:position] + random_sequence(length, rng) + pieces[position:]
+        else:
+            pieces = pieces[:position] + pieces[position + length:]
+    return pieces
+
+
+def sequence_pair(size: int, kind: str, seed: int) -> Tuple[str, str]:
+    # Same seed and size give the same pair on every machine
+    rng = np.random.default_rng([seed, size, kind == 'mutated'])
+    seq_a = random_sequence(size, rng)
+    seq_b = mutated_copy(seq_a, 0.05, rng) if kind == 'mutated' else random_sequence(size, rng)
+    return seq_a, seq_b
+
+
+def engines(scoring_sys: ScoringSystem, edit_cost_sys: ScoringSystem) -> Dict[str, Tuple[Callable, str]]:
+    '''name -> (function of a pair, size limit: 'score', 'matrix' (builds full matrices) or 'bit-parallel')'''
+    def analyzer(seq_a: str, seq_b: str, band: Any = None) -> SequencesAnalyzer:
+        return SequencesAnalyzer(seq_a, seq_b, band=band, scoring_sys=scoring_sys, edit_cost_sys=edit_cost_sys)
+
+    def summary(seq_a: str, seq_b: str) -> Dict[str, Any]:
+        summary_engine = SummaryEngine(scoring_sys.gap_code)
+        summary_engine.add_lane('edit-distance', edit_cost_sys.matrix, minimize=True)
+        summary_engine.add_lane('similarity', scoring_sys.matrix)
+        summary_engine.add_lane('local', scoring_sys.matrix, local=True)
+        return summary_engine.run(scoring_sys.encode(seq_a), scoring_sys.encode(seq_b))
+
+    def incremental_append(seq_a: str, seq_b: str) -> int:
+        # 2nd half of seq_a is appended 1% at a time, the score is asked for after every append
+        half, delta = len(seq_a) // 2, max(1, len(seq_a) // 100)
+        incremental = IncrementalAlignment(seq_a[:half], seq_b, scoring_sys)
+        for start in range(half, len(seq_a), delta):
+            incremental.append_a(seq_a[start:start + delta])
+            incremental.score
+        return incremental.score
+
+    nw = NeedlemanWunschAlgorithm(scoring_sys)
+    return {
+        # Unit edit costs -> Myers bit-parallel algorithm
+        'edit-distance': (lambda a, b: analyzer(a, b).needleman_wunsch_score(minimize=True), 'bit-parallel'),
+        'similarity': (lambda a, b: analyzer(a, b).needleman_wunsch_score(minimize=False), 'score'),
+        'similarity-banded': (lambda a, b: analyzer(a, b, band=0).needleman_wunsch_score(minimize=False), 'score'),
+        'local-score': (lambda a, b: analyzer(a, b).smith_waterman_score(), 'score'),
+        'summary': (summary, 'score'),
+        'needleman-wunsch-rows': (lambda a, b: nw.last_row(scoring_sys.encode(a), scoring_sys.encode(b)), 'score'),
+        'hirschberg': (lambda a, b: HirschbergAlgorithm(scoring_sys).align(a, b), 'score'),
+        'incremental-append': (incremental_append, 'score'),
+        'global-alignment': (lambda a, b: analyzer(a, b).align('global'), 'matrix'),
+        'local-alignment': (lambda a, b: analyzer(a, b).smith_waterman_algorithm(), 'matrix'),
+    }
+
+
+def measure(function: Callable, arguments: Tuple, repeat: int) -> Tuple[float, int]:
+    '''(best wall time in seconds, peak traced memory in bytes)'''
+    # Tracing slows Python code down, so memory is measured in a separate run (it also warms up caches)
+    tracemalloc.start()
+    try:
+        function(*arguments)
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    seconds = float('inf')
+    for _ in range(repeat):
+        started = time.perf_counter()
+        function(*arguments)
+        seconds = min(seconds, time.perf_counter() - started)
+    return seconds, peak
+
+
+def startup(command: List[str], repeat: int) -> float:
+    '''Best wall time of a script run in a new interpreter (seconds)'''
+    script = os.path.join(os.path.dirname(os.path.abspath(__file__)), command[0])
+    seconds = float('inf')
+    for _ in range(repeat):
+        started = time.perf_counter()
+        subprocess.run([sys.executable, script, *command[1:]], check=True, stdout=subprocess.DEVNULL)
+        seconds = min(seconds, time.perf_counter() - started)
+    return seconds
+
+
+def run(sizes: List[int], selected: List[str], repeat: int, seed: int, max_cells: int,
+        max_matrix_cells: int) -> List[Dict[str, Any]]:
+    scoring_sys = ScoringSystem(match=2, mismatch=-1, gap=-2)
+    edit_cost_sys = ScoringSystem(match=0, mismatch=1, gap=1)
+    results = []
+    # Bit-parallel algorithm handles 64 cells per operation
+    limits = {'score': max_cells, 'matrix': max_matrix_cells, 'bit-parallel': 64 * max_cells}
+
+    # 1. Aligners (pairs of both kinds)
+    for name, (function, limit) in engines(scoring_sys, edit_cost_sys).items():
+        if selected and name not in selected:
+            continue
+        for size in sizes:
+            cells = (size + 1) ** 2
+            if cells > limits[limit]:
+                click.echo(f'{name:>22} {size:>8} skipped ({cells:.1e} cells)', err=True)
+                continue
+            for kind in ('random', 'mutated'):
+                seq_a, seq_b = sequence_pair(size, kind, seed)
+                cells = (len(seq_a) + 1) * (len(seq_b) + 1)
+                seconds, peak = measure(function, (seq_a, seq_b), repeat)
+                results.append(report(name, kind, size, cells, seconds, peak))
+
+    # 2. Translator (linear, every size is run)
+    if not selected or 'translator' in selected:
+        rna = np.frombuffer(b'ACGU', dtype=np.uint8)
+        for size in sizes:
+            sequence = random_sequence(size, np.random.default_rng([seed, size]), alphabet=rna)
+            seconds, peak = measure(lambda s: Translator(s).orfs(min_length=30), (sequence,), repeat)
+            results.append(report('translator', 'random', size, size, seconds, peak))
+
+    # 3. Cold starts of the CLIs (independent of sizes)
+    for name, command in startup_commands.items():
+        if selected and name not in selected:
+            continue
+        results.append(report(name, 'cold', 0, 1, startup(command, repeat), 0))
+    return results
+
+
+def report(engine: str, kind: str, size: int, cells: int, seconds: float, peak: int) -> Dict[str, Any]:
+    result = {'engine': engine, 'kind': kind, 'size': size, 'cells': cells, 'seconds': seconds,
+              'peak_bytes': peak, 'cells_per_second': cells / max(seconds, 1e-9)}
+    click.echo(f"{engine:>22} {size:>8} {kind:>8} {seconds:10.4f}s {peak / 2 ** 20:9.2f} MiB "
+               f"{result['cells_per_second']:12.3e} cells/s", err=True)
+    return result
+
+
+def compare(results: List[Dict[str, Any]], baseline: Dict[str, Any], threshold: float) -> List[str]:
+    '''Regressions: results slower than the baseline by more than `threshold` (0.5 - 50%)'''
+    before = {(result['engine'], result['kind'], result['size']): result for result in baseline['results']}
+    regressions = []
+    for result in results:
+        old = before.get((result['engine'], result['kind'], result['size']))
+        if old is None:
+            continue
+        ratio = result['seconds'] / max(old['seconds'], 1e-9)
+        if ratio > 1 + threshold and result['seconds'] - old['seconds'] > noise_floor:
+            regressions.append(f"{result['engine']} {result['kind']} {result['size']}: "
+                               f"{old['seconds']:.4f}s -> {result['seconds']:.4f}s ({ratio:.2f}x)")
+    return regressions
+
+
+@click.command()
+@click.option('-s', '--sizes', default='100,1000,10000,100000', help='Comma separated sequence lengths (bp)')
+@click.option('-e', '--engine', 'selected', multiple=True, help='Run only these engines (repeatable)')
+@click.option('-r', '--repeat', type=click.IntRange(min=1), default=3, help='Timed runs, the best one counts')
+@click.option('--seed', type=int, default=2024, help='Seed of the sequence generators')
+@click.option('--max-cells', type=click.IntRange(min=1), default=2 * 10 ** 8,
+              help='Larger pairs are skipped by score-only aligners')
+@click.option('--max-matrix-cells', type=click.IntRange(min=1), default=10 ** 7,
+              help='Larger pairs are skipped by aligners building full matrices')
+@click.option('-o', '--output', type=click.Path(dir_okay=False, writable=True), help='Save results as JSON')
+@click.option('-b', '--baseline', type=click.Path(exists=True, dir_okay=False, readable=True),
+              help='JSON of a previous run to compare with')
+@click.option('-t', '--threshold', type=click.FloatRange(min=0), default=0.5,
+              help='Allowed slowdown against the baseline (0.5 - 50%)')
+def main(sizes, selected, repeat, seed, max_cells, max_matrix_cells, output, baseline, threshold):
+    # A typo would otherwise give an empty benchmark (and no regressions)
+    known = [*engines(ScoringSystem(), ScoringSystem()), 'translator', *startup_commands]
+    unknown = [name for name in selected if name not in known]
+    if unknown:
+        raise click.BadParameter(f"unknown engine {', '.join(map(repr, unknown))}, choose from {', '.join(known)}",
+                                 param_hint='--engine')
+    sizes = [int(size) for size in sizes.split(',')]
+    results = run(sizes, list(selected), repeat, seed, max_cells, max_matrix_cells)
+
+    if output:
+        with open(output, 'w') as f:
+            json.dump({
+                'meta': {'python': platform.python_version(), 'numpy': np.__version__, 'machine': platform.machine(),
+                         'processor': platform.processor(), 'seed': seed, 'repeat': repeat},
+                'results': results
+            }, f, indent=2)
+
+    if baseline:
+        with open(baseline) as f:
+            regressions = compare(results, json.load(f), threshold)
+        for regression in regressions:
+            click.echo(f'REGRESSION {regression}', err=True)
+        if regressions:
+            sys.exit(1)
+        click.echo(f'No regressions (threshold {threshold:.0%})', err=True)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,26 @@
+import click
+from IndexedReference import IndexedReference
+from KmerIndex import KmerIndex
+
+
+@click.command()
+@click.argument('fasta', type=click.Path(exists=True, dir_okay=False, readable=True))
+@click.option('-o', '--output', type=click.Path(dir_okay=False, writable=True),
+              help='Packed reference file (default: FASTA.pack), index is written next to it')
+@click.option('-k', '--kmer-size', type=click.IntRange(min=1, max=32), default=None,
+              help='Also build a minimizer index of k-mers for search.py (OUTPUT.kmi.npz)')
+@click.option('-w', '--window', type=click.IntRange(min=1), default=10,
+              help='K-mers per minimizer window (1 - index every k-mer)')
+def main(fasta, output, kmer_size, window):
+    path = IndexedReference.build(fasta, output)
+    reference = IndexedReference(path)
+    for name in reference:
+        click.echo(f'{name}\t{len(reference[name])}')
+    click.echo(f'Indexed {len(reference)} sequences: {path}')
+    if kmer_size:
+        index = KmerIndex.build(reference, k=kmer_size, w=window)
+        click.echo(f'Indexed {len(index)} minimizers: {index.save(path + ".kmi")}')
+
+
+if __name__ == '__main__':
+    main()
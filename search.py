@@ -0,0 +1,63 @@
+import os
+import sys
+import time
+import click
+from IndexedReference import IndexedReference
+from KmerIndex import KmerIndex
+from ScoringSystem import ScoringSystem
+from SequenceReader import SequenceReader
+from AlignmentWriter import AlignmentWriter
+'''
+Seed-and-extend search of queries in a packed reference with a minimizer index
+(python index_reference.py genome.fa --kmer-size 15), see KmerIndex.
+Aligners run only on the reference windows of the best seed chains, not on whole records.
+'''
+
+
+@click.command()
+@click.argument('queries', type=click.Path(exists=True, dir_okay=False, readable=True))
+@click.argument('reference', type=click.Path(exists=True, dir_okay=False, readable=True))
+@click.option('-m', '--mode', type=click.Choice(['local', 'global']), default='local',
+              help='Aligner run on the candidate windows')
+@click.option('--max-hits', type=click.IntRange(min=1), default=5, help='Candidate windows aligned per query')
+@click.option('--min-seeds', type=click.IntRange(min=1), default=2, help='Seed hits needed by a candidate')
+@click.option('--max-occurrences', type=click.IntRange(min=1), default=500,
+              help='Seeds found more often in the reference are skipped (repeats)')
+@click.option('--max-gap', type=click.IntRange(min=0), default=32,
+              help='Diagonals of seed hits closer than this are chained (indels)')
+@click.option('--flank', type=click.IntRange(min=0), default=32, help='Bases added around local alignment windows')
+@click.option('-g', '--gap-open', type=int, default=0,
+              help='Affine gap opening score, added once per gap run (e.g. -5)')
+@click.option('--load-csv', is_flag=True, help='Load scores.csv')
+@click.option('-o', '--output', type=click.Path(dir_okay=False, writable=True), help='TSV file (default: stdout)')
+@click.option('--binary', is_flag=True, help='Save alignments to --output in the binary format (see AlignmentWriter)')
+def main(queries, reference, mode, max_hits, min_seeds, max_occurrences, max_gap, flank, gap_open, load_csv, output,
+         binary):
+    if binary and not output:
+        raise click.BadParameter('binary output needs --output', param_hint='--binary')
+    index_path = reference + '.kmi.npz'
+    if not os.path.exists(index_path):
+        raise click.BadParameter(f'{index_path} is missing, build it with index_reference.py --kmer-size',
+                                 param_hint='REFERENCE')
+
+    started = time.perf_counter()
+    packed_reference = IndexedReference(reference)
+    index = KmerIndex.load(index_path)
+    scoring_sys = ScoringSystem(match=2, mismatch=-1, gap=-2, gap_open=gap_open)
+    if load_csv:
+        scoring_sys.load_csv('scores.csv')
+
+    count = 0
+    with AlignmentWriter(output, format='binary' if binary else 'tsv') as writer:
+        for name, query in SequenceReader(queries):
+            for record, result in index.search(query, packed_reference, mode=mode, scoring_sys=scoring_sys, flank=flank,
+                                               max_hits=max_hits, max_occurrences=max_occurrences, max_gap=max_gap,
+                                               min_seeds=min_seeds):
+                writer.write(record, name, result)
+            count += 1
+    seconds = time.perf_counter() - started
+    print(f'Searched {count} queries in {seconds:.2f}s ({len(index)} seeds in the index)', file=sys.stderr)
+
+
+if __name__ == '__main__':
+    main()
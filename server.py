@@ -0,0 +1,72 @@
+import os
+import json
+import signal
+import asyncio
+import click
+from AlignmentServer import AlignmentServer
+from ScoringSystem import ScoringSystem
+'''
+Alignment server (see AlignmentServer for the JSON lines protocol), pipelines send many small requests
+to warm workers instead of starting analyze.py/translate.py for each of them.
+SIGINT/SIGTERM stop it, final stats are printed on stderr.
+'''
+
+
+async def serve(server: AlignmentServer, stats_interval: float, **address) -> None:
+    loop = asyncio.get_running_loop()
+    serving = asyncio.ensure_future(server.serve(**address))
+    for signal_number in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(signal_number, serving.cancel)
+    reporter = asyncio.ensure_future(report(server, stats_interval)) if stats_interval else None
+    try:
+        await serving
+    except asyncio.CancelledError:
+        pass
+    finally:
+        if reporter is not None:
+            reporter.cancel()
+
+
+async def report(server: AlignmentServer, interval: float) -> None:
+    while True:
+        await asyncio.sleep(interval)
+        click.echo(json.dumps(server.stats()), err=True)
+
+
+@click.command()
+@click.option('-s', '--socket', 'socket_path', type=click.Path(dir_okay=False, writable=True),
+              help='Unix socket to listen on (default: TCP on --host and --port)')
+@click.option('--host', default='127.0.0.1', help='TCP address (keep it local, there is no authentication)')
+@click.option('-p', '--port', type=click.IntRange(min=1, max=65535), default=8765, help='TCP port')
+@click.option('-j', '--jobs', type=click.IntRange(min=1), default=os.cpu_count(), help='Number of worker processes')
+@click.option('--max-pending', type=click.IntRange(min=1),
+              help='Requests computed at once (default: 4 per job), further lines wait unread')
+@click.option('-b', '--band', type=click.IntRange(min=0), is_flag=False, flag_value=0, default=None,
+              help='Banded global alignment/similarity/edit distance (automatic if no value)')
+@click.option('-g', '--gap-open', type=int, default=0,
+              help='Affine gap opening score for similarity and alignments, added once per gap run (e.g. -5)')
+@click.option('--load-csv', is_flag=True, help='Load scores.csv and edit_cost.csv')
+@click.option('--stats-interval', type=click.FloatRange(min=0), default=0,
+              help='Print stats (queue depth, latency percentiles) on stderr every N seconds (0 - only at exit)')
+def main(socket_path, host, port, jobs, max_pending, band, gap_open, load_csv, stats_interval):
+    # Scoring systems are loaded and compiled once, workers get ready copies
+    scoring_sys = ScoringSystem(match=2, mismatch=-1, gap=-2, gap_open=gap_open)
+    edit_cost_sys = ScoringSystem(match=0, mismatch=1, gap=1)
+    if load_csv:
+        scoring_sys.load_csv('scores.csv')
+        edit_cost_sys.load_csv('edit_cost.csv')
+
+    server = AlignmentServer(scoring_sys, edit_cost_sys, band=band, jobs=jobs, max_pending=max_pending)
+    address = {'socket_path': socket_path} if socket_path else {'host': host, 'port': port}
+    click.echo(f"Listening on {socket_path or f'{host}:{port}'} (worker processes: {jobs})", err=True)
+    try:
+        asyncio.run(serve(server, stats_interval, **address))
+    finally:
+        server.close()
+        if socket_path and os.path.exists(socket_path):
+            os.remove(socket_path)
+        click.echo(json.dumps(server.stats()), err=True)
+
+
+if __name__ == '__main__':
+    main()
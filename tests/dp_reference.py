@@ -0,0 +1,75 @@
+import random
+from typing import Iterator, Tuple
+from ScoringSystem import ScoringSystem
+from AlignmentEngine import AlignmentEngine
+'''
+Plain Python Gotoh recurrence (cell by cell) which the DP engines are checked against, on short random pairs.
+'''
+
+SIMILARITY = ScoringSystem(match=2, mismatch=-1, gap=-2)
+AFFINE = ScoringSystem(match=2, mismatch=-1, gap=-1, gap_open=-3)
+EDIT_COST = ScoringSystem(match=0, mismatch=1, gap=1)
+# Costs which are not unit costs (Myers does not apply)
+WEIGHTED_COST = ScoringSystem(match=0, mismatch=2, gap=3)
+
+PAIRS = 60
+
+
+def reference(seq_a: str, seq_b: str, scoring_sys: ScoringSystem, minimize: bool = False,
+              local: bool = False) -> int:
+    '''Best score of a global (H[-1][-1]) or local (max of H) alignment, cell by cell'''
+    sign = -1 if minimize else 1
+    table = sign * scoring_sys.matrix.astype(int)
+    gap_open, gap_code = sign * scoring_sys.gap_open, scoring_sys.gap_code
+    a, b = scoring_sys.encode(seq_a).tolist(), scoring_sys.encode(seq_b).tolist()
+    worst = -10 ** 9
+
+    H = [[0] * (len(b) + 1) for _ in range(len(a) + 1)]
+    E = [[worst] * (len(b) + 1) for _ in range(len(a) + 1)]
+    F = [[worst] * (len(b) + 1) for _ in range(len(a) + 1)]
+    best = 0
+    for i in range(len(a) + 1):
+        for j in range(len(b) + 1):
+            if i == 0 and j == 0:
+                continue
+            if j > 0:
+                E[i][j] = max(H[i][j - 1] + gap_open, E[i][j - 1]) + table[gap_code, b[j - 1]]
+            if i > 0:
+                F[i][j] = max(H[i - 1][j] + gap_open, F[i - 1][j]) + table[a[i - 1], gap_code]
+            candidates = [E[i][j], F[i][j]]
+            if i > 0 and j > 0:
+                candidates.append(H[i - 1][j - 1] + table[a[i - 1], b[j - 1]])
+            if local:
+                candidates.append(0)
+            H[i][j] = max(candidates)
+            best = max(best, H[i][j])
+    return sign * (best if local else H[-1][-1])
+
+
+def alignment_score(aligned_a: str, aligned_b: str, scoring_sys: ScoringSystem) -> int:
+    '''Score of gapped strings, a gap run pays gap_open once'''
+    score, previous = 0, None
+    for x, y in zip(aligned_a, aligned_b):
+        column = 'I' if x == '-' else 'D' if y == '-' else 'M'
+        if column != 'M' and column != previous:
+            score += scoring_sys.gap_open
+        score += scoring_sys.score(x, y)
+        previous = column
+    return score
+
+
+def random_pairs(seed: int, alphabet: str = 'ACGT', max_length: int = 12) -> Iterator[Tuple[str, str]]:
+    generator = random.Random(seed)
+    for _ in range(PAIRS):
+        seq_a = ''.join(generator.choice(alphabet) for _ in range(generator.randint(0, max_length)))
+        if generator.random() < 0.5:
+            # Similar pairs exercise the narrow bands
+            seq_b = ''.join(letter for letter in seq_a if generator.random() < 0.9)
+            seq_b = ''.join(letter if generator.random() < 0.8 else generator.choice(alphabet) for letter in seq_b)
+        else:
+            seq_b = ''.join(generator.choice(alphabet) for _ in range(generator.randint(0, max_length)))
+        yield seq_a, seq_b
+
+
+def engine(scoring_sys: ScoringSystem) -> AlignmentEngine:
+    return AlignmentEngine(scoring_sys.matrix, scoring_sys.gap_code, scoring_sys.gap_open)
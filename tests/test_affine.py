@@ -0,0 +1,19 @@
+from dp_reference import AFFINE, reference, random_pairs, engine
+
+
+def test_affine_global():
+    for seq_a, seq_b in random_pairs(11):
+        expected = reference(seq_a, seq_b, AFFINE)
+        a, b = AFFINE.encode(seq_a), AFFINE.encode(seq_b)
+        H, _ = engine(AFFINE).fill(a, b)
+        assert H[-1, -1] == expected
+        assert engine(AFFINE).score(a, b) == expected
+
+
+def test_affine_local():
+    for seq_a, seq_b in random_pairs(12):
+        expected = reference(seq_a, seq_b, AFFINE, local=True)
+        a, b = AFFINE.encode(seq_a), AFFINE.encode(seq_b)
+        H, _ = engine(AFFINE).fill(a, b, local=True)
+        assert H.max() == expected
+        assert engine(AFFINE).local_score(a, b) == expected
@@ -0,0 +1,16 @@
+import pytest
+from dp_reference import SIMILARITY, AFFINE, EDIT_COST, WEIGHTED_COST, reference, random_pairs, engine
+
+
+@pytest.mark.parametrize('scoring_sys, minimize', [(SIMILARITY, False), (AFFINE, False), (EDIT_COST, True),
+                                                   (WEIGHTED_COST, True)])
+@pytest.mark.parametrize('band', [1, 0])
+def test_band_widening(scoring_sys, minimize, band):
+    # Band 1 has to be widened for most pairs, band 0 starts at DEFAULT_BAND
+    for seq_a, seq_b in random_pairs(10):
+        expected = reference(seq_a, seq_b, scoring_sys, minimize)
+        a, b = scoring_sys.encode(seq_a), scoring_sys.encode(seq_b)
+        assert engine(scoring_sys).score_banded(a, b, minimize=minimize, band=band)[0] == expected
+        H, _, final_band = engine(scoring_sys).fill_banded(a, b, minimize=minimize, band=band)
+        assert H[-1, -1] == expected
+        assert final_band >= (band or engine(scoring_sys).DEFAULT_BAND)
@@ -0,0 +1,26 @@
+import pytest
+from dp_reference import SIMILARITY, EDIT_COST, WEIGHTED_COST, reference, random_pairs, engine
+'''
+Anti-diagonal wavefront fills against the reference recurrence (see dp_reference), engines added later
+have their own test files
+'''
+
+
+@pytest.mark.parametrize('scoring_sys, minimize', [(SIMILARITY, False), (EDIT_COST, True), (WEIGHTED_COST, True)])
+def test_global_engine(scoring_sys, minimize):
+    for seq_a, seq_b in random_pairs(1):
+        expected = reference(seq_a, seq_b, scoring_sys, minimize)
+        a, b = scoring_sys.encode(seq_a), scoring_sys.encode(seq_b)
+        H, _ = engine(scoring_sys).fill(a, b, minimize=minimize)
+        assert H[-1, -1] == expected
+        assert engine(scoring_sys).score(a, b, minimize=minimize) == expected
+
+
+def test_local_engine():
+    scoring_sys = SIMILARITY
+    for seq_a, seq_b in random_pairs(2):
+        expected = reference(seq_a, seq_b, scoring_sys, local=True)
+        a, b = scoring_sys.encode(seq_a), scoring_sys.encode(seq_b)
+        H, _ = engine(scoring_sys).fill(a, b, local=True)
+        assert H.max() == expected
+        assert engine(scoring_sys).local_score(a, b) == expected
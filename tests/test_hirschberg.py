@@ -0,0 +1,11 @@
+from HirschbergAlgorithm import HirschbergAlgorithm
+from dp_reference import SIMILARITY, reference, alignment_score, random_pairs
+
+
+def test_hirschberg():
+    hirschberg = HirschbergAlgorithm(SIMILARITY)
+    for seq_a, seq_b in random_pairs(5):
+        aligned_a, aligned_b, score = hirschberg.align(seq_a, seq_b)
+        assert score == reference(seq_a, seq_b, SIMILARITY)
+        assert aligned_a.replace('-', '') == seq_a and aligned_b.replace('-', '') == seq_b
+        assert alignment_score(aligned_a, aligned_b, SIMILARITY) == score
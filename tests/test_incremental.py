@@ -0,0 +1,29 @@
+import random
+import pytest
+from IncrementalAlignment import IncrementalAlignment
+from dp_reference import SIMILARITY, WEIGHTED_COST, reference, alignment_score, random_pairs
+
+
+@pytest.mark.parametrize('scoring_sys, minimize', [(SIMILARITY, False), (WEIGHTED_COST, True)])
+def test_incremental(scoring_sys, minimize):
+    generator = random.Random(9)
+    for seq_a, seq_b in random_pairs(9):
+        # A tiny budget keeps few checkpoints, so edits sweep from older ones
+        incremental = IncrementalAlignment(seq_a, seq_b, scoring_sys, minimize=minimize, max_checkpoint_bytes=400)
+        sequences = [seq_a, seq_b]
+        for _ in range(4):
+            axis = generator.randrange(2)
+            start = generator.randint(0, len(sequences[axis]))
+            end = generator.randint(start, min(len(sequences[axis]), start + 3))
+            letters = ''.join(generator.choice('ACGT') for _ in range(generator.randint(0, 3)))
+            (incremental.edit_a if axis == 0 else incremental.edit_b)(start, end, letters)
+            sequences[axis] = sequences[axis][:start] + letters + sequences[axis][end:]
+
+            expected = reference(*sequences, scoring_sys, minimize)
+            assert incremental.score == expected
+            result = incremental.alignment()
+            assert result.score == expected
+            aligned_a, aligned_b = result.aligned()
+            assert aligned_a.replace('-', '') == sequences[0] and aligned_b.replace('-', '') == sequences[1]
+            assert alignment_score(aligned_a, aligned_b, scoring_sys) == expected
+            assert incremental.last_row()[-1] == expected
@@ -0,0 +1,25 @@
+import random
+from IndexedReference import IndexedReference
+from KmerIndex import KmerIndex
+
+
+def test_search_cigar_is_relative_to_the_record(tmp_path):
+    generator = random.Random(11)
+    records = {name: ''.join(generator.choice('ACGT') for _ in range(2000)) for name in ('chr1', 'chr2')}
+    fasta = tmp_path / 'genome.fa'
+    fasta.write_text(''.join(f'>{name}\n{sequence}\n' for name, sequence in records.items()))
+    reference = IndexedReference(IndexedReference.build(str(fasta)))
+    index = KmerIndex.build(reference, k=11, w=5)
+
+    # The query has 3 extra bases (I) and lacks 2 bases of the record (D)
+    record = records['chr2']
+    query = record[1000:1080] + 'TTT' + record[1080:1150] + record[1152:1250]
+    name, result = index.search(query, reference, max_hits=1)[0]
+    assert name == 'chr2'
+    assert 'I' in result.cigar and 'D' in result.cigar
+    assert result.start[1] == 0 and result.end[1] == len(query)
+    assert result.start[0] == 1000 and result.end[0] == 1250
+    aligned_record, aligned_query = result.aligned()
+    assert aligned_record.replace('-', '') == record[1000:1250]
+    assert aligned_query.replace('-', '') == query
+    assert aligned_record.count('-') == 3 and aligned_query.count('-') == 2
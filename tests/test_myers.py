@@ -0,0 +1,15 @@
+from MyersAlgorithm import MyersAlgorithm
+from dp_reference import EDIT_COST, WEIGHTED_COST, reference, random_pairs
+
+
+def test_myers():
+    myers = MyersAlgorithm(EDIT_COST.matrix, EDIT_COST.gap_code)
+    for seq_a, seq_b in random_pairs(4):
+        expected = reference(seq_a, seq_b, EDIT_COST, minimize=True)
+        a, b = EDIT_COST.encode(seq_a), EDIT_COST.encode(seq_b)
+        assert myers.supports(a, b)
+        assert myers.distance(a, b) == expected
+        assert myers.distance(a, b, max_distance=expected) == expected
+        assert myers.distance(a, b, max_distance=expected - 1) is None
+    assert not MyersAlgorithm(WEIGHTED_COST.matrix, WEIGHTED_COST.gap_code).supports(
+        WEIGHTED_COST.encode('ACGT'), WEIGHTED_COST.encode('AGT'))
@@ -0,0 +1,12 @@
+import pytest
+from dp_reference import SIMILARITY, AFFINE, WEIGHTED_COST, reference, random_pairs, engine
+
+
+@pytest.mark.parametrize('scoring_sys, minimize', [(SIMILARITY, False), (AFFINE, False), (WEIGHTED_COST, True)])
+def test_score_within(scoring_sys, minimize):
+    for seq_a, seq_b in random_pairs(3):
+        expected = reference(seq_a, seq_b, scoring_sys, minimize)
+        a, b = scoring_sys.encode(seq_a), scoring_sys.encode(seq_b)
+        for threshold in (expected - 2, expected, expected + 2):
+            passes = expected <= threshold if minimize else expected >= threshold
+            assert engine(scoring_sys).score_within(a, b, threshold, minimize) == (expected if passes else None)
@@ -0,0 +1,15 @@
+import pytest
+from SequenceAnalyzer import SequencesAnalyzer
+from dp_reference import SIMILARITY, AFFINE, reference, alignment_score, random_pairs
+
+
+@pytest.mark.parametrize('band', [None, 0])
+def test_analyzer_alignments(band):
+    for scoring_sys in (SIMILARITY, AFFINE):
+        for seq_a, seq_b in random_pairs(8):
+            analyzer = SequencesAnalyzer(seq_a, seq_b, band=band, scoring_sys=scoring_sys)
+            for mode, local in (('global', False), ('local', True)):
+                result = analyzer.align(mode)
+                expected = reference(seq_a, seq_b, scoring_sys, local=local)
+                assert result.score == expected
+                assert alignment_score(*result.aligned(), scoring_sys) == expected
@@ -0,0 +1,16 @@
+import pytest
+from SequenceReader import SequenceReader
+
+
+def test_fastq(tmp_path):
+    path = tmp_path / 'reads.fastq'
+    path.write_text('@r1 first\nACGT\nAC\n+\n@@II\nII\n@r2\nGG\n+r2\nII\n')
+    assert list(SequenceReader(str(path))) == [('r1', 'ACGTAC'), ('r2', 'GG')]
+
+
+@pytest.mark.parametrize('text', ['@r1\nACGT\n+\nII\n', '@r1\nACGT\n'])
+def test_truncated_fastq(tmp_path, text):
+    path = tmp_path / 'reads.fastq'
+    path.write_text('@r0\nA\n+\nI\n' + text)
+    with pytest.raises(ValueError, match="'r1' is truncated"):
+        list(SequenceReader(str(path)))
@@ -0,0 +1,18 @@
+import pytest
+from StripedSmithWaterman import StripedSmithWaterman
+from dp_reference import SIMILARITY, AFFINE, reference, random_pairs
+
+
+@pytest.mark.parametrize('scoring_sys', [SIMILARITY, AFFINE])
+@pytest.mark.parametrize('segments', [1, 3])
+def test_striped(scoring_sys, segments):
+    for seq_a, seq_b in random_pairs(6):
+        expected = reference(seq_a, seq_b, scoring_sys, local=True)
+        striped = StripedSmithWaterman(scoring_sys.matrix, scoring_sys.gap_code, scoring_sys.encode(seq_a),
+                                       scoring_sys.gap_open, segments=segments)
+        found = striped.locate(scoring_sys.encode(seq_b))
+        assert found['score'] == expected
+        # The reported region holds an optimal local alignment
+        region_a = seq_a[found['query_start']:found['query_end']]
+        region_b = seq_b[found['target_start']:found['target_end']]
+        assert reference(region_a, region_b, scoring_sys, local=True) == expected
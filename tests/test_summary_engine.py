@@ -0,0 +1,28 @@
+from SummaryEngine import SummaryEngine
+from SequenceAnalyzer import SequencesAnalyzer
+from dp_reference import SIMILARITY, AFFINE, WEIGHTED_COST, reference, random_pairs
+
+
+def test_summary_engine():
+    summary = SummaryEngine(SIMILARITY.gap_code)
+    summary.add_lane('similarity', SIMILARITY.matrix)
+    summary.add_lane('affine', AFFINE.matrix, gap_open=AFFINE.gap_open)
+    summary.add_lane('edit-distance', WEIGHTED_COST.matrix, minimize=True)
+    summary.add_lane('local', SIMILARITY.matrix, local=True)
+    for seq_a, seq_b in random_pairs(7):
+        for matrices in ((), ('similarity', 'local')):
+            results = summary.run(SIMILARITY.encode(seq_a), SIMILARITY.encode(seq_b), matrices=matrices)
+            assert results['similarity']['score'] == reference(seq_a, seq_b, SIMILARITY)
+            assert results['affine']['score'] == reference(seq_a, seq_b, AFFINE)
+            assert results['edit-distance']['score'] == reference(seq_a, seq_b, WEIGHTED_COST, minimize=True)
+            assert results['local']['score'] == reference(seq_a, seq_b, SIMILARITY, local=True)
+
+
+def test_summary_with_band(capsys):
+    for seq_a, seq_b in random_pairs(13):
+        for band in (None, 0):
+            analyzer = SequencesAnalyzer(seq_a, seq_b, band=band, scoring_sys=SIMILARITY)
+            analyzer.summary()
+            assert analyzer.needleman_wunsch_score() == reference(seq_a, seq_b, SIMILARITY)
+            assert analyzer.align('global').score == reference(seq_a, seq_b, SIMILARITY)
+            assert analyzer.smith_waterman_score() == reference(seq_a, seq_b, SIMILARITY, local=True)
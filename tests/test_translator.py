@@ -0,0 +1,19 @@
+from Translator import Translator
+
+
+def test_orfs_need_a_start_codon():
+    # Frames without AUG have no ORFs, codon 0 is not a start
+    assert Translator('GCGCCGUAA').orfs(min_length=1, six=False) == []
+    assert Translator('GC' * 60 + 'UAA').orfs() == []
+
+
+def test_orfs_skip_start_codon_after_last_stop():
+    # AUG after the only STOP opens nothing, the STOP has no AUG before it
+    assert Translator('GCCUAAAUGGCC').orfs(min_length=1, six=False) == []
+    assert Translator('AUGGCCUAAGCCUAGAUGGCC').orfs(min_length=1, six=False) == \
+        [{'frame': 1, 'start': 0, 'end': 9, 'protein': 'MA'}]
+
+
+def test_orfs_start_at_first_start_codon():
+    orfs = Translator('GCCAUGGCCAUGUGGUAA').orfs(min_length=1, six=False)
+    assert orfs == [{'frame': 1, 'start': 3, 'end': 18, 'protein': 'MAMW'}]
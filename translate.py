@@ -1,19 +1,104 @@
+import os
+import sys
+import time
 import click
+from typing import Iterable, Iterator, List, Tuple
 from Translator import Translator
+from PackedSequence import PackedSequence
+'''
+Input files are streamed: records are read in batches of bounded size, batches are translated by a process pool
+and written in the input order. Only a few batches are in flight at once, so memory does not grow with the input.
+With --jobs 1 records are translated one by one in the main process instead.
+The reader and the pool are imported only for --input-file, translating a single sequence starts fast.
+'''
+
+
+def translate(name: str, rna_sequence, frames: str, orfs: bool, min_length: int) -> str:
+    '''Output of one record: protein from the 1st start codon, frame translations or ORFs (FASTA)'''
+    translator = Translator(rna_sequence)
+    if orfs:
+        return ''.join(
+            f">{name}_orf{number} frame={orf['frame']} start={orf['start']} end={orf['end']}\n{orf['protein']}\n"
+            for number, orf in enumerate(translator.orfs(min_length=min_length), start=1))
+    if frames:
+        return ''.join(f'>{name} frame={frame}\n{protein}\n'
+                       for frame, protein in translator.frames(six=frames == '6').items())
+    return translator.to_protein + '\n'
+
+
+def translate_batch(batch: List[Tuple[str, PackedSequence]], frames: str, orfs: bool, min_length: int) -> str:
+    return ''.join(translate(name, rna_sequence, frames, orfs, min_length) for name, rna_sequence in batch)
+
+
+def batches(records: Iterable[Tuple[str, PackedSequence]], batch_size: int) -> Iterator[List[Tuple[str, PackedSequence]]]:
+    '''Groups records into batches of about `batch_size` bases (a longer record makes a batch on its own)'''
+    batch, bases = [], 0
+    for record in records:
+        batch.append(record)
+        bases += len(record[1])
+        if bases >= batch_size:
+            yield batch
+            batch, bases = [], 0
+    if batch:
+        yield batch
+
+
+def translate_file(input_file: str, jobs: int, batch_size: int, frames: str, orfs: bool, min_length: int) -> None:
+    from SequenceReader import SequenceReader
+    options = (frames, orfs, min_length)
+    out = sys.stdout
+    records, bases = 0, 0
+    started = time.perf_counter()
+
+    def write(batch_records: int, batch_bases: int, text: str) -> None:
+        nonlocal records, bases
+        out.write(text)
+        records += batch_records
+        bases += batch_bases
+
+    if jobs == 1:
+        # Records are translated in this process as they are read (nothing is packed or batched for workers)
+        for name, rna_sequence in SequenceReader(input_file):
+            write(1, len(rna_sequence), translate(name, rna_sequence, *options))
+    else:
+        from collections import deque
+        from multiprocessing import Pool
+        stream = batches(SequenceReader(input_file, packed=True), batch_size)
+        with Pool(processes=jobs) as pool:
+            # Results are written in order, at most 2 batches per worker are waiting
+            pending = deque()
+            for batch in stream:
+                result = pool.apply_async(translate_batch, (batch, *options))
+                pending.append((len(batch), sum(len(sequence) for _, sequence in batch), result))
+                if len(pending) >= 2 * jobs:
+                    batch_records, batch_bases, result = pending.popleft()
+                    write(batch_records, batch_bases, result.get())
+            while pending:
+                batch_records, batch_bases, result = pending.popleft()
+                write(batch_records, batch_bases, result.get())
+    out.flush()
+
+    elapsed = max(time.perf_counter() - started, 1e-9)
+    click.echo(f'Translated {records} records ({bases} bases) in {elapsed:.2f}s: '
+               f'{records / elapsed:.1f} records/s, {bases / elapsed:.0f} bases/s', err=True)
 
 
 @click.command()
 @click.argument('sequence', required=False)
-@click.option('-i', '--input-file', type=click.Path(exists=True, dir_okay=False, readable=True), 
-    help='Path text file containing long nucleotide sequence')
-def main(sequence, input_file=None):
+@click.option('-i', '--input-file', type=click.Path(exists=True, dir_okay=False, readable=True),
+    help='FASTA/FASTQ (optionally gzipped) or text file with 1 nucleotide sequence per line')
+@click.option('-f', '--frames', type=click.Choice(['3', '6']), help='Translate whole frames (6 - with reverse complement)')
+@click.option('-o', '--orfs', is_flag=True, help='Print open reading frames of all 6 frames')
+@click.option('--min-length', type=click.IntRange(min=1), default=30, help='Minimal ORF length (amino acids)')
+@click.option('-j', '--jobs', type=click.IntRange(min=1), default=os.cpu_count(),
+              help='Number of worker processes (--input-file)')
+@click.option('--batch-size', type=click.IntRange(min=1), default=1000000,
+              help='Bases sent to a worker at once (--input-file)')
+def main(sequence, input_file=None, frames=None, orfs=False, min_length=30, jobs=1, batch_size=1000000):
     if input_file:
-        with open(input_file) as f:
-            lines = f.readlines()
-            print_protein = lambda seq: print(Translator(seq).to_protein)
-            [print_protein(line.strip()) for line in lines]
+        translate_file(input_file, jobs, batch_size, frames, orfs, min_length)
     elif sequence:
-        print(Translator(sequence).to_protein)
+        click.echo(translate('sequence', sequence, frames, orfs, min_length), nl=False)
     else:
         click.echo('Missing argument. Please run --help.')
 